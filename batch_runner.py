@@ -0,0 +1,248 @@
+"""
+不需 Qt 的批次模擬
+用法:
+    python -m batch_runner config.json [--set key=value ...] [--param key=value ...]
+                           [--seed N] [--T 30] [--out DIR] [--export results,npz,...]
+                           [--save-stride N] [--reduce stats,high_fraction,...]
+config.json 與 GUI 儲存的格式相同 (MainWindow.save_config)
+結束碼: 0 成功 / 1 模擬或輸出失敗 / 2 參數或設定錯誤
+"""
+import os
+import sys
+import ast
+import json
+import argparse
+import datetime
+import logging
+
+EXIT_OK = 0
+EXIT_RUN_ERROR = 1
+EXIT_CONFIG_ERROR = 2
+
+# 可選的輸出項目；預設只輸出 config 與可重播的結果集
+EXPORTS = ['config', 'results', 'npz', 'xlsx', 'csv', 'pdf', 'mp4', 'perf', 'summary', 'lineage']
+DEFAULT_EXPORTS = ['config', 'results']
+
+logger = logging.getLogger('VoronoiBatch')
+
+
+class ConfigError(Exception):
+    """設定檔或命令列參數錯誤 (結束碼 2)"""
+
+
+def _parse_value(text):
+    # 'key=value' 的 value：可解析成 Python 字面值就用字面值，否則當字串
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_assignments(items, what):
+    """['a=1', 'b=x'] -> {'a': 1, 'b': 'x'}"""
+    result = {}
+    for item in items or []:
+        if '=' not in item:
+            raise ConfigError(f'{what} must be key=value, got {item!r}')
+        key, value = item.split('=', 1)
+        result[key.strip()] = _parse_value(value.strip())
+    return result
+
+
+def load_config(path, overrides=None):
+    """讀取 config.json 並套用 --set 覆寫"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f'cannot read config {path}: {e}')
+    if not isinstance(config, dict):
+        raise ConfigError(f'config {path} is not a JSON object')
+    config.update(overrides or {})
+    return config
+
+
+def export_results(out_dir, exports, config, params, perf_summary, sim_history, cell_positions_history, grid,
+                   reductions=None, ids_history=None, lineage=None, frame_times=None):
+    """
+    依 exports 寫出結果，檔名與 GUI 的 Download Results 相同 (不含日期前綴)
+    reductions: simulate 的串流摘要 (model.reductions)，'summary' 時寫成 summary.npz
+    ids_history / lineage: 每幀細胞 ID 與譜系 (model.ids_history / model.lineage)；pdf 依 ID 追蹤細胞，'lineage' 寫成 lineage.csv
+    frame_times: 各幀時間 (model.frame_times)，cell table 的 T/step 欄與 pdf 的 kymograph 橫軸
+    """
+    from cell_table import write_cell_table
+    from result_store import save_result_set
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    if 'config' in exports:
+        path = os.path.join(out_dir, 'config.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        written.append(path)
+    if 'perf' in exports and perf_summary:
+        path = os.path.join(out_dir, 'perf.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(perf_summary, f, indent=2)
+        written.append(path)
+    if 'summary' in exports and reductions:
+        import numpy as np
+        path = os.path.join(out_dir, 'summary.npz')
+        np.savez(path, **reductions)
+        written.append(path)
+    if 'lineage' in exports and lineage is not None:
+        from lineage import write_lineage
+        written.append(write_lineage(os.path.join(out_dir, 'lineage.csv'), lineage))
+    if 'results' in exports:
+        written.append(save_result_set(os.path.join(out_dir, 'results'), sim_history, cell_positions_history, params=params, config=config,
+                                       ids_history=ids_history, lineage=lineage, frame_times=frame_times,
+                                       reductions=reductions))
+    # T/step 欄依各幀時間標記 (save_stride > 1 或提前結束時幀與步數不一一對應)
+    dT_step = max(int(round(1/float(params.get('dT', 1) or 1))), 1)
+    for fmt in ('npz', 'xlsx', 'csv'):
+        if fmt in exports:
+            path = os.path.join(out_dir, f'cells.{fmt}')
+            write_cell_table(path, sim_history, cell_positions_history, dT_step, frame_times=frame_times)
+            written.append(path)
+    if 'pdf' in exports or 'mp4' in exports:
+        from sim_config import compile_color_func, default_texts
+        from voronoi_animation import VoronoiAnimator
+        if 'pdf' in exports:
+            path = os.path.join(out_dir, 'concentration.pdf')
+            labels = params.get('labels', [f'Y[{i}]' for i in range(sim_history[0].shape[1])])
+            VoronoiAnimator.save_concentration_pdf(path, sim_history, labels, ids_history, cell_positions_history,
+                                                   lineage, frame_times)
+            written.append(path)
+        if 'mp4' in exports:
+            path = os.path.join(out_dir, 'simulation.mp4')
+            color_func = compile_color_func((config.get('color_func') or '').strip() or default_texts()[2])
+            animator = VoronoiAnimator(grid, sim_history, color_func, cell_positions_history, show_ticks=False, dynamic_range=False)
+            animator.animate(interval=5, save_path=path, line_colors='black', line_width=1, line_alpha=0.5, point_size=15)
+            written.append(path)
+    return written
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m batch_runner', description='Run a Voronoi cell simulation headless from a saved config.json.')
+    parser.add_argument('config', help='config.json saved by the GUI')
+    parser.add_argument('--set', dest='sets', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a config entry, e.g. --set grid_shape_x=40 (repeatable)')
+    parser.add_argument('--param', dest='param_sets', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a model parameter, e.g. --param betaR=40 (repeatable)')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for grid, initial state, movement and noise')
+    parser.add_argument('--T', type=float, default=None, help='simulation time (default: config T)')
+    parser.add_argument('--import', dest='import_path', default=None, help='cell table for grid_mode=import')
+    parser.add_argument('--out', default=None, help='output folder (default: ./batch_<date>_<time>)')
+    parser.add_argument('--export', default=','.join(DEFAULT_EXPORTS),
+                        help=f'comma separated outputs: {",".join(EXPORTS)} or "all" (default: %(default)s)')
+    parser.add_argument('--profile', action='store_true', help='record per-phase timings (written with --export perf)')
+    parser.add_argument('--cache', default=None, metavar='DIR',
+                        help='reuse results of identical seeded runs from this cache folder')
+    parser.add_argument('--cache-size', type=float, default=2048, metavar='MB', help='cache size limit (default: %(default)s MB)')
+    parser.add_argument('--steady-state', action='store_true', help='stop early once the run has converged (config steady_state)')
+    parser.add_argument('--integrator', choices=['euler', 'rk23'], default=None,
+                        help='time stepping (default: config integrator, else euler); rk23 adapts the step')
+    parser.add_argument('--save-stride', type=int, default=None, metavar='N',
+                        help='keep every N-th step in the saved history (config save_stride, default 1)')
+    parser.add_argument('--reduce', default=None, metavar='NAMES',
+                        help='per-step summaries to compute, comma separated: stats,histogram,high_fraction,pattern '
+                             '(written with --export summary)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only log warnings and errors, no progress bar')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)  # 參數錯誤時 argparse 以結束碼 2 離開
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    import matplotlib
+    matplotlib.use('Agg')  # 計算節點沒有顯示器
+    import sim_config
+
+    try:
+        exports = EXPORTS if args.export.strip() == 'all' else [e.strip() for e in args.export.split(',') if e.strip()]
+        unknown = [e for e in exports if e not in EXPORTS]
+        if unknown:
+            raise ConfigError(f'unknown export(s) {unknown}; choose from {EXPORTS}')
+        config = load_config(args.config, parse_assignments(args.sets, '--set'))
+        if args.profile:
+            config['profile'] = True
+        if args.steady_state:
+            config['steady_state'] = True
+        if args.integrator:
+            config['integrator'] = args.integrator
+        if args.save_stride is not None:
+            config['save_stride'] = args.save_stride
+        if args.reduce is not None:
+            config['reducers'] = args.reduce
+        elif 'summary' in exports and not config.get('reducers'):
+            config['reducers'] = ['stats', 'high_fraction']
+        sim_config.output_kwargs(config)  # 檢查 save_stride / reducers
+        default_ode, default_params, _ = sim_config.default_texts()
+        params = sim_config.parse_params(config.get('params') or default_params)
+        param_overrides = parse_assignments(args.param_sets, '--param')
+        params.update(param_overrides)
+        ode_func = sim_config.compile_ode((config.get('ode') or '').strip() or default_ode)
+        seed = args.seed
+        if seed is None and str(config.get('seed', '')).strip():
+            seed = int(config['seed'])  # GUI 儲存的 seed 欄位
+        if sim_config.GRID_MODES[int(config.get('grid_mode', 0))] == 'import' and not (args.import_path or config.get('import_path')):
+            raise ConfigError('grid_mode is import; pass the cell table with --import')
+    except ConfigError as e:
+        logger.error(str(e))
+        return EXIT_CONFIG_ERROR
+    except Exception as e:
+        logger.error(f'invalid config: {e}')
+        return EXIT_CONFIG_ERROR
+
+    cache = None
+    if args.cache:
+        from result_cache import ResultCache
+        cache = ResultCache(args.cache, max_bytes=int(args.cache_size * 1024**2))
+    out_dir = args.out or os.path.abspath(datetime.datetime.now().strftime('batch_%y%m%d_%H%M%S'))
+    try:
+        logger.info(f'Running {args.config} (seed={seed}, T={args.T if args.T is not None else config.get("T")})')
+        estimate = sim_config.estimate_memory(config, params, args.T)
+        if estimate is not None:
+            from reducers import format_bytes
+            logger.info(f"Estimated result memory: {format_bytes(estimate['total'])} ({estimate['frames']} frames)")
+        # -q 或輸出不是終端機 (排程系統的 log 檔) 時不顯示 tqdm 進度條
+        progress = not args.quiet and sys.stderr.isatty()
+        model, sim_history, cell_positions_history, grid = sim_config.run_simulation(
+            config, params=params, T=args.T, seed=seed, ode_func=ode_func, import_path=args.import_path,
+            progress=progress, cache=cache)
+        cached = isinstance(model, sim_config.CachedRun)
+        source = 'Loaded from cache' if cached else 'Simulated'
+        logger.info(f'{source} {len(sim_history)} frames, {len(sim_history[-1])} cells in the last frame')
+        if not cached and model.termination['reason'] != 'T':
+            logger.info(f"Stopped early at t={model.termination['t']:.4g} ({model.termination['reason']})")
+        perf_summary = model.perf_summary
+        if perf_summary:
+            from sim_profiler import format_summary
+            logger.info('Simulation profile:\n' + format_summary(perf_summary))
+        if seed is not None:
+            config['seed'] = seed
+        config['params'] = config.get('params') or default_params
+        if param_overrides:
+            config['param_overrides'] = param_overrides
+        reductions = model.reductions
+        if cached:
+            # 快取只保存各幀結果與 reducers 摘要，執行中的紀錄 (perf) 無法匯出
+            for item, missing in (('summary', not reductions), ('perf', not perf_summary),
+                                  ('lineage', model.lineage is None)):
+                if item in exports and missing:
+                    logger.warning(f'Cannot export {item!r}: result loaded from cache')
+            if 'pdf' in exports and model.ids_history is None:
+                logger.warning('Result loaded from cache has no cell IDs; pdf traces follow row 0')
+        written = export_results(out_dir, exports, config, params, perf_summary, sim_history, cell_positions_history, grid,
+                                 reductions, model.ids_history, model.lineage, model.frame_times)
+    except Exception as e:
+        logger.exception(f'run failed: {e}')
+        return EXIT_RUN_ERROR
+    for path in written:
+        logger.info(f'Wrote {path}')
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
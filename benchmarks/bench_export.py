@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from benchmarks.fixtures import make_history
+
+
+class _ExportCase:
+    # TimeExport / TimeExportXlsx 共用的 setup/teardown (本身沒有 time_* 方法)
+    n_frames = 20
+
+    def setup(self, n):
+        self.grid, self.history, self.positions = make_history(n, self.n_frames)
+        self.tmp = tempfile.mkdtemp(prefix='voronoi_bench_')
+
+    def teardown(self, n):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class TimeExport(_ExportCase):
+    """匯出吞吐量：每個 case 寫 20 幀"""
+    params = [100, 1000, 10000]
+    size_param = True
+
+    def time_write_npz(self, n):
+        from cell_table import write_cell_table
+        write_cell_table(os.path.join(self.tmp, 'cells.npz'), self.history, self.positions, 20)
+
+    def time_write_csv(self, n):
+        from cell_table import write_cell_table
+        write_cell_table(os.path.join(self.tmp, 'cells.csv'), self.history, self.positions, 20)
+
+    def time_save_result_set(self, n):
+        from result_store import save_result_set
+        save_result_set(os.path.join(self.tmp, 'results'), self.history, self.positions, params={'dT': 0.05})
+
+
+class TimeExportXlsx(_ExportCase):
+    """xlsx 由 openpyxl 逐列寫入，只量到 1000 細胞"""
+    params = [100, 1000]
+    size_param = True
+
+    def time_write_xlsx(self, n):
+        from cell_table import write_cell_table
+        write_cell_table(os.path.join(self.tmp, 'cells.xlsx'), self.history, self.positions, 20)
+
+
+class TimeImport:
+    params = [1000, 10000]
+    size_param = True
+    n_frames = 20
+
+    def setup(self, n):
+        from cell_table import write_cell_table
+        grid, history, positions = make_history(n, self.n_frames)
+        self.tmp = tempfile.mkdtemp(prefix='voronoi_bench_')
+        for ext in ('npz', 'csv'):
+            write_cell_table(os.path.join(self.tmp, f'cells.{ext}'), history, positions, 20)
+
+    def teardown(self, n):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def time_read_npz(self, n):
+        from cell_table import read_cell_table
+        read_cell_table(os.path.join(self.tmp, 'cells.npz'), frame=(0, 10))
+
+    def time_read_csv(self, n):
+        from cell_table import read_cell_table
+        read_cell_table(os.path.join(self.tmp, 'cells.csv'), frame=(0, 10))
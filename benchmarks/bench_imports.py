@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+from benchmarks.fixtures import ROOT
+
+# 冷啟動 (新的直譯器) 匯入時間與預算檢查
+# 核心模擬模組只應載入 NumPy/SciPy；繪圖、pandas、seaborn、openpyxl 於第一次使用時才載入
+HEAVY_MODULES = ['matplotlib', 'pandas', 'seaborn', 'openpyxl', 'PyQt6', 'tqdm']
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_probe(imports, heavy=HEAVY_MODULES):
+    """在新的 Python 行程中執行 imports，回傳 {'seconds': 匯入耗時, 'loaded': 已載入的重量級模組}"""
+    code = _PROBE.format(imports=imports, heavy=list(heavy))
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+class TimeColdImport:
+    """
+    每個 case 啟動新的直譯器量測匯入時間；超過 budget 或載入了重量級模組時丟出 AssertionError，
+    runner 會記為錯誤並以結束碼 1 結束
+    """
+    core_budget = 0.75   # 秒，不含直譯器啟動
+    headless_budget = 1.0
+
+    def _check(self, imports, budget, allowed=()):
+        probe = import_probe(imports)
+        loaded = [m for m in probe['loaded'] if m not in allowed]
+        assert not loaded, f'heavy modules loaded at import: {loaded}'
+        assert probe['seconds'] <= budget, f"import took {probe['seconds']:.3f} s (budget {budget} s)"
+
+    def time_core_modules(self):
+        self._check('import voronoi_grid, biophysics_model, coupling, reaction_network, sim_profiler', self.core_budget)
+
+    def time_io_modules(self):
+        self._check('import cell_table, result_store, voronoi_animation', self.core_budget)
+
+    def time_headless_runner(self):
+        # batch_runner 建立 ODE 時不應為了 plt 載入 matplotlib
+        self._check('import batch_runner, sim_config; sim_config.compile_ode(sim_config.default_texts()[0])', self.headless_budget)
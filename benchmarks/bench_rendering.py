@@ -0,0 +1,26 @@
+import numpy as np
+from benchmarks.fixtures import make_history, default_color_func
+
+
+class TimeDrawFrame:
+    """VoronoiAnimator._draw_frame 的單幀繪製 (Agg，不顯示)"""
+    params = [100, 1000, 10000]
+    size_param = True
+
+    def setup(self, n):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from voronoi_animation import VoronoiAnimator
+        self.grid, history, positions = make_history(n, 2)
+        self.animator = VoronoiAnimator(self.grid, history, default_color_func(), positions, dynamic_range=False)
+        self.fig, self.ax = plt.subplots()
+
+    def teardown(self, n):
+        import matplotlib.pyplot as plt
+        plt.close(self.fig)
+
+    def time_draw_frame(self, n):
+        self.ax.clear()
+        self.animator._draw_frame(self.ax, 1, None, 'black', 1, 0.5, 15)
+        self.fig.canvas.draw()
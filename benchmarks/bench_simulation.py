@@ -0,0 +1,178 @@
+import numpy as np
+from benchmarks.fixtures import make_grid, make_state, default_params, default_ode, reset_grid, SEED
+
+
+class TimeODE:
+    """預設 sD_ode 的一次 RHS 計算"""
+    params = [100, 400, 1600]
+    size_param = True
+
+    def setup(self, n):
+        self.grid = make_grid(n)
+        self.Y = make_state(len(self.grid.cells))
+        self.p = default_params()
+        self.ode = default_ode()
+        np.random.seed(SEED)
+
+    def time_sD_ode(self, n):
+        self.ode(self.Y, 0.0, self.p, self.grid.cells)
+
+
+class TimeSimulateStep:
+    """simulate 的單步時間 (ODE + 歷史紀錄 + 移動)"""
+    params = [100, 400]
+    size_param = True
+
+    def setup(self, n):
+        from biophysics_model import BiophysicsModel
+        from gui.sim_utils import repulsion_move_neighbors_no_outer
+        self.grid = make_grid(n)
+        self.cells0 = self.grid.cells.copy()
+        self.vor0 = self.grid.vor
+        self.p = default_params()
+        self.Y0 = make_state(len(self.cells0))
+        self.make_model = lambda: BiophysicsModel(len(self.cells0), dict(self.p), default_ode(), self.Y0.copy(), vor_grid=self.grid,
+                                                  move_rule=repulsion_move_neighbors_no_outer, random_strength=0.05)
+
+    def time_simulate_10_steps(self, n):
+        # 移動會改變 grid，每次都由相同的細胞、狀態與亂數種子重新建立 model
+        reset_grid(self.grid, self.cells0, self.vor0)
+        np.random.seed(SEED)
+        self.make_model().simulate(10 * self.p['dT'], progress=False)
+
+
+class _GridCase:
+    # TimeGeometry / TimeDivisionDeath 共用的 setup (本身沒有 time_* 方法)
+    def setup(self, n):
+        np.random.seed(SEED)
+        self.grid = make_grid(n)
+        self.cells0 = self.grid.cells.copy()
+        self.vor0 = self.grid.vor
+        self.Y = make_state(len(self.grid.cells))
+
+    def _reset(self):
+        # 分裂/死亡會改變細胞數，每次計時前回到相同初始狀態
+        reset_grid(self.grid, self.cells0, self.vor0)
+
+
+class TimeGeometry(_GridCase):
+    """VoronoiGrid 的移動"""
+    params = [100, 1000, 10000, 100000]
+    size_param = True
+
+    def time_move_cells(self, n):
+        self._reset()
+        self.grid.move_cells(None, 0.05)
+
+
+class TimeDivisionDeath(_GridCase):
+    """VoronoiGrid 的分裂、死亡 (每次都重建 Voronoi)"""
+    params = [100, 1000, 10000]
+    size_param = True
+
+    def time_cell_proliferation(self, n):
+        self._reset()
+        self.grid.cell_proliferation(n=1, mode='area', concentrations=self.Y)
+
+    def time_cell_apoptosis(self, n):
+        self._reset()
+        self.grid.cell_apoptosis(n=1, mode='area', concentrations=self.Y)
+
+
+class TimeMoveRules:
+    params = [100, 1000, 10000]
+    size_param = True
+
+    def setup(self, n):
+        self.grid = make_grid(n)
+
+    def time_move_away_from_center(self, n):
+        from gui.sim_utils import move_away_from_center
+        move_away_from_center(self.grid.cells, 0.1)
+
+    def time_covergent_extension(self, n):
+        from gui.sim_utils import covergent_extension
+        covergent_extension(self.grid.cells, 0.02)
+
+    def time_repulsion_move_neighbors_no_outer(self, n):
+        from gui.sim_utils import repulsion_move_neighbors_no_outer
+        repulsion_move_neighbors_no_outer(self.grid.cells, 0.08)
+
+
+class TimeGridGeneration:
+    params = [1000, 10000, 100000]
+    size_param = True
+
+    def time_honeycomb(self, n):
+        make_grid(n, mode='honeycomb')
+
+    def time_poisson(self, n):
+        make_grid(n, mode='poisson')
+
+
+class TimeMultiRate:
+    """
+    宣告式 sD 模型：單一速率與 sD3/sD4 每 k 步更新一次 (substeps) 的 simulate 時間
+    多速率的結果與單一速率比較，最大相對誤差超過 max_error 時丟出 AssertionError
+    (關閉雜訊並降低抑制強度，避免 hill(avgD) 在 avgD 接近 -1 時的奇異點放大差異)
+    """
+    params = [1, 2, 4, 8]
+    T = 20.0
+    max_error = 0.05
+
+    def _run(self, k):
+        from biophysics_model import BiophysicsModel
+        from reaction_network import SD_MODEL, compile_network
+        spec = dict(SD_MODEL, substeps={'sD3': k, 'sD4': k}) if k > 1 else SD_MODEL
+        np.random.seed(SEED)
+        model = BiophysicsModel(len(self.cells), dict(self.p), compile_network(spec), self.Y0.copy(),
+                                vor_grid=self.grid)
+        history, _ = model.simulate(self.T, progress=False)
+        return np.stack(history).astype(float)
+
+    def setup(self, k):
+        self.grid = make_grid(400)
+        self.cells = self.grid.cells.copy()
+        self.p = default_params()
+        self.p.update({'sDtv3_ratio': 0.05, 'sDtv4_ratio': 0.05, 'Ktv3_inhib': 0.05, 'Ktv4_inhib': 0.05,
+                       'Dgr_Noise': 0.0})
+        self.Y0 = make_state(len(self.cells))
+        self.Y0[:, 2:] = 0.0
+        if k > 1:
+            ref = self._run(1)
+            out = self._run(k)
+            error = (np.abs(out - ref).max(axis=(1, 2)) / np.abs(ref).max(axis=(1, 2))).max()
+            assert error <= self.max_error, f'substeps={k}: max relative error {error:.3g} (limit {self.max_error})'
+
+    def time_simulate(self, k):
+        self._run(k)
+
+
+class TimeStaticGeometry:
+    """
+    靜態組織 (不移動) 與每步移動的 simulate 時間，舊式逐細胞 sD_ode 與 ctx 版預設 ODE
+    靜態時 ODE 每步收到同一個唯讀座標與 CouplingContext：ctx 版的算子與 sD_ode 以 ctx.cached 保存的鄰居、擴散權重都只算一次
+    """
+    params = ['legacy-static', 'legacy-moving', 'ctx-static', 'ctx-moving']
+    steps = 20
+
+    def setup(self, case):
+        from biophysics_model import BiophysicsModel
+        from gui.default_ode import get_default_ode
+        from gui.sim_utils import move_away_from_center
+        from sim_config import compile_ode
+        ode, geometry = case.split('-')
+        self.grid = make_grid(400)
+        self.cells0 = self.grid.cells.copy()
+        self.vor0 = self.grid.vor
+        self.p = default_params()
+        self.Y0 = make_state(len(self.cells0))
+        func = default_ode() if ode == 'legacy' else compile_ode(get_default_ode())
+        move_rule = (lambda cells: move_away_from_center(cells, 0.01)) if geometry == 'moving' else None
+        self.make_model = lambda: BiophysicsModel(len(self.cells0), dict(self.p), func, self.Y0.copy(),
+                                                  vor_grid=self.grid, move_rule=move_rule)
+
+    def time_simulate(self, case):
+        reset_grid(self.grid, self.cells0, self.vor0)
+        np.random.seed(SEED)
+        self.make_model().simulate(self.steps * self.p['dT'], progress=False)
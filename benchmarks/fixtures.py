@@ -0,0 +1,60 @@
+import os
+import sys
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 固定種子的組織尺寸 (細胞數)
+SIZES = [100, 1000, 10000, 100000]
+SEED = 1234
+
+
+def make_grid(n_cells, seed=SEED, mode='honeycomb'):
+    """約 n_cells 個細胞的固定種子網格"""
+    from voronoi_grid import VoronoiGrid
+    nx = int(np.ceil(np.sqrt(n_cells)))
+    ny = int(np.ceil(n_cells / nx))
+    return VoronoiGrid(grid_shape=(nx, ny), cell_dist=1.0, pos_rand=0.25, mode=mode, rng=seed)
+
+
+def reset_grid(grid, cells0, vor0):
+    """網格回到 setup 時的細胞與 Voronoi，ID 與譜系重新開始 (移動/分裂/死亡後每次計時前呼叫)"""
+    grid.cells = cells0.copy()
+    grid.vor = vor0
+    grid.reset_ids()
+
+
+def make_state(n_cells, n_var=4, seed=SEED):
+    rng = np.random.default_rng(seed)
+    return np.abs(rng.standard_normal((n_cells, n_var))) * 10.0
+
+
+def default_params():
+    from gui.default_params import get_default_params
+    text = get_default_params().strip()
+    text = text[len('params ='):].strip()
+    return eval(text, {}, {})
+
+
+def default_color_func():
+    # 與 GUI 相同：執行預設 color_func 文字
+    import matplotlib.pyplot as plt
+    from gui.default_color_func import get_default_color_func
+    local_vars = {}
+    exec(get_default_color_func(), {'np': np, 'plt': plt}, local_vars)
+    return local_vars['color_func']
+
+
+def default_ode():
+    from gui.sim_utils import sD_ode
+    return sD_ode
+
+
+def make_history(n_cells, n_frames, n_var=4, seed=SEED):
+    grid = make_grid(n_cells, seed)
+    rng = np.random.default_rng(seed)
+    history = [make_state(len(grid.cells), n_var, seed + f) for f in range(n_frames)]
+    positions = [grid.cells + rng.standard_normal(grid.cells.shape) * 0.01 for _ in range(n_frames)]
+    return grid, history, positions
@@ -0,0 +1,197 @@
+"""
+簡易 asv 風格的 benchmark 執行器
+
+bench_*.py 中的類別提供 time_* 方法，可選 params (list)、setup(param)、teardown(param)；
+尺寸上限寫在各類別的 params，setup 丟出 NotImplementedError 表示該組合略過。
+params 是細胞數或網格大小時設定 size_param = True：只有這些受 --max-cells 限制並計算 scaling 指數
+(substeps、stride 等其他數值參數不是問題規模)。
+結果存成 JSON，可與 baseline 比較並標記變慢的項目。
+"""
+import argparse
+import datetime
+import gc
+import importlib
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def discover(pattern=None):
+    """回傳 [(name, cls, method_name)]，name 形如 bench_simulation.TimeODE.time_sD_ode"""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    found = []
+    for fname in sorted(os.listdir(BENCH_DIR)):
+        if not (fname.startswith('bench_') and fname.endswith('.py')):
+            continue
+        mod_name = fname[:-3]
+        module = importlib.import_module(f'benchmarks.{mod_name}')
+        for cls_name, cls in sorted(vars(module).items()):
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for attr in sorted(dir(cls)):
+                if attr.startswith('time_'):
+                    name = f'{mod_name}.{cls_name}.{attr}'
+                    if pattern is None or re.search(pattern, name):
+                        found.append((name, cls, attr))
+    return found
+
+
+def _time_call(func, repeat, min_time):
+    # 先估計單次時間，決定每個 sample 的呼叫次數
+    t0 = time.perf_counter()
+    func()
+    first = time.perf_counter() - t0
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    samples = []
+    for _ in range(repeat):
+        gc.disable()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - t0) / number)
+        gc.enable()
+    samples.sort()
+    return {'min': samples[0], 'median': samples[len(samples)//2], 'number': number, 'repeat': repeat}
+
+
+def run(pattern=None, repeat=3, min_time=0.1, max_param=None, log=print, errors=None):
+    results = {}
+    for name, cls, attr in discover(pattern):
+        size = getattr(cls, 'size_param', False)
+        for param in getattr(cls, 'params', [None]):
+            # 只有細胞數/網格大小的 params 受 --max-cells 限制
+            if max_param is not None and size and param > max_param:
+                continue
+            key = name if param is None else f'{name}[{param}]'
+            obj = cls()
+            args = () if param is None else (param,)
+            try:
+                if hasattr(obj, 'setup'):
+                    obj.setup(*args)
+                method = getattr(obj, attr)
+                stats = _time_call(lambda: method(*args), repeat, min_time)
+            except NotImplementedError:
+                log(f'{key:70s} skipped')
+                continue
+            except Exception as e:
+                log(f'{key:70s} failed: {e!r}')
+                if errors is not None:
+                    errors[key] = repr(e)
+                continue
+            finally:
+                if hasattr(obj, 'teardown'):
+                    try:
+                        obj.teardown(*args)
+                    except Exception:
+                        pass
+            stats['param'] = param
+            stats['size'] = size
+            results[key] = stats
+            log(f"{key:70s} {format_time(stats['min'])}")
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds/scale:8.3f} {unit}'
+    return f'{seconds/1e-9:8.1f} ns'
+
+
+def scaling_exponents(results):
+    """size_param 的 benchmark 以 log(time) 對 log(細胞數) 做線性擬合，回傳斜率 (O(n^k) 的 k)"""
+    curves = {}
+    for key, stats in results.items():
+        if not stats.get('size') or not isinstance(stats.get('param'), (int, float)):
+            continue
+        curves.setdefault(key.split('[')[0], []).append((stats['param'], stats['min']))
+    exponents = {}
+    for name, pts in curves.items():
+        if len(pts) < 2:
+            continue
+        xs = [math.log(p) for p, _ in pts]
+        ys = [math.log(t) for _, t in pts]
+        mx, my = sum(xs)/len(xs), sum(ys)/len(ys)
+        var = sum((x-mx)**2 for x in xs)
+        if var > 0:
+            exponents[name] = sum((x-mx)*(y-my) for x, y in zip(xs, ys)) / var
+    return exponents
+
+
+def compare(results, baseline, threshold=1.25):
+    """回傳 [(key, base, new, ratio)]，ratio > threshold 視為退步"""
+    regressions = []
+    for key, stats in results.items():
+        base = baseline.get('benchmarks', {}).get(key)
+        if base is None:
+            continue
+        ratio = stats['min'] / base['min'] if base['min'] > 0 else float('inf')
+        if ratio > threshold:
+            regressions.append((key, base['min'], stats['min'], ratio))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the Voronoi simulation benchmark suite.')
+    parser.add_argument('-b', '--bench', default=None, help='regex filter on benchmark names')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=0.1, help='minimum seconds per sample')
+    parser.add_argument('--max-cells', type=int, default=None, help='skip parameter sizes above this')
+    parser.add_argument('-o', '--output', default=None, help='result JSON path (default benchmarks/results/<time>.json)')
+    parser.add_argument('--compare', default=None, help='baseline JSON to compare against (default benchmarks/baseline.json if present)')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio flagged as regression')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results as benchmarks/baseline.json')
+    args = parser.parse_args(argv)
+
+    errors = {}
+    results = run(args.bench, args.repeat, args.min_time, args.max_cells, errors=errors)
+    payload = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor()},
+        'benchmarks': results,
+        'scaling': scaling_exponents(results),
+        'errors': errors,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.datetime.now().strftime('%y%m%d_%H%M%S.json'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    print(f'\nResults saved to {output}')
+    for name, k in sorted(payload['scaling'].items()):
+        print(f'  scaling {name:62s} ~ n^{k:.2f}')
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2)
+        print(f'Baseline saved to {BASELINE_PATH}')
+
+    baseline_path = args.compare or (BASELINE_PATH if os.path.exists(BASELINE_PATH) and not args.save_baseline else None)
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) vs {baseline_path} (threshold x{args.threshold}):')
+            for key, old, new, ratio in regressions:
+                print(f'  {key:70s} {format_time(old)} -> {format_time(new)}  x{ratio:.2f}')
+            return 1
+        print(f'\nNo regressions vs {baseline_path}')
+    return 1 if errors else 0
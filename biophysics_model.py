@@ -1,6 +1,5 @@
 import numpy as np
-from tqdm import tqdm
-from scipy.integrate import solve_ivp
+from sim_profiler import PhaseTimer
 
 class BiophysicsModel:
     def __init__(self, cell_count, params, ode_func, init_Y, vor_grid=None, move_rule=None, random_strength=0.0, LaterInhib_switch=None):
@@ -9,6 +8,10 @@ class BiophysicsModel:
         if ode_func is None:
             raise Exception("ode_func must be provided!")
         self.ode_func = ode_func  # 必須傳入
+        # ode 有 ctx 參數時，每次呼叫傳入目前幾何的 CouplingContext (鄰居、面積、高斯核等算子只算一次)
+        from coupling import accepts_ctx
+        self.ode_uses_ctx = accepts_ctx(ode_func)
+        self._ctx = None
         if init_Y is None:
             raise ValueError('init_Y must be provided，and shape=(cell_count, n_var)')
         self.init_Y = init_Y
@@ -17,12 +20,51 @@ class BiophysicsModel:
         self.random_strength = random_strength
         self.reset()
         self.LaterInhib_switch = LaterInhib_switch
+        self.perf_summary = None  # simulate(profile=True) 後的各階段耗時
+        self.termination = None   # simulate 的結束原因與時間
+        self.steady_states = None  # solve_steady_state 的結果
+        self.frame_times = None   # simulate 儲存的各幀時間
+        self.reductions = None    # simulate(reducers=...) 的串流摘要
+        self.ids_history = None   # simulate 各幀的細胞 ID
+        self.lineage = None       # 分裂/死亡譜系 (lineage.Lineage)
 
     def reset(self):
         self.Y = self.init_Y.copy()
         self.history = [self.Y.copy()]
         self.cell_positions_history = [self.vor_grid.cells.copy()] if self.vor_grid else []
 
+    def context(self):
+        """
+        目前細胞幾何的 coupling.CouplingContext
+        Voronoi 沒有重建 (細胞未移動/分裂/死亡) 時回傳同一個物件，已算過的算子直接沿用
+        """
+        from coupling import CouplingContext
+        if self._ctx is None or self._ctx.vor is not self.vor_grid.vor:
+            self._ctx = CouplingContext.from_grid(self.vor_grid)
+        return self._ctx
+
+    def _frozen_geometry(self):
+        # 目前 grid 座標與細胞 ID 的唯讀複本
+        if self.vor_grid is None:
+            return None, None
+        cells = self.vor_grid.cells.copy()
+        ids = self.vor_grid.cell_ids.copy()
+        cells.flags.writeable = False
+        ids.flags.writeable = False
+        return cells, ids
+
+    def static_geometry(self, events=None):
+        """
+        整個模擬的幾何是否固定：沒有細胞移動，也沒有分裂/死亡事件
+        events: simulate 將使用的 Event list (None 或空 list 表示沒有事件)
+        """
+        return self.move_rule is None and not events
+
+    def _call_ode(self, ode, Y, t, params, cells):
+        if self.ode_uses_ctx and self.vor_grid is not None:
+            return ode(Y, t, params, cells, ctx=self.context())
+        return ode(Y, t, params, cells)
+
     def _rhs(self, t, y_flat):
         y = y_flat.reshape((self.cell_count, -1))
         if self.ode_func is None:
@@ -30,52 +72,268 @@ class BiophysicsModel:
         dy = self.ode_func(y, t, self.params)
         return dy.flatten()
 
-    def simulate(self, T, proliferation_steps=None, apoptosis_steps=None, proliferation_n=5, apoptosis_n=3, proliferation_mode='area', apoptosis_mode='area'):
+    def simulate(self, T, proliferation_steps=None, apoptosis_steps=None, proliferation_n=5, apoptosis_n=3, proliferation_mode='area', apoptosis_mode='area', profile=False, progress=True, events=None, convergence=None, method='euler', rtol=1e-3, atol=1e-6, max_step=None, reducers=None, save_stride=1):
         """
         T: 總模擬時間
         proliferation_steps: list, 在哪些步驟進行細胞分裂
         apoptosis_steps: list, 在哪些步驟進行細胞死亡
         proliferation_n, apoptosis_n: 每次分裂/死亡的細胞數
         proliferation_mode, apoptosis_mode: 'area' 或 'random'
+        profile: True 時記錄各階段耗時與計數 (ode/events/history/movement/voronoi)，
+                 結果存於 self.perf_summary
+        progress: False 時不顯示 tqdm 進度條 (平行掃描時使用)
+        events: event_scheduler 的 Event list (固定時間、速率、條件觸發)；
+                未指定時由 proliferation_steps/apoptosis_steps 轉換
+        convergence: convergence.ConvergenceMonitor，收斂且之後沒有排定的分裂/死亡事件時提早結束 (細胞移動時不使用)
+        結束原因與時間存於 self.termination = {'reason': 'T' | 'steady_state' | 'pattern_stable', 't', 'steps'}
+        method: 'euler' 固定步長 dT；'rk23' 自適應步長 (integrators.RK23)，暫態時縮小、平穩時放大，
+                輸出幀仍在 dT 的格點上 (插值)；有分裂/死亡到期或細胞移動的幀會截止步長並重新開始
+        rtol, atol, max_step: rk23 的誤差容許與最大步長 (預設不限)
+        reducers: reducers.Reducer list，每一步 (含 t=0) 計算摘要，結果存於 self.reductions = {'t', 各 reducer 的鍵}
+        save_stride: 每幾步存一幀完整 history / 位置 (最後一步一定保留)，各幀時間存於 self.frame_times
+        每幀的細胞 ID (VoronoiGrid.cell_ids) 存於 self.ids_history，分裂/死亡的譜系存於 self.lineage (lineage.py)
         """
         from tqdm import trange
+        from event_scheduler import EventScheduler, legacy_events
+        timer = PhaseTimer(enabled=profile)
+        if self.vor_grid is not None:
+            self.vor_grid.timer = timer if profile else None
+            voronoi_builds0 = self.vor_grid.voronoi_builds
         y0 = self.init_Y.flatten()
         t_eval = np.arange(0, T, self.params['dT'])
         Y = y0.reshape((self.cell_count, -1))
         history = [Y.copy()]
-        cell_positions_history = [self.vor_grid.cells.copy()] if self.vor_grid else []
-        for i, t in zip(trange(1, len(t_eval)), t_eval[1:]):
+        # 目前幾何的唯讀座標與 ID：只在細胞移動/分裂/死亡後重新複製，幾何不變的各幀共用同一個 array
+        # (靜態組織的位置歷史只佔一幀記憶體)；ODE 收到同一個唯讀物件與同一個 CouplingContext
+        cells, ids = self._frozen_geometry()
+        cell_positions_history = [cells] if self.vor_grid else []
+        ids_history = [ids] if self.vor_grid else []
+        save_stride = max(int(save_stride), 1)
+        frame_times = [0.0]
+        saved_step = 0
+        reducers = list(reducers or [])
+        reduce_times = [0.0]
+        for r in reducers:
+            r.start(Y.shape[1])
+            r.update(0.0, Y, self.vor_grid)
+        if events is None:
+            events = legacy_events(self.params['dT'], proliferation_steps, apoptosis_steps, proliferation_n, apoptosis_n,
+                                   proliferation_mode, apoptosis_mode)
+        scheduler = EventScheduler(events, self.params['dT'], t0=0.0, grid=self.vor_grid, Y=Y) if events and self.vor_grid is not None else None
+        # 細胞持續移動時幾何一直改變，ODE 收斂也不代表組織已穩定，不提早結束
+        if self.move_rule is not None:
+            convergence = None
+        if convergence is not None:
+            convergence.start(self.params['dT'])
+        self.termination = {'reason': 'T', 't': float(t_eval[-1]) if len(t_eval) else 0.0, 'steps': max(len(t_eval) - 1, 0)}
+        dT = self.params['dT']
+        stepper = None
+        if method == 'rk23':
+            from integrators import RK23
+            # 宣告式模型的 substeps 只適用固定步長，RK23 各階段使用單一速率的 RHS
+            ode = getattr(self.ode_func, 'single_rate', self.ode_func)
+            stepper = RK23(lambda t, Y: self._call_ode(ode, Y, t, self.params, cells), 0.0, Y, rtol=rtol, atol=atol,
+                           h0=dT, max_step=max_step or np.inf, min_step=dT * 1e-4)
+        elif method != 'euler':
+            raise ValueError("method must be 'euler' or 'rk23'")
+        for i, t in zip(trange(1, len(t_eval), disable=not progress), t_eval[1:]):
             # ODE
-            dY = self.ode_func(Y, t, self.params, self.vor_grid.cells)
-            Y = Y + dY * self.params['dT']
-
-            # 細胞分裂
-            if proliferation_steps == "all" or (isinstance(proliferation_steps, (list, tuple, set)) and i in proliferation_steps):
-                new_cells, new_Y = self.vor_grid.cell_proliferation(n=proliferation_n, mode=proliferation_mode, concentrations=Y)
-                Y = new_Y
-            # 細胞死亡
-            if apoptosis_steps == "all" or (isinstance(apoptosis_steps, (list, tuple, set)) and i in apoptosis_steps):
-                removed_cells, new_Y = self.vor_grid.cell_apoptosis(n=apoptosis_n, mode=apoptosis_mode, concentrations=Y)
-                Y = new_Y
-            history.append(Y.copy())
+            with timer.phase('ode'):
+                if stepper is None:
+                    dY = self._call_ode(self.ode_func, Y, t, self.params, cells)
+                    Y = Y + dY * dT
+                else:
+                    nfev = stepper.nfev
+                    Y_prev = Y
+                    Y = stepper.advance(t, self._step_limit(t_eval, i, scheduler))
+                    dY = (Y - Y_prev) / dT
+            timer.count('rhs_calls', 1 if stepper is None else stepper.nfev - nfev)
+            reason = convergence.update(t, Y, dY) if convergence is not None else None
+
+            # 細胞分裂 / 死亡：只在有事件到期的步驟處理，同一步的事件共用一次 Voronoi 重建
+            if scheduler is not None and scheduler.is_due(t):
+                with timer.phase('events'):
+                    Y, born, died = scheduler.apply(t, self.vor_grid, Y)
+                timer.count('cells_born', born)
+                timer.count('cells_died', died)
+                if born or died:
+                    cells, ids = self._frozen_geometry()
+                if stepper is not None and (born or died):
+                    stepper.reset(t, Y)
+            save = i % save_stride == 0
+            with timer.phase('history'):
+                if save:
+                    history.append(Y.copy())
+                    frame_times.append(float(t))
+                    saved_step = i
+                for r in reducers:
+                    r.update(t, Y, self.vor_grid)
+                reduce_times.append(float(t))
             # 細胞移動
             if self.move_rule is not None:
-                self.vor_grid.move_cells(self.move_rule, self.random_strength)
+                with timer.phase('movement'):
+                    self.vor_grid.move_cells(self.move_rule, self.random_strength)
+                    cells, ids = self._frozen_geometry()
+                if stepper is not None:
+                    stepper.reset(t, Y)
+            if self.vor_grid is not None and save:
+                with timer.phase('history'):
+                    cell_positions_history.append(cells)
+                    ids_history.append(ids)
+            # 已收斂：之後還有分裂/死亡事件時圖樣仍會改變，不提早結束
+            if reason is not None and (scheduler is None or scheduler.next_time >= T):
+                self.termination = {'reason': reason, 't': float(t), 'steps': i}
+                break
+        # 最後一步不在 save_stride 上時補存，history[-1] 永遠是最終狀態
+        if self.termination['steps'] != saved_step:
+            history.append(Y.copy())
+            frame_times.append(self.termination['t'])
             if self.vor_grid is not None:
-                cell_positions_history.append(self.vor_grid.cells.copy())
+                cell_positions_history.append(cells)
+                ids_history.append(ids)
+        self.frame_times = np.array(frame_times)
+        self.ids_history = np.empty(len(ids_history), dtype=object)
+        for idx, arr in enumerate(ids_history):
+            self.ids_history[idx] = arr
+        self.lineage = self.vor_grid.lineage if self.vor_grid is not None else None
+        self.reductions = None
+        if reducers:
+            from reducers import collect
+            self.reductions = collect(reducers, reduce_times)
         
         # 由於細胞數會變動，history 需用 object array
-        history_arr = np.empty(len(history), dtype=object)
-        for idx, arr in enumerate(history):
-            history_arr[idx] = arr
-        cell_positions_arr = np.empty(len(cell_positions_history), dtype=object)
-        for idx, arr in enumerate(cell_positions_history):
-            cell_positions_arr[idx] = arr
+        with timer.phase('history'):
+            history_arr = np.empty(len(history), dtype=object)
+            for idx, arr in enumerate(history):
+                history_arr[idx] = arr
+            cell_positions_arr = np.empty(len(cell_positions_history), dtype=object)
+            for idx, arr in enumerate(cell_positions_history):
+                cell_positions_arr[idx] = arr
+        timer.stop()
+        if profile:
+            timer.count('steps', self.termination['steps'])
+            if self.vor_grid is not None:
+                timer.count('voronoi_builds', self.vor_grid.voronoi_builds - voronoi_builds0)
+                self.vor_grid.timer = None
+            self.perf_summary = timer.summary()
         
         return history_arr, cell_positions_arr
 
+    def estimate_memory(self, T, save_stride=1, reducers=None, events=None, proliferation_steps=None, apoptosis_steps=None):
+        """
+        simulate(T, save_stride=..., reducers=...) 結果所需的記憶體估計 (見 reducers.estimate_memory)
+        events / proliferation_steps / apoptosis_steps 與 simulate 相同；幾何固定時各幀共用位置，只計一幀
+        """
+        from reducers import estimate_memory
+        from event_scheduler import legacy_events
+        if events is None:
+            events = legacy_events(self.params['dT'], proliferation_steps, apoptosis_steps)
+        positions = self.vor_grid is not None and ('shared' if self.static_geometry(events) else True)
+        return estimate_memory(len(self.init_Y), self.init_Y.shape[1], T, self.params['dT'], save_stride, reducers,
+                               positions=positions)
+
+    def _step_limit(self, t_eval, i, scheduler):
+        # rk23 的步長上限：下一個會改變狀態或幾何 (細胞移動、分裂/死亡到期) 的輸出幀
+        if self.move_rule is not None:
+            return t_eval[i]
+        if scheduler is not None and scheduler:
+            dT = self.params['dT']
+            k = int(np.ceil((scheduler.next_time - 0.5 * dT) / dT - 1e-9))
+            return t_eval[min(max(k, i), len(t_eval) - 1)]
+        return t_eval[-1]
+
+    def solve_steady_state(self, seeds=None, noise=None, warmup=2.0, max_warmup=60.0, check_every=1.0, tol=1e-8,
+                           newton_maxiter=20, gate=0.1, verify=2.0, noise_params=None, progress=None):
+        """
+        靜態組織 (無移動) 直接求 ODE 的穩定固定點，不必積分完整個暫態
+        做法：以 Euler 積分固定的短 warmup 時間 (0 時直接從起始狀態) 後立即以 Newton-Krylov 求根；
+             求得的根再加小擾動積分 verify 時間，擾動縮小 (穩定) 才接受
+             求根失敗或收斂到不穩定的解 (例如均勻解) 時才改回時間積分，每 check_every 再試一次，最多到 max_warmup；
+             此時相對變化率 max|dY| / max(|Y|, 1) 大於 gate 表示仍在劇烈暫態，不嘗試求根 (省下失敗的 Newton 迭代)
+        seeds: int list，每個 seed 由 init_Y 加上不同雜訊出發，可取得不同的側向抑制圖樣；None 時只從 init_Y 求一次
+        noise: seeds 的雜訊幅度，預設 params['sigma'] 或 0.1
+        noise_params: 求根時設為 0 的雜訊參數 (隨機項會讓 RHS 不是確定函數)，預設為名稱含 'noise' 的參數
+        progress: callable(result)，每個 seed 完成時呼叫
+        回傳 dict list：{'seed', 'Y', 'converged', 'stable', 'residual', 't_warmup'}，同時存於 self.steady_states
+        """
+        from scipy.optimize import newton_krylov, NoConvergence
+        if self.move_rule is not None or self.random_strength:
+            raise ValueError('solve_steady_state needs a static tissue (no cell movement)')
+        dT = self.params['dT']
+        cells = self.vor_grid.cells if self.vor_grid is not None else None
+        if noise_params is None:
+            noise_params = [k for k in self.params if 'noise' in k.lower()]
+        det_params = dict(self.params)
+        det_params.update({k: 0 for k in noise_params})
+        noise = noise if noise is not None else (self.params.get('sigma') or 0.1)
+        shape = self.init_Y.shape
+        # 積分與求根都以 t=0 呼叫，多速率模型須用單一速率的 RHS
+        ode = getattr(self.ode_func, 'single_rate', self.ode_func)
+
+        def residual(y):
+            return self._call_ode(ode, y.reshape(shape), 0.0, det_params, cells).ravel()
+
+        def euler(Y, duration, params):
+            for _ in range(max(1, int(round(duration / dT)))):
+                Y = Y + self._call_ode(ode, Y, 0.0, params, cells) * dT
+            return Y
+
+        def attempt(Y, t, rng):
+            try:
+                root = newton_krylov(residual, Y.ravel(), f_tol=tol, maxiter=newton_maxiter)
+                converged = True
+            except (NoConvergence, ValueError, np.linalg.LinAlgError) as e:
+                root = e.args[0] if isinstance(e, NoConvergence) else Y.ravel()
+                converged = False
+            root = root.reshape(shape)
+            stable = False
+            if converged:
+                # 小擾動後積分：後半段距離仍在縮小才是穩定的解
+                # (側向抑制的擾動常先短暫放大再衰減，只比較起點會誤判)
+                # 只看 RHS 有反應的分量 (isolated='freeze' 的細胞等中性方向不會縮小)
+                scale = max(np.abs(root).max(), 1.0) * 1e-3
+                Y_p = root + rng.standard_normal(shape) * scale
+                active = self._call_ode(ode, Y_p, 0.0, det_params, cells) != 0
+                if active.any():
+                    Y_p = euler(Y_p, verify / 2, det_params)
+                    d_half = np.abs(Y_p - root)[active].max()
+                    stable = np.abs(euler(Y_p, verify / 2, det_params) - root)[active].max() < d_half
+            return {'seed': seed, 'Y': root, 'converged': converged, 'stable': bool(stable),
+                    'residual': float(np.abs(residual(root.ravel())).max()), 't_warmup': t}
+
+        results = []
+        for seed in (seeds if seeds is not None else [None]):
+            # 每個 seed 用各自的亂數產生器，不影響全域亂數狀態；seed 為 None 時驗證擾動也固定以便重現
+            rng = np.random.default_rng(seed if seed is not None else 0)
+            if seed is not None:
+                Y = self.init_Y + rng.standard_normal(shape) * noise
+            else:
+                Y = self.init_Y.copy()
+            t = 0.0
+            if warmup > 0:
+                Y = euler(Y, warmup, self.params)
+                t = warmup
+            result = attempt(Y, t, rng)
+            # Newton 失敗時才回到時間積分
+            while not (result['converged'] and result['stable']) and t < max_warmup:
+                Y = euler(Y, check_every, self.params)
+                t += check_every
+                if t < max_warmup and np.abs(residual(Y.ravel())).max() / max(np.abs(Y).max(), 1.0) > gate:
+                    continue
+                result = attempt(Y, t, rng)
+            if progress is not None:
+                progress(result)
+            results.append(result)
+        self.steady_states = results
+        return results
+
     @staticmethod
-    def parameter_scan(cell_count, params, scan_shape, T, ode_func, init_Y=None):
+    def parameter_scan(cell_count, params, scan_shape, T, ode_func, init_Y=None, convergence=None, vor_grid=None, metric=None):
+        """
+        metric: None 時以最後一幀細胞 0 的 Y[2]/Y[3] 比值評分 (舊版行為)；
+                設定為 pattern_metrics 的指標名稱 (例如 'salt_and_pepper'、'morans_i'、'lock_in') 時以整個組織的圖樣評分，需提供 vor_grid
+        """
+        from tqdm import tqdm
         results = np.zeros(scan_shape)
         for rR in tqdm(range(scan_shape[0]), desc='Parameter Scan (rR)'):
             for rT in range(scan_shape[1]):
@@ -85,8 +343,12 @@ class BiophysicsModel:
                 p['betaAb'] += (np.random.rand()-0.5)*p['betaAb']*(1.25*rT/scan_shape[1])
                 p['betaAr'] += (np.random.rand()-0.5)*p['betaAr']*(1.25*rT/scan_shape[1])
                 p['betaBr'] += (np.random.rand()-0.5)*p['betaBr']*(1.25*rT/scan_shape[1])
-                model = BiophysicsModel(cell_count, p, ode_func, init_Y)
-                hist, _ = model.simulate(T)
+                model = BiophysicsModel(cell_count, p, ode_func, init_Y, vor_grid=vor_grid)
+                hist, positions = model.simulate(T, convergence=convergence)
+                if metric is not None:
+                    from pattern_metrics import final_metrics
+                    results[rR, rT] = final_metrics(hist, positions, times=model.frame_times)[metric]
+                    continue
                 # hist 可能是 object array（細胞數可變），只取最後一幀的第0個細胞
                 last = hist[-1]
                 if len(last) > 0:
@@ -97,4 +359,4 @@ class BiophysicsModel:
                         results[rR, rT] = -cell0[2]/(cell0[3]+1e-7)
                 else:
                     results[rR, rT] = np.nan  # 若最後一幀沒細胞
-        return results 
\ No newline at end of file
+        return results 
\ No newline at end of file
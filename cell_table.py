@@ -0,0 +1,215 @@
+import os
+import numpy as np
+
+# 與 on_download_results 匯出的 cells.xlsx 相同欄位
+TABLE_HEADERS = ['T', 'step', 'x', 'y']
+
+
+def _norm(name):
+    return str(name).strip().lower() if name is not None else ''
+
+
+def _is_wanted(name):
+    h = _norm(name)
+    return h in ('t', 'step', 'x', 'y') or h.startswith('y[')
+
+
+def _y_key(h):
+    # 'y[12]' -> 12，用來依序排列濃度欄位
+    try:
+        return int(h[2:-1])
+    except ValueError:
+        return h
+
+
+def _select_frame(columns, frame):
+    """
+    columns: dict，小寫欄名 -> 1D array
+    frame: (T, step) 或 None
+    回傳 (cells, Y)，Y 為 None 表示沒有 Y[i] 欄位
+    """
+    if 'x' not in columns or 'y' not in columns:
+        raise ValueError('檔案需包含 x, y 欄位 (不分大小寫)')
+    x = np.asarray(columns['x'], dtype=float)
+    y = np.asarray(columns['y'], dtype=float)
+    mask = np.isfinite(x) & np.isfinite(y)
+    if frame is not None and 't' in columns and 'step' in columns:
+        mask &= (np.asarray(columns['t']) == frame[0]) & (np.asarray(columns['step']) == frame[1])
+    if not mask.any():
+        raise ValueError(f'No valid cell positions found (T, step)={frame}')
+    cells = np.column_stack([x[mask], y[mask]])
+    y_cols = sorted((h for h in columns if h.startswith('y[')), key=_y_key)
+    Y = None
+    if y_cols:
+        Y = np.column_stack([np.asarray(columns[h], dtype=float)[mask] for h in y_cols])
+    return cells, Y
+
+
+def _read_csv(path, frame, chunksize):
+    import pandas as pd
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        first = f.readline()
+    tokens = [tok.strip() for tok in first.replace('\t', ',').split(',')]
+    try:
+        [float(tok) for tok in tokens if tok]
+        has_header = False
+    except ValueError:
+        has_header = True
+    sep = '\t' if '\t' in first and ',' not in first else ','
+    if not has_header:
+        # 舊格式：無標題，前兩欄為 x, y
+        arr = pd.read_csv(path, header=None, sep=sep, engine='c').to_numpy(dtype=float)
+        if arr.ndim != 2 or arr.shape[1] < 2:
+            raise ValueError('csv/txt 檔案至少需要兩欄 (x, y)')
+        return arr[:, :2], None
+    reader = pd.read_csv(path, sep=sep, usecols=_is_wanted, chunksize=chunksize, engine='c', encoding='utf-8-sig')
+    parts = []
+    for chunk in reader:
+        chunk.columns = [_norm(c) for c in chunk.columns]
+        if frame is not None and 't' in chunk and 'step' in chunk:
+            hit = (chunk['t'].to_numpy() == frame[0]) & (chunk['step'].to_numpy() == frame[1])
+            if not hit.any():
+                # 匯出檔依時間排序，已找到該幀後即可提前結束
+                if parts:
+                    break
+                continue
+            chunk = chunk[hit]
+        parts.append(chunk)
+    if not parts:
+        raise ValueError(f'No valid cell positions found (T, step)={frame}')
+    df = pd.concat(parts, ignore_index=True)
+    return _select_frame({c: df[c].to_numpy() for c in df.columns}, frame)
+
+
+def _read_excel(path, frame):
+    import pandas as pd
+    df = None
+    # 優先使用 calamine (較快)，沒有安裝時退回 openpyxl/xlrd
+    for engine in ('calamine', None):
+        try:
+            df = pd.read_excel(path, usecols=_is_wanted, engine=engine)
+            break
+        except (ImportError, ValueError) as e:
+            if engine is None:
+                if isinstance(e, ImportError):
+                    raise ImportError('openpyxl is required to import xlsx files')
+                raise
+    df.columns = [_norm(c) for c in df.columns]
+    return _select_frame({c: df[c].to_numpy() for c in df.columns}, frame)
+
+
+def _read_parquet(path, frame):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow is required to import parquet files')
+    names = [n for n in pq.read_schema(path).names if _is_wanted(n)]
+    lookup = {_norm(n): n for n in names}
+    filters = None
+    if frame is not None and 't' in lookup and 'step' in lookup:
+        filters = [(lookup['t'], '==', frame[0]), (lookup['step'], '==', frame[1])]
+    table = pq.read_table(path, columns=names, filters=filters)
+    return _select_frame({_norm(n): table.column(n).to_numpy() for n in names}, frame)
+
+
+def _read_binary(path, frame):
+    ext = os.path.splitext(path)[-1].lower()
+    if ext == '.npz':
+        with np.load(path) as z:
+            columns = {_norm(k): z[k] for k in z.files if _is_wanted(k)}
+        return _select_frame(columns, frame)
+    arr = np.load(path, mmap_mode='r')
+    if arr.dtype.names:
+        columns = {_norm(k): arr[k] for k in arr.dtype.names if _is_wanted(k)}
+        return _select_frame(columns, frame)
+    if arr.ndim != 2 or arr.shape[1] < 2:
+        raise ValueError('npy 檔案需為 (cell, 2) 的座標陣列')
+    return np.array(arr[:, :2], dtype=float), None
+
+
+def read_cell_table(path, frame=(0, 0), chunksize=200_000):
+    """
+    讀取細胞座標表，回傳指定 (T, step) 幀的 (cells, Y)
+    path: .xlsx/.xls, .csv/.txt, .parquet, .npz/.npy
+    frame: (T, step)，檔案含 T/step 欄位時只取該幀；None 則取全部列
+    chunksize: csv 分塊讀取的列數
+    Y: 由 Y[i] 欄位組成的 (cell, var) 陣列，檔案沒有濃度欄位時為 None
+    """
+    ext = os.path.splitext(path)[-1].lower()
+    if ext in ('.xlsx', '.xls'):
+        return _read_excel(path, frame)
+    if ext == '.parquet':
+        return _read_parquet(path, frame)
+    if ext in ('.npz', '.npy'):
+        return _read_binary(path, frame)
+    return _read_csv(path, frame, chunksize)
+
+
+def frame_labels(n_frames, dT_step, frame_times=None):
+    """
+    各幀的 (T, step) 標籤
+    frame_times: 各幀時間 (model.frame_times)；None 時假設每步存一幀
+    回傳 (T, step) 兩個 int array，step 為該單位時間內的第幾個 dT
+    """
+    if frame_times is None or len(frame_times) != n_frames:
+        frame_idx = np.arange(n_frames)
+        T = frame_idx // dT_step
+        return T, frame_idx - T * dT_step
+    # 以步數取整避免 0.1*9 之類的浮點誤差
+    total = np.rint(np.asarray(frame_times, dtype=float) * dT_step).astype(np.int64)
+    T = total // dT_step
+    return T, total - T * dT_step
+
+
+def cell_table_columns(sim_history, cell_positions_history, dT_step, frame_times=None):
+    """
+    將模擬結果攤平成欄位，格式與 cells.xlsx 相同
+    dT_step: 每單位時間的步數 (1/dT)
+    frame_times: 各幀時間，save_stride > 1 或提前結束時用來標記 T/step
+    回傳 dict: T, step, x, y, Y (row, var)
+    """
+    counts = np.array([len(Y) for Y in sim_history], dtype=np.int64)
+    T_frame, step_frame = frame_labels(len(sim_history), dT_step, frame_times)
+    T_col = np.repeat(T_frame, counts)
+    step_col = np.repeat(step_frame, counts)
+    pos = np.concatenate([np.asarray(p) for p in cell_positions_history]) if len(cell_positions_history) else np.zeros((0, 2))
+    Y = np.concatenate([np.asarray(Y) for Y in sim_history]) if len(sim_history) else np.zeros((0, 0))
+    return {'T': T_col, 'step': step_col, 'x': pos[:, 0], 'y': pos[:, 1], 'Y': Y}
+
+
+def write_cell_table(path, sim_history, cell_positions_history, dT_step, progress=None, frame_times=None):
+    """
+    匯出每個時間點每個細胞的座標與濃度
+    path: .xlsx, .csv 或 .npz (二進位，匯入最快)
+    frame_times: 各幀時間 (model.frame_times)，None 時假設每步存一幀
+    progress: callable(fraction)，回報進度 (0~1)
+    """
+    cols = cell_table_columns(sim_history, cell_positions_history, dT_step, frame_times)
+    nY = cols['Y'].shape[1] if cols['Y'].ndim == 2 else 0
+    y_names = [f'Y[{i}]' for i in range(nY)]
+    ext = os.path.splitext(path)[-1].lower()
+    if ext == '.npz':
+        np.savez(path, T=cols['T'], step=cols['step'], x=cols['x'], y=cols['y'],
+                 **{name: cols['Y'][:, i] for i, name in enumerate(y_names)})
+    elif ext == '.csv':
+        table = np.column_stack([cols['T'], cols['step'], cols['x'], cols['y'], cols['Y']])
+        fmt = ['%d', '%d'] + ['%.10g'] * (table.shape[1] - 2)
+        np.savetxt(path, table, delimiter=',', fmt=fmt, header=','.join(TABLE_HEADERS + y_names), comments='')
+    else:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(TABLE_HEADERS + y_names)
+        rows = np.column_stack([cols['x'], cols['y'], cols['Y']]).tolist()
+        T_list = cols['T'].tolist()
+        step_list = cols['step'].tolist()
+        n = len(rows)
+        report = max(1, n // 100)
+        for r in range(n):
+            ws.append([T_list[r], step_list[r]] + rows[r])
+            if progress is not None and r % report == 0:
+                progress(r / n)
+        wb.save(path)
+    if progress is not None:
+        progress(1.0)
+    return path
@@ -0,0 +1,182 @@
+"""
+參數延續 (continuation)：沿一個參數的路徑依序求穩態，每一點從前一點收斂的狀態出發
+步長自動調整：狀態變化小時加大，變化過大、圖樣翻轉或未收斂時減半重算
+用法:
+    python -m continuation config.json --param betaR --stop 60 [--step 5] [--min-step 0.25] [--out path.jsonl]
+結束碼: 0 成功 / 1 有點未收斂 / 2 參數或設定錯誤
+"""
+import sys
+import json
+import time
+import argparse
+import logging
+import numpy as np
+from convergence import ConvergenceMonitor, binary_pattern
+
+METHODS = ['steady', 'simulate']
+
+logger = logging.getLogger('VoronoiContinuation')
+
+
+class Continuation:
+    """
+    沿 param 從 model.params[param] 走到 stop
+    model: 靜態組織的 BiophysicsModel (無移動)，第一點由 model.init_Y 冷啟動
+    step: 初始步長 (正值，方向由 stop 決定)；min_step / max_step: 步長範圍
+    method: 'steady' 以 solve_steady_state 從前一點直接求根；'simulate' 從前一點積分到收斂 (最多 T)
+    max_change: 相鄰兩點的相對變化 max|ΔY| / max(|Y|, 1) 上限，超過時縮小步長
+    pattern_var: 判斷高/低細胞圖樣的變數 index；圖樣翻轉時縮小步長直到 min_step，之後記錄為圖樣轉變
+    """
+    def __init__(self, model, param, stop, step, min_step=None, max_step=None, method='steady', max_change=0.2,
+                 pattern_var=0, T=50.0):
+        if method not in METHODS:
+            raise ValueError(f'unknown method {method!r}; choose from {METHODS}')
+        if model.move_rule is not None or model.random_strength:
+            raise ValueError('continuation needs a static tissue (no cell movement)')
+        if param not in model.params:
+            raise ValueError(f'parameter {param!r} not in params')
+        if step <= 0:
+            raise ValueError('step must be > 0')
+        self.model = model
+        self.param = param
+        self.start = float(model.params[param])
+        self.stop = float(stop)
+        self.step = float(step)
+        self.min_step = float(min_step) if min_step else self.step / 16
+        self.max_step = float(max_step) if max_step else self.step * 4
+        self.method = method
+        self.max_change = max_change
+        self.pattern_var = pattern_var
+        self.T = T
+        self.records = []
+
+    @property
+    def transitions(self):
+        """圖樣有細胞翻轉或未收斂的點"""
+        return [r for r in self.records if r['flipped'] or not r['converged']]
+
+    def _solve(self, value, Y0, cold=False):
+        # 以 Y0 為起點求 param=value 的穩態，回傳 (Y, converged)
+        model = self.model
+        model.params[self.param] = value
+        model.init_Y = Y0
+        if self.method == 'steady':
+            # 延續時已接近固定點，不需暖身積分
+            result = model.solve_steady_state(warmup=2.0 if cold else 0.0)[0]
+            return result['Y'], result['converged'] and result['stable']
+        history, _ = model.simulate(self.T, progress=False, convergence=ConvergenceMonitor())
+        return np.asarray(history[-1], dtype=float), model.termination['reason'] != 'T'
+
+    def _record(self, value, Y, converged, change, flipped, step, seconds, retries):
+        from parameter_sweep import summarize
+        positions = [self.model.vor_grid.cells] if self.model.vor_grid is not None else None
+        record = {'value': value, 'Y': Y, 'converged': bool(converged), 'change': float(change),
+                  'flipped': int(flipped), 'step': step, 'retries': retries, 'seconds': seconds,
+                  'metrics': summarize([Y], self.model.params.get('labels'), positions)}
+        self.records.append(record)
+        return record
+
+    def run(self, log=None):
+        """走完整條路徑，回傳紀錄 list (每點含 Y、收斂與否、相對變化、翻轉細胞數、步長、metrics)"""
+        for _ in self.iter_points(log):
+            pass
+        return self.records
+
+    def iter_points(self, log=None):
+        """與 run 相同，但每完成一點就 yield 該紀錄 (呼叫端可立即寫檔，中斷時已完成的點不會遺失)"""
+        init_Y = self.model.init_Y
+        try:
+            t0 = time.perf_counter()
+            Y, converged = self._solve(self.start, init_Y.copy(), cold=True)
+            record = self._record(self.start, Y, converged, 0.0, 0, 0.0, time.perf_counter() - t0, 0)
+            if log:
+                log(self.format_record(record))
+            yield record
+            value = self.start
+            direction = 1.0 if self.stop >= self.start else -1.0
+            step = self.step
+            while direction * (self.stop - value) > 1e-12:
+                t0 = time.perf_counter()
+                retries = 0
+                while True:
+                    h = min(step, abs(self.stop - value))
+                    trial = value + direction * h
+                    Y_new, ok = self._solve(trial, Y.copy())
+                    change = np.abs(Y_new - Y).max() / max(np.abs(Y).max(), 1.0)
+                    old = binary_pattern(Y, self.pattern_var)
+                    new = binary_pattern(Y_new, self.pattern_var)
+                    if old is None or new is None:
+                        flipped = 0 if (old is None) == (new is None) else len(Y)
+                    else:
+                        flipped = int(np.count_nonzero(old != new))
+                    if (not ok or change > self.max_change or flipped) and h > self.min_step:
+                        step = max(h / 2, self.min_step)
+                        retries += 1
+                        continue
+                    break
+                record = self._record(trial, Y_new, ok, change, flipped, h, time.perf_counter() - t0, retries)
+                if log:
+                    log(self.format_record(record))
+                yield record
+                value, Y = trial, Y_new
+                if ok and not flipped and change < self.max_change / 4:
+                    step = min(h * 1.5, self.max_step)
+        finally:
+            self.model.params[self.param] = self.start
+            self.model.init_Y = init_Y
+
+    def format_record(self, record):
+        text = f"{self.param}={record['value']:.6g} step={record['step']:.3g} change={record['change']:.3g}"
+        if record['flipped']:
+            text += f" pattern change: {record['flipped']} cell(s) flipped"
+        if not record['converged']:
+            text += ' (not converged)'
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m continuation',
+                                     description='Trace steady states along one model parameter of a saved config.json.')
+    parser.add_argument('config', help='config.json saved by the GUI')
+    parser.add_argument('--param', required=True, help='parameter to vary')
+    parser.add_argument('--start', type=float, default=None, help='start value (default: value in params)')
+    parser.add_argument('--stop', type=float, required=True)
+    parser.add_argument('--step', type=float, default=None, help='initial step (default: 1/20 of the range)')
+    parser.add_argument('--min-step', type=float, default=None, help='smallest step (default: step/16)')
+    parser.add_argument('--max-step', type=float, default=None, help='largest step (default: 4*step)')
+    parser.add_argument('--method', choices=METHODS, default='steady')
+    parser.add_argument('--max-change', type=float, default=0.2, help='largest relative state change between points')
+    parser.add_argument('--T', type=float, default=50.0, help='longest integration per point for --method simulate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='continuation.jsonl', help='JSON-lines record per point')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    import sim_config
+    from batch_runner import load_config, ConfigError
+    try:
+        config = load_config(args.config)
+        params = sim_config.parse_params(config.get('params') or sim_config.default_texts()[1])
+        if args.start is not None:
+            params[args.param] = args.start
+        if args.param not in params:
+            raise ConfigError(f'parameter {args.param!r} not in params')
+        step = args.step or abs(args.stop - float(params[args.param])) / 20 or 1.0
+        model, _ = sim_config.build_model(config, params=params, seed=args.seed)
+        cont = Continuation(model, args.param, args.stop, step, min_step=args.min_step, max_step=args.max_step,
+                            method=args.method, max_change=args.max_change, T=args.T)
+    except (ConfigError, ValueError, SyntaxError) as e:
+        logger.error(str(e))
+        return 2
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for record in cont.iter_points(log=logger.info):
+            out = {k: v for k, v in record.items() if k != 'Y'}
+            f.write(json.dumps(out, ensure_ascii=False) + '\n')
+            f.flush()
+    transitions = cont.transitions
+    logger.info(f'{len(cont.records)} point(s), {len(transitions)} pattern change(s); results in {args.out}')
+    return 0 if all(r['converged'] for r in cont.records) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+from collections import deque
+import numpy as np
+
+# 穩態偵測：模擬已收斂時提早結束
+# 1. dY 範數：最近 window 時間內每步的相對變化率 max|dY| / max(|Y|, 1) 都小於 tol
+# 2. 圖樣穩定：以門檻二值化某個變數 (高/低細胞)，連續 pattern_checks 次檢查都相同，
+#    且該變數在兩次檢查間的變化小於 drift * (max - min) (高低分群常比濃度本身早固定)
+STEADY_STATE = 'steady_state'
+PATTERN_STABLE = 'pattern_stable'
+REACHED_T = 'T'
+
+
+def binary_pattern(Y, var=0, contrast=0.5):
+    """
+    Y[:, var] 以 (min + max) / 2 二值化成高/低細胞 (bool array)
+    高低差距不到 contrast * max|Y[:, var]| (尚未形成圖樣) 時回傳 None
+    """
+    y = Y[:, var]
+    lo, hi = y.min(), y.max()
+    if hi - lo <= contrast * max(abs(lo), abs(hi), 1e-12):
+        return None
+    return y > 0.5 * (lo + hi)
+
+
+class ConvergenceMonitor:
+    """
+    每一步由 BiophysicsModel.simulate 呼叫 update(t, Y, dY)，回傳停止原因或 None
+    tol: dY 相對變化率門檻，None 時不檢查
+    window: dY 需持續低於 tol 的時間長度
+    pattern_var: 二值化的變數 index，None 時不檢查圖樣
+    pattern_checks: 圖樣需連續相同的檢查次數；check_every: 圖樣檢查間隔 (時間)
+    contrast: 高低細胞差距需大於 contrast * max|Y[:, var]| 才視為已形成圖樣 (避免均勻狀態的雜訊)
+    drift: 兩次檢查間 Y[:, var] 的最大變化需小於 drift * (max - min)
+    min_time: 此時間之前不停止
+    細胞數改變 (分裂/死亡) 時重新累計
+    """
+    def __init__(self, tol=1e-4, window=2.0, pattern_var=0, pattern_checks=5, check_every=1.0,
+                 contrast=0.5, drift=0.02, min_time=0.0):
+        if tol is None and pattern_var is None:
+            raise ValueError('enable at least one of tol or pattern_var')
+        self.tol = tol
+        self.window = window
+        self.pattern_var = pattern_var
+        self.pattern_checks = pattern_checks
+        self.check_every = check_every
+        self.contrast = contrast
+        self.drift = drift
+        self.min_time = min_time
+        self.start(1.0)
+
+    def settings(self):
+        """影響結果的設定 (結果快取的鍵使用)"""
+        return {'tol': self.tol, 'window': self.window, 'pattern_var': self.pattern_var,
+                'pattern_checks': self.pattern_checks, 'check_every': self.check_every,
+                'contrast': self.contrast, 'drift': self.drift, 'min_time': self.min_time}
+
+    def start(self, dT):
+        """模擬開始時呼叫，依時間步長換算步數"""
+        self.dT = dT
+        self._window_steps = max(1, int(round(self.window / dT)))
+        self._check_steps = max(1, int(round(self.check_every / dT)))
+        self.reset()
+
+    def reset(self):
+        self._rates = deque(maxlen=self._window_steps)
+        self._pattern = None
+        self._values = None
+        self._same = 0
+        self._step = 0
+        self._n_cells = None
+
+    def update(self, t, Y, dY):
+        if len(Y) != self._n_cells:
+            self.reset()
+            self._n_cells = len(Y)
+        self._step += 1
+        if self.tol is not None:
+            self._rates.append(np.abs(dY).max() / max(np.abs(Y).max(), 1.0) if len(Y) else 0.0)
+        if self.pattern_var is not None and self._step % self._check_steps == 0:
+            pattern = binary_pattern(Y, self.pattern_var, self.contrast)
+            values = Y[:, self.pattern_var].copy()
+            if pattern is not None and self._pattern is not None and np.array_equal(pattern, self._pattern) \
+                    and np.abs(values - self._values).max() < self.drift * (values.max() - values.min()):
+                self._same += 1
+            else:
+                self._same = 0
+            self._pattern = pattern
+            self._values = values
+        if t < self.min_time:
+            return None
+        if self.tol is not None and len(self._rates) == self._window_steps and max(self._rates) < self.tol:
+            return STEADY_STATE
+        if self.pattern_var is not None and self._same >= self.pattern_checks:
+            return PATTERN_STABLE
+        return None
@@ -0,0 +1,159 @@
+import inspect
+import numpy as np
+from scipy import sparse
+from scipy.spatial import Voronoi, cKDTree
+
+
+def neighbor_matrix(cells, vor=None, max_length=2.0):
+    """
+    Voronoi 鄰接矩陣 (CSR)，權重為共用邊長
+    規則與 get_voronoi_neighbors_wo_outer 相同：略過含無限端點或長度 > max_length 的邊
+    """
+    n = len(cells)
+    if vor is None:
+        vor = Voronoi(cells)
+    ridge_vertices = np.asarray(vor.ridge_vertices)
+    ridge_points = np.asarray(vor.ridge_points)
+    finite = (ridge_vertices >= 0).all(axis=1)
+    rv = ridge_vertices[finite]
+    rp = ridge_points[finite]
+    length = np.linalg.norm(vor.vertices[rv[:, 0]] - vor.vertices[rv[:, 1]], axis=1)
+    keep = length <= max_length
+    rp, length = rp[keep], length[keep]
+    rows = np.concatenate([rp[:, 0], rp[:, 1]])
+    cols = np.concatenate([rp[:, 1], rp[:, 0]])
+    return sparse.csr_matrix((np.concatenate([length, length]), (rows, cols)), shape=(n, n))
+
+
+def gaussian_kernel(cells, sigma, cutoff=6.0, dense_limit=4_000_000):
+    """
+    高斯擴散權重 W_ij = exp(-d_ij^2 / (2 sigma^2))，含自身 (W_ii = 1)
+    cells 數的平方 <= dense_limit 時回傳完整 (dense) 矩陣，與 diffusion_weighted_mean 完全相同；
+    否則以 cKDTree 只保留 d < cutoff*sigma 的項 (CSR)
+    """
+    n = len(cells)
+    if n * n <= dense_limit:
+        from scipy.spatial.distance import cdist
+        return np.exp(-cdist(cells, cells, 'sqeuclidean') / (2 * sigma**2))
+    tree = cKDTree(cells)
+    pairs = tree.sparse_distance_matrix(tree, cutoff * sigma, output_type='ndarray')
+    off = pairs['i'] != pairs['j']
+    i = np.concatenate([pairs['i'][off], np.arange(n)])
+    j = np.concatenate([pairs['j'][off], np.arange(n)])
+    d = np.concatenate([pairs['v'][off], np.zeros(n)])
+    return sparse.csr_matrix((np.exp(-d**2 / (2 * sigma**2)), (i, j)), shape=(n, n))
+
+
+def accepts_ctx(func):
+    """ode 函數是否接受 ctx 參數 (ode(Y, t, params, cell_positions, ctx=None))"""
+    try:
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return 'ctx' in params or any(p.kind == p.VAR_KEYWORD for p in params.values())
+
+
+class CouplingContext:
+    """
+    某一時刻細胞幾何的耦合算子，延遲計算並快取
+    cells: (cell, 2) 座標；vor: 已建好的 Voronoi (可省略)
+    BiophysicsModel 會把目前幾何的 context 以 ctx= 傳給接受 ctx 參數的 ode，幾何不變時重複使用同一個物件
+    """
+    def __init__(self, cells, vor=None, max_length=2.0):
+        self.cells = np.asarray(cells)
+        self._vor = vor
+        self.max_length = max_length
+        self._neighbors = None
+        self._neighbor_weight = None
+        self._degree = None
+        self._boundary = None
+        self._areas = None
+        self._kernels = {}
+        self._cache = {}
+
+    @classmethod
+    def from_grid(cls, grid):
+        """VoronoiGrid 目前幾何的 context (共用 grid 已建好的 Voronoi)"""
+        return cls(grid.cells, grid.vor)
+
+    @property
+    def n_cells(self):
+        return len(self.cells)
+
+    @property
+    def vor(self):
+        if self._vor is None:
+            self._vor = Voronoi(self.cells)
+        return self._vor
+
+    @property
+    def neighbors(self):
+        """鄰居 CSR，權重為邊長"""
+        if self._neighbors is None:
+            self._neighbors = neighbor_matrix(self.cells, self.vor, self.max_length)
+        return self._neighbors
+
+    @property
+    def neighbor_weight(self):
+        """每個細胞的鄰居權重和 (邊長總和)"""
+        if self._neighbor_weight is None:
+            self._neighbor_weight = np.asarray(self.neighbors.sum(axis=1)).ravel()
+        return self._neighbor_weight
+
+    @property
+    def has_neighbors(self):
+        return self.neighbor_weight > 0
+
+    @property
+    def degree(self):
+        """每個細胞的鄰居數 (int)"""
+        if self._degree is None:
+            self._degree = np.diff(self.neighbors.indptr)
+        return self._degree
+
+    @property
+    def boundary_mask(self):
+        """外圈細胞 (region 開放) 與其相鄰細胞的布林遮罩，即 VoronoiGrid.inner_mask 的反向"""
+        if self._boundary is None:
+            from voronoi_grid import voronoi_inner_mask
+            self._boundary = ~voronoi_inner_mask(self.vor)
+        return self._boundary
+
+    @property
+    def areas(self):
+        """每個細胞的 Voronoi 面積，開放 region 為 inf"""
+        if self._areas is None:
+            from voronoi_grid import voronoi_areas
+            self._areas = voronoi_areas(self.vor)
+        return self._areas
+
+    def cached(self, key, func, *args):
+        """ODE 自訂的衍生資料 (例如舊式 sD_ode 的鄰居 dict)：同一個 context 的每個 key 只呼叫一次 func(*args)"""
+        if key not in self._cache:
+            self._cache[key] = func(*args)
+        return self._cache[key]
+
+    def neighbor_sum(self, values):
+        """以邊長加權的鄰居總和"""
+        return self.neighbors @ values
+
+    def neighbor_mean(self, values):
+        """以邊長加權的鄰居平均；沒有鄰居的細胞回傳 0"""
+        w = self.neighbor_weight
+        total = self.neighbors @ values
+        return np.divide(total, w, out=np.zeros_like(total, dtype=float), where=w > 0)
+
+    def gaussian_kernel(self, sigma):
+        """高斯權重矩陣 (見 gaussian_kernel)，每個 sigma 只建一次"""
+        key = float(sigma)
+        if key not in self._kernels:
+            W = gaussian_kernel(self.cells, key)
+            row_sum = np.asarray(W.sum(axis=1)).ravel()
+            self._kernels[key] = (W, row_sum)
+        return self._kernels[key][0]
+
+    def diffuse(self, values, sigma):
+        """高斯加權平均，等同對每個細胞呼叫 diffusion_weighted_mean"""
+        self.gaussian_kernel(sigma)
+        W, row_sum = self._kernels[float(sigma)]
+        return (W @ values) / row_sum
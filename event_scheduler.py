@@ -0,0 +1,258 @@
+import heapq
+import numpy as np
+
+# 細胞分裂 / 死亡事件排程
+# 事件依下次觸發時間放在 heap 中，每一步只處理已到期的事件；
+# 同一步到期的所有分裂與死亡合併後一次套用，只重建一次 Voronoi
+DIVIDE = 'divide'
+REMOVE = 'remove'
+
+
+class Event:
+    """
+    事件基底類別
+    kind: 'divide' 或 'remove'
+    next_time(t, grid, Y): 回傳 t 之後下一次觸發時間 (None 表示不再觸發)
+    select(t, grid, Y, exclude): 回傳這次要分裂/移除的細胞 index
+    immediate 為 True 的事件不合併，改以 apply(t, grid, Y, exclude) 直接更新 grid，回傳 (新 Y, 新細胞數)
+    """
+    immediate = False
+
+    def __init__(self, kind):
+        if kind not in (DIVIDE, REMOVE):
+            raise ValueError("kind 必須為 'divide' 或 'remove'")
+        self.kind = kind
+
+    def first_time(self, t0, grid, Y):
+        return self.next_time(t0, grid, Y)
+
+    def next_time(self, t, grid, Y):
+        raise NotImplementedError
+
+    def select(self, t, grid, Y, exclude):
+        raise NotImplementedError
+
+
+class FixedEvent(Event):
+    """
+    固定時間表：從 start 開始每隔 every 觸發一次 (或明確的 times list)
+    每次選 n 個內圈細胞，mode='area' (分裂取最大、死亡取最小面積) 或 'random'
+    sequential: 分裂時每分裂一個就重建 Voronoi 再選下一個 (VoronoiGrid.cell_proliferation，舊版 simulate 的行為)
+    """
+    def __init__(self, kind, every=None, start=None, n=1, mode='area', until=None, times=None, sequential=False):
+        super().__init__(kind)
+        self.immediate = sequential and kind == DIVIDE
+        if times is None and not every:
+            raise ValueError('FixedEvent needs every > 0 or explicit times')
+        self.every = every
+        self.start = every if start is None else start
+        self.n = n
+        self.mode = mode
+        self.until = until
+        self.times = sorted(times) if times is not None else None
+
+    def first_time(self, t0, grid, Y):
+        if self.times is not None:
+            return self._after(t0, inclusive=True)
+        return self.start
+
+    def _after(self, t, inclusive=False):
+        import bisect
+        i = (bisect.bisect_left if inclusive else bisect.bisect_right)(self.times, t)
+        return self.times[i] if i < len(self.times) else None
+
+    def next_time(self, t, grid, Y):
+        if self.times is not None:
+            return self._after(t)
+        nxt = t + self.every
+        if self.until is not None and nxt > self.until:
+            return None
+        return nxt
+
+    def select(self, t, grid, Y, exclude):
+        return grid.select_cells(self.n, self.mode, largest=self.kind == DIVIDE, exclude=exclude)
+
+    def apply(self, t, grid, Y, exclude):
+        if Y is None:
+            return None, len(grid.cell_proliferation(self.n, self.mode, exclude=exclude, t=t))
+        born, Y = grid.cell_proliferation(self.n, self.mode, Y, exclude=exclude, t=t)
+        return Y, len(born)
+
+
+class RateEvent(Event):
+    """
+    隨機速率事件 (類 Gillespie)：每個可選的內圈細胞各有一個速率 (hazard)
+    mode='random': 每個細胞的速率都是 rate；'area': 分裂為 rate × 面積、死亡為 rate ÷ 面積 (偏向大/小細胞)
+    整個組織的下一次事件間隔 ~ Exp(所有內圈細胞速率的總和)，每次觸發依速率比例選 1 個細胞
+    沒有內圈細胞時不再觸發
+    """
+    def __init__(self, kind, rate, mode='random', start=0.0, until=None):
+        super().__init__(kind)
+        if rate <= 0:
+            raise ValueError('rate must be > 0')
+        self.rate = rate
+        self.mode = mode
+        self.start = start
+        self.until = until
+
+    def hazards(self, grid):
+        """(內圈細胞 index, 各細胞速率)"""
+        pool = np.flatnonzero(grid.inner_mask())
+        if self.mode == 'area':
+            areas = grid.cell_areas()[pool]
+            return pool, self.rate * (areas if self.kind == DIVIDE else 1.0 / np.maximum(areas, 1e-12))
+        return pool, np.full(len(pool), float(self.rate))
+
+    def _draw(self, t, grid):
+        total = self.hazards(grid)[1].sum() if grid is not None else self.rate
+        if total <= 0:
+            return None
+        nxt = max(t, self.start) + np.random.exponential(1.0 / total)
+        if self.until is not None and nxt > self.until:
+            return None
+        return nxt
+
+    def first_time(self, t0, grid, Y):
+        return self._draw(t0, grid)
+
+    def next_time(self, t, grid, Y):
+        return self._draw(t, grid)
+
+    def select(self, t, grid, Y, exclude):
+        pool, rates = self.hazards(grid)
+        if exclude:
+            keep = ~np.isin(pool, np.asarray(list(exclude), dtype=np.int64))
+            pool, rates = pool[keep], rates[keep]
+        if len(pool) == 0:
+            return []
+        if self.mode == 'area':
+            return [int(np.random.choice(pool, p=rates / rates.sum()))]
+        return [int(np.random.choice(pool))]
+
+
+class TriggerEvent(Event):
+    """
+    條件觸發：每隔 check_every 檢查一次 condition(grid, Y) -> 布林遮罩 (cell,)
+    符合條件的內圈細胞會分裂/移除，每次最多 max_per_check 個 (依條件值排序時取前面的)
+    可用 area_above / area_below / concentration_above / concentration_below 建立條件
+    """
+    def __init__(self, kind, condition, check_every, max_per_check=None, start=None, inner_only=True):
+        super().__init__(kind)
+        self.condition = condition
+        self.check_every = check_every
+        self.max_per_check = max_per_check
+        self.start = check_every if start is None else start
+        self.inner_only = inner_only
+
+    def first_time(self, t0, grid, Y):
+        return self.start
+
+    def next_time(self, t, grid, Y):
+        return t + self.check_every
+
+    def select(self, t, grid, Y, exclude):
+        mask = np.asarray(self.condition(grid, Y), dtype=bool)
+        if self.inner_only:
+            mask &= grid.inner_mask()
+        if exclude:
+            mask[list(exclude)] = False
+        chosen = np.flatnonzero(mask)
+        if self.max_per_check is not None:
+            chosen = chosen[:self.max_per_check]
+        return chosen.tolist()
+
+
+def area_above(threshold):
+    return lambda grid, Y: grid.cell_areas() > threshold
+
+
+def area_below(threshold):
+    return lambda grid, Y: grid.cell_areas() < threshold
+
+
+def concentration_above(var, threshold):
+    return lambda grid, Y: Y[:, var] > threshold
+
+
+def concentration_below(var, threshold):
+    return lambda grid, Y: Y[:, var] < threshold
+
+
+class EventScheduler:
+    """
+    事件 heap
+    events: Event list；dT: 時間步長，t 在 [事件時間 - dT/2, ...) 內即視為到期
+    每步先以 next_time 判斷是否有事件到期，沒有時只需 O(1)
+    """
+    def __init__(self, events, dT, t0=0.0, grid=None, Y=None):
+        self.events = list(events)
+        self.dT = dT
+        self._heap = []
+        self._seq = 0
+        for ev in self.events:
+            self._push(ev.first_time(t0, grid, Y), ev)
+
+    def _push(self, time, ev):
+        if time is None:
+            return
+        heapq.heappush(self._heap, (time, self._seq, ev))
+        self._seq += 1
+
+    @property
+    def next_time(self):
+        return self._heap[0][0] if self._heap else np.inf
+
+    def is_due(self, t):
+        return self.next_time <= t + 0.5 * self.dT
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    def apply(self, t, grid, Y):
+        """
+        處理所有在 t 到期的事件：合併分裂與死亡名單後一次更新 grid
+        同一細胞同時被選為分裂與死亡時以死亡為準
+        immediate 事件依到期順序當場套用 (新細胞接在尾端，已選的 index 不受影響)
+        回傳 (新 Y, 分裂數, 死亡數)
+        """
+        horizon = t + 0.5 * self.dT
+        divide, remove = [], []
+        taken = set()
+        born_now = 0
+        while self._heap and self._heap[0][0] <= horizon:
+            time, _, ev = heapq.heappop(self._heap)
+            if ev.immediate:
+                Y, n_born = ev.apply(t, grid, Y, taken)
+                born_now += n_born
+            else:
+                chosen = ev.select(t, grid, Y, taken)
+                (divide if ev.kind == DIVIDE else remove).extend(chosen)
+                taken.update(chosen)
+            nxt = ev.next_time(time, grid, Y)
+            # 速率事件在同一步內可能多次到期 (細胞數多或 rate 大)
+            self._push(nxt, ev)
+        remove_set = set(remove)
+        divide = [i for i in divide if i not in remove_set]
+        born, died, Y = grid.apply_events(divide, remove, Y, t=t)
+        return Y, born + born_now, died
+
+
+def legacy_events(dT, proliferation_steps=None, apoptosis_steps=None, proliferation_n=5, apoptosis_n=3,
+                  proliferation_mode='area', apoptosis_mode='area'):
+    """
+    舊版 simulate 參數 (步驟 list 或 'all') 轉成 FixedEvent
+    步驟 i 對應時間 i*dT；第 0 步不觸發 (與原本從第 1 步開始的迴圈相同)
+    分裂為 sequential (每分裂一個就重新選擇)，先分裂再死亡，與原本的結果相同
+    """
+    events = []
+    for kind, steps, n, mode in ((DIVIDE, proliferation_steps, proliferation_n, proliferation_mode),
+                                 (REMOVE, apoptosis_steps, apoptosis_n, apoptosis_mode)):
+        if not steps or not n:
+            continue
+        if steps == 'all':
+            events.append(FixedEvent(kind, every=dT, start=dT, n=n, mode=mode, sequential=True))
+        else:
+            times = sorted(i * dT for i in set(steps) if i >= 1)
+            if times:
+                events.append(FixedEvent(kind, times=times, n=n, mode=mode, sequential=True))
+    return events
@@ -1,34 +1,25 @@
 def get_default_ode():
-    return '''def ode(Y, t, params, cell_positions):
+    return '''def ode(Y, t, params, cell_positions, ctx=None):
+    # ctx: BiophysicsModel 傳入的 CouplingContext (鄰居邊長權重、高斯擴散核已快取)；單獨呼叫時自行建立
     p = params
-    dY = np.zeros_like(Y)
+    if ctx is None:
+        ctx = CouplingContext(cell_positions)
     D, R, sD3, sD4 = Y[:,0], Y[:,1], Y[:,2], Y[:,3]
-    neighbors = get_voronoi_neighbors_wo_outer(cell_positions)
-    sigma_diff_sD3 = p.get('sigma_diff_sD3', 2.0)
-    sigma_diff_sD4 = p.get('sigma_diff_sD4', 2.0)
-    for i in range(Y.shape[0]):
-        neibs = neighbors[i]
-        if neibs:
-            weights = np.array(list(neibs.values()))
-            dvals = np.array([D[j] for j in neibs.keys()])
-            sD3_weighted = diffusion_weighted_mean(sD3, cell_positions, i, sigma_diff_sD3)
-            sD4_weighted = diffusion_weighted_mean(sD4, cell_positions, i, sigma_diff_sD4)
-            avgD = (
-                np.sum(dvals * weights) / np.sum(weights)
-                - p['Ktv3_inhib'] * sD3_weighted
-                - p['Ktv4_inhib'] * sD4_weighted
-            )
-        else:
-            dY[i,:] = 0
-            continue
-        dD = p['nu']*(1-p['sDtv3_ratio']-p['sDtv4_ratio'])*( p['betaD']/(1 + R[i]**p['h'])) - (1 + p['Dgr_Noise']*(np.random.randn()-0.5))*D[i]
-        dR = (p['betaR']*(avgD**p['m']))/(1 + avgD**p['m']) - R[i]
-        dsD3 = p['nu']*p['sDtv3_ratio']*(p['betaD']/(1 + R[i]**p['h'])) - p['Ktv3_Dgr']*sD3[i]
-        dsD4 = p['nu']*p['sDtv4_ratio']*(p['betaD']/(1 + R[i]**p['h'])) - p['Ktv4_Dgr']*sD4[i]
-        dY[i,0] = dD
-        dY[i,1] = dR 
-        dY[i,2] = dsD3
-        dY[i,3] = dsD4
+    has = ctx.has_neighbors
+    avgD = (
+        ctx.neighbor_mean(D)
+        - p['Ktv3_inhib'] * ctx.diffuse(sD3, p.get('sigma_diff_sD3', 2.0))
+        - p['Ktv4_inhib'] * ctx.diffuse(sD4, p.get('sigma_diff_sD4', 2.0))
+    )
+    noise = np.zeros(len(Y))
+    noise[has] = np.random.randn(np.count_nonzero(has)) - 0.5
+    prodD = p['betaD']/(1 + R**p['h'])
+    dY = np.zeros_like(Y)
+    dY[:,0] = p['nu']*(1-p['sDtv3_ratio']-p['sDtv4_ratio'])*prodD - (1 + p['Dgr_Noise']*noise)*D
+    dY[:,1] = (p['betaR']*(avgD**p['m']))/(1 + avgD**p['m']) - R
+    dY[:,2] = p['nu']*p['sDtv3_ratio']*prodD - p['Ktv3_Dgr']*sD3
+    dY[:,3] = p['nu']*p['sDtv4_ratio']*prodD - p['Ktv4_Dgr']*sD4
+    dY[~has] = 0
     Y_new = Y + dY * p['dT'] if 'dT' in p else Y + dY
     Y_new = np.clip(Y_new, 0, None)
     dY = (Y_new - Y) / (p['dT'] if 'dT' in p else 1)
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# 動畫幀的背景預先繪製
+# 背景 thread 以獨立的 Agg figure (與畫面相同像素大小) 將幀畫成 RGBA array，存入有上限的 LRU 快取
+# 拖曳滑桿或播放時直接顯示快取的影像；沒有快取時才在主 thread 同步繪製 (與原本相同)
+# 每個 thread 各自使用一個 figure，matplotlib 的 figure 不可跨 thread 共用
+
+
+class FrameCache:
+    """
+    animator: VoronoiAnimator (以 _draw_frame 繪製)
+    size: (寬, 高) 像素；dpi: 與畫面 figure 相同，字體大小才一致
+    max_bytes: 快取上限 (RGBA 影像總大小)
+    prefetch: 目前幀之後預先繪製的幀數 (之前的幀為一半)
+    draw_kwargs: 傳給 _draw_frame 的線條/點設定
+    """
+    def __init__(self, animator, n_frames, size, dpi=100, max_bytes=256 * 1024**2, prefetch=24, **draw_kwargs):
+        self.animator = animator
+        self.n_frames = n_frames
+        self.dpi = dpi
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self.draw_kwargs = draw_kwargs
+        self.render_time = None  # 單幀繪製時間 (秒，指數平均)
+        self.images = OrderedDict()
+        self.failed = set()  # 背景繪製失敗的幀，不再重試
+        self.hits = 0  # image() 直接取得快取 / 需同步繪製的次數
+        self.misses = 0
+        self.n_bytes = 0
+        self.focus = 0
+        self.stride = 1
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.set_size(size)
+        self._thread = threading.Thread(target=self._run, name='frame-cache', daemon=True)
+        self._thread.start()
+
+    def set_size(self, size):
+        """畫面大小改變時清除快取 (舊的影像解析度不同)"""
+        size = (max(int(size[0]), 1), max(int(size[1]), 1))
+        with self._cond:
+            if getattr(self, 'size', None) == size:
+                return
+            self.size = size
+            self.images.clear()
+            self.n_bytes = 0
+            self._cond.notify()
+
+    def close(self):
+        """停止背景 thread (新的動畫或關閉視窗時)"""
+        with self._cond:
+            self._closed = True
+            self.images.clear()
+            self.n_bytes = 0
+            self._cond.notify()
+
+    def get(self, frame):
+        """快取的影像 (高, 寬, 4) uint8，沒有時為 None"""
+        with self._cond:
+            image = self.images.get(frame)
+            if image is not None:
+                self.images.move_to_end(frame)
+            return image
+
+    def image(self, frame):
+        """回傳影像，沒有快取時在呼叫端 thread 同步繪製並存入快取"""
+        image = self.get(frame)
+        if image is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            size = self.size
+            image = self._render(frame, size)
+            self._store(frame, image, size)
+        return image
+
+    def request(self, frame, stride=1):
+        """設定目前幀：背景 thread 由此幀開始，以 stride 間隔往後 (及往前) 預先繪製"""
+        with self._cond:
+            self.focus = int(frame)
+            self.stride = max(int(stride), 1)
+            self._cond.notify()
+
+    def playback_step(self, interval, frame=None):
+        """
+        播放時每個 tick 前進的幀數 (level of detail)
+        interval: 每個 tick 的時間 (秒)；繪製比 tick 慢時跳幀，使播放速度 (幀/秒) 維持不變
+        frame: 目前幀；下一幀已快取時不跳幀
+        """
+        if not self.render_time or (frame is not None and self.get(frame + 1) is not None):
+            return 1
+        return max(1, int(np.ceil(self.render_time / interval)))
+
+    def next_ready(self, frame, step):
+        """(frame, frame + step] 中最後一個已快取的幀；都沒有時回傳 frame + step (需同步繪製)"""
+        last = min(frame + step, self.n_frames - 1)
+        with self._cond:
+            for f in range(last, frame, -1):
+                if f in self.images:
+                    return f
+        return last
+
+    def save(self, frame, path, dpi=200):
+        """以較高解析度重新繪製單幀並存檔 (Download Pic)"""
+        fig = Figure(figsize=(self.size[0] / self.dpi, self.size[1] / self.dpi), dpi=self.dpi)
+        FigureCanvasAgg(fig)
+        self.animator._draw_frame(fig.add_subplot(111), frame, None, **self.draw_kwargs)
+        fig.savefig(path, dpi=dpi)
+
+    def _figure(self, size):
+        # 每個 thread 一個 figure，大小改變時調整
+        fig = getattr(self._local, 'fig', None)
+        if fig is None:
+            fig = Figure(dpi=self.dpi)
+            FigureCanvasAgg(fig)
+            self._local.fig = fig
+            self._local.ax = fig.add_subplot(111)
+        fig.set_size_inches(size[0] / self.dpi, size[1] / self.dpi)
+        return fig, self._local.ax
+
+    def _render(self, frame, size):
+        start = time.perf_counter()
+        fig, ax = self._figure(size)
+        ax.clear()
+        self.animator._draw_frame(ax, frame, None, **self.draw_kwargs)
+        fig.canvas.draw()
+        image = np.asarray(fig.canvas.buffer_rgba()).copy()
+        elapsed = time.perf_counter() - start
+        self.render_time = elapsed if self.render_time is None else 0.8 * self.render_time + 0.2 * elapsed
+        return image
+
+    def _store(self, frame, image, size):
+        with self._cond:
+            if self._closed or size != self.size or frame in self.images:
+                return
+            self.images[frame] = image
+            self.n_bytes += image.nbytes
+            # 超過上限時由最久未使用的幀開始移除，但保留目前幀
+            while self.n_bytes > self.max_bytes and len(self.images) > 1:
+                old, old_image = next(iter(self.images.items()))
+                if old == self.focus:
+                    self.images.move_to_end(old)
+                    old, old_image = next(iter(self.images.items()))
+                del self.images[old]
+                self.n_bytes -= old_image.nbytes
+
+    def _wanted(self):
+        # 依優先順序：目前幀、往後 prefetch 幀、往前 prefetch / 2 幀 (都以 stride 為間隔)
+        s = self.stride
+        ahead = [self.focus + k * s for k in range(self.prefetch + 1)]
+        behind = [self.focus - k * s for k in range(1, self.prefetch // 2 + 1)]
+        frames = [f for f in ahead + behind if 0 <= f < self.n_frames]
+        # 預取範圍不超過快取容量，避免剛畫好的幀又被移除
+        if self.images:
+            capacity = max(int(self.max_bytes // next(iter(self.images.values())).nbytes), 1)
+            frames = frames[:capacity]
+        return frames
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    todo = [f for f in self._wanted() if f not in self.images and f not in self.failed]
+                    if todo:
+                        frame, size = todo[0], self.size
+                        break
+                    self._cond.wait()
+            try:
+                image = self._render(frame, size)
+            except Exception:
+                # 無法繪製的幀 (例如 color_func 錯誤) 留給主 thread 同步繪製時回報錯誤
+                with self._cond:
+                    self.failed.add(frame)
+                continue
+            self._store(frame, image, size)
@@ -1,7 +1,47 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import time
+from contextlib import contextmanager
 
-def setup_logger(log_file='app.log'):
+# 非阻塞 log：logger 只掛 QueueHandler (放入 queue 即返回)，檔案與 console 的寫入由 QueueListener 的背景 thread 處理
+# 效能紀錄另走 'VoronoiApp.perf' channel，每筆一行 JSON (perf.jsonl)：階段耗時、計數器、記憶體峰值
+# 未呼叫 setup_logger 時 perf channel 沒有 handler，log_perf 只做一次 isEnabledFor 判斷就返回
+
+PERF_LOGGER = 'VoronoiApp.perf'
+
+# 目前的 QueueListener (None 表示尚未 setup 或已 shutdown)；atexit 只登記一次
+_listeners = None
+_atexit_registered = False
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每筆 record 一行 JSON：time, event 與 log_perf 的欄位"""
+    def format(self, record):
+        entry = {'time': round(record.created, 3), 'event': record.getMessage()}
+        entry.update(getattr(record, 'perf', None) or {})
+        return json.dumps(entry, default=_json_default)
+
+
+def _json_default(value):
+    # numpy 純量 / array
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def setup_logger(log_file='app.log', perf_file='perf.jsonl'):
+    """
+    回傳 'VoronoiApp' logger；重複呼叫 (例如開第二個視窗) 不會重複加 handler
+    log_file: 一般 log (DEBUG 以上)；console 只顯示 INFO 以上
+    perf_file: log_perf 的 JSON lines 檔
+    """
+    global _listeners, _atexit_registered
     logger = logging.getLogger('VoronoiApp')
+    if _listeners is not None:
+        return logger
     logger.setLevel(logging.DEBUG)
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 
@@ -9,12 +49,88 @@ def setup_logger(log_file='app.log'):
     fh = logging.FileHandler(log_file, encoding='utf-8')
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(formatter)
-    logger.addHandler(fh)
 
     # Console handler
     ch = logging.StreamHandler()
     ch.setLevel(logging.INFO)
     ch.setFormatter(formatter)
-    logger.addHandler(ch)
 
-    return logger 
\ No newline at end of file
+    # Perf channel (JSON lines)，不往上傳到 VoronoiApp 的一般 log
+    perf_logger = logging.getLogger(PERF_LOGGER)
+    perf_logger.setLevel(logging.INFO)
+    perf_logger.propagate = False
+    ph = logging.FileHandler(perf_file, encoding='utf-8')
+    ph.setFormatter(JsonLinesFormatter())
+    perf_queue = queue.SimpleQueue()
+    log_queue = queue.SimpleQueue()
+    # shutdown 後再次 setup 時，舊的 QueueHandler 已沒有 listener，先移除避免重複
+    _remove_queue_handlers(logger, perf_logger)
+    perf_logger.addHandler(logging.handlers.QueueHandler(perf_queue))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listeners = [logging.handlers.QueueListener(log_queue, fh, ch, respect_handler_level=True),
+                  logging.handlers.QueueListener(perf_queue, ph)]
+    for listener in _listeners:
+        listener.start()
+    # 結束時把 queue 中剩下的 record 寫完
+    if not _atexit_registered:
+        atexit.register(shutdown_logger)
+        _atexit_registered = True
+    return logger
+
+
+def _remove_queue_handlers(*loggers):
+    for lg in loggers:
+        for handler in [h for h in lg.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+            lg.removeHandler(handler)
+
+
+def shutdown_logger():
+    """停止背景 thread 並寫出剩下的 record，移除 QueueHandler (之後可再呼叫 setup_logger)"""
+    global _listeners
+    _remove_queue_handlers(logging.getLogger('VoronoiApp'), logging.getLogger(PERF_LOGGER))
+    for listener in _listeners or []:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    _listeners = None
+
+
+def log_perf(event, **fields):
+    """寫一筆效能紀錄 (perf.jsonl 的一行)，例如 log_perf('export', item='mp4', seconds=3.2)"""
+    perf_logger = logging.getLogger(PERF_LOGGER)
+    if perf_logger.isEnabledFor(logging.INFO) and perf_logger.handlers:
+        perf_logger.info(event, extra={'perf': fields})
+
+
+def log_perf_summary(event, summary, **fields):
+    """PhaseTimer.summary() 攤平成一筆紀錄：<phase>_s 秒數、計數器、peak_rss"""
+    if summary:
+        fields['total_s'] = summary['total_s']
+        fields.update({f'{name}_s': ph['seconds'] for name, ph in summary['phases'].items()})
+        fields.update(summary['counters'])
+    peak = peak_rss()
+    if peak is not None:
+        fields['peak_rss'] = peak
+    log_perf(event, **fields)
+
+
+def peak_rss():
+    """程序的記憶體峰值 (bytes)；無法取得時 (Windows 沒有 resource 模組) 回傳 None"""
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 為 bytes，Linux 為 KB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextmanager
+def perf_timer(event, **fields):
+    """with perf_timer('export', item='pdf'): ...  結束時記錄 seconds"""
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        log_perf(event, seconds=time.perf_counter() - start, **fields)
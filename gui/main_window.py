@@ -6,23 +6,23 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont, QColor, QPalette
-from gui.logger import setup_logger
+from gui.logger import setup_logger, log_perf, log_perf_summary, perf_timer
 from gui.preview_canvas import PreviewCanvas
 import numpy as np
 import ast
 import os
 import logging
+import threading
+import time
 import matplotlib
 matplotlib.use('QtAgg')  # 使用QtAgg backend，與PyQt6兼容
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
 import json
 
 from voronoi_grid import VoronoiGrid
-from biophysics_model import BiophysicsModel
 #from gui.sim_utils import color_func, move_away_from_center, covergent_extension, repulsion_move_neighbors_no_outer
-from voronoi_animation import VoronoiAnimator
+# BiophysicsModel / VoronoiAnimator (pyplot) 在第一次模擬或播放時才載入，加快視窗開啟
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.json')
 CONFIG_EXAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config_example.json')
@@ -37,8 +37,16 @@ class MainWindow(QMainWindow):
         self.load_config()
         self.sim_history = None
         self.cell_positions_history = None
+        self.ids_history = None  # 每幀細胞 ID (舊的結果集沒有時為 None)
+        self.lineage = None
+        self.frame_times = None  # 各幀時間 (kymograph 橫軸)
         self.grid = None
         self.params = None
+        self.import_Y = None
+        self.perf_summary = None
+        # 重新建立視窗時移除舊視窗的 status bar handler
+        for handler in [h for h in self.logger.handlers if isinstance(h, GUIStatusHandler)]:
+            self.logger.removeHandler(handler)
         self.logger.addHandler(GUIStatusHandler(self.status_bar))
 
     def init_ui(self):
@@ -57,7 +65,8 @@ class MainWindow(QMainWindow):
             "Honeycomb",
             "Random",
             "Regular Grid",
-            "User define by import"
+            "User define by import",
+            "Poisson Disk (Blue Noise)"
         ])
         grid_mode_layout.addWidget(self.grid_mode_combo)
         grid_mode_box.setLayout(grid_mode_layout)
@@ -68,10 +77,10 @@ class MainWindow(QMainWindow):
         grid_param_form = QFormLayout()
         grid_shape_row = QHBoxLayout()
         self.grid_shape_x = QSpinBox()
-        self.grid_shape_x.setRange(1, 200)
+        self.grid_shape_x.setRange(1, 1000)
         self.grid_shape_x.setValue(20)
         self.grid_shape_y = QSpinBox()
-        self.grid_shape_y.setRange(1, 200)
+        self.grid_shape_y.setRange(1, 1000)
         self.grid_shape_y.setValue(20)
         grid_shape_row.addWidget(QLabel("X:"))
         grid_shape_row.addWidget(self.grid_shape_x)
@@ -82,6 +91,9 @@ class MainWindow(QMainWindow):
         self.pos_rand_edit = QLineEdit("0.25")
         grid_param_form.addRow("Cell Distance:", self.cell_dist_edit)
         grid_param_form.addRow("Position Randomness:", self.pos_rand_edit)
+        self.import_frame_edit = QLineEdit("0, 0")
+        self.import_frame_edit.setToolTip("(T, step) frame to read when importing an exported cells table")
+        grid_param_form.addRow("Import Frame (T, step):", self.import_frame_edit)
         grid_param_box.setLayout(grid_param_form)
         settings_layout.addWidget(grid_param_box)
 
@@ -189,6 +201,18 @@ class MainWindow(QMainWindow):
         sim_param_form.addRow("T:", self.T_edit)
         sim_param_form.addRow("Replicate:", self.replicate_edit)
         sim_param_form.addRow("Repeats:", self.repeats_edit)
+        self.seed_edit = QLineEdit("")
+        self.seed_edit.setPlaceholderText("random")
+        sim_param_form.addRow("Seed:", self.seed_edit)
+        self.profile_check = QCheckBox("Profile run (per-phase timing)")
+        sim_param_form.addRow(self.profile_check)
+        self.cache_check = QCheckBox("Reuse cached results (seeded runs)")
+        self.cache_check.setChecked(True)
+        sim_param_form.addRow(self.cache_check)
+        self.steady_check = QCheckBox("Stop early at steady state")
+        sim_param_form.addRow(self.steady_check)
+        self.adaptive_check = QCheckBox("Adaptive time step (RK23)")
+        sim_param_form.addRow(self.adaptive_check)
         sim_param_box.setLayout(sim_param_form)
         settings_layout.addWidget(sim_param_box)
 
@@ -228,8 +252,22 @@ class MainWindow(QMainWindow):
         anim_ctrl_layout.addWidget(self.save_frame_btn)
         preview_layout.addLayout(anim_ctrl_layout)
         # ---
+        # 效能面板：profile run 後顯示各階段耗時
+        self.perf_box = QGroupBox("Performance")
+        perf_layout = QVBoxLayout()
+        self.perf_label = QLabel("")
+        self.perf_label.setFont(QFont("Consolas", 9))
+        self.perf_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        perf_layout.addWidget(self.perf_label)
+        self.perf_box.setLayout(perf_layout)
+        self.perf_box.setVisible(False)
+        preview_layout.addWidget(self.perf_box)
+        results_row = QHBoxLayout()
         self.download_btn = QPushButton("Download Results")
-        preview_layout.addWidget(self.download_btn)
+        self.open_results_btn = QPushButton("Open Results")
+        results_row.addWidget(self.download_btn)
+        results_row.addWidget(self.open_results_btn)
+        preview_layout.addLayout(results_row)
         self.run_btn = QPushButton("Run Simulation")
         preview_layout.addWidget(self.run_btn)
         preview_widget.setLayout(preview_layout)
@@ -249,6 +287,7 @@ class MainWindow(QMainWindow):
         self.apply_move_btn.clicked.connect(self.on_apply_movement)
         self.run_btn.clicked.connect(self.on_run_simulation)
         self.download_btn.clicked.connect(self.on_download_results)
+        self.open_results_btn.clicked.connect(self.on_open_results)
         # 新增動畫控制事件
         self.play_btn.clicked.connect(self.on_play_pause)
         self.frame_slider.valueChanged.connect(self.on_frame_slider_changed)
@@ -258,12 +297,13 @@ class MainWindow(QMainWindow):
         self.anim_timer.timeout.connect(self._on_anim_timer_tick)
         self.anim_timer.setInterval(50)  # 20 FPS, can be adjusted
         # 設定變動時自動儲存
-        for widget in [self.grid_shape_x, self.grid_shape_y, self.cell_dist_edit, self.pos_rand_edit,
+        for widget in [self.grid_shape_x, self.grid_shape_y, self.cell_dist_edit, self.pos_rand_edit, self.import_frame_edit,
                        self.move_random, self.move_random_strength, self.move_away, self.move_away_strength,
                        self.move_ce, self.move_ce_strength, self.move_repulsion, self.move_repulsion_strength,
                        self.move_division, self.move_division_n, self.move_division_method,
                        self.move_apoptosis, self.move_apoptosis_n, self.move_apoptosis_method,
-                       self.ode_edit, self.params_edit, self.color_func_edit, self.T_edit, self.replicate_edit, self.repeats_edit]:
+                       self.ode_edit, self.params_edit, self.color_func_edit, self.T_edit, self.replicate_edit, self.repeats_edit,
+                       self.seed_edit, self.profile_check, self.cache_check, self.steady_check, self.adaptive_check]:
             if hasattr(widget, 'editingFinished'):
                 widget.editingFinished.connect(self.save_config)
             elif hasattr(widget, 'valueChanged'):
@@ -276,6 +316,25 @@ class MainWindow(QMainWindow):
     def get_grid_shape(self):
         return (self.grid_shape_x.value(), self.grid_shape_y.value())
 
+    def get_import_frame(self):
+        try:
+            T_val, step_val = [float(v) for v in self.import_frame_edit.text().replace('(', '').replace(')', '').split(',')]
+            return (T_val, step_val)
+        except ValueError:
+            self.import_frame_edit.setText("0, 0")
+            return (0, 0)
+
+    def get_seed(self):
+        # 空白為不固定亂數
+        text = self.seed_edit.text().strip()
+        if not text:
+            return None
+        try:
+            return int(text)
+        except ValueError:
+            self.seed_edit.setText("")
+            return None
+
     def get_default_ode(self):
         from .default_ode import get_default_ode
         return get_default_ode()
@@ -298,18 +357,21 @@ class MainWindow(QMainWindow):
             'Random': 'random',
             'Regular Grid': 'regular',
             'User define by import': 'import',
+            'Poisson Disk (Blue Noise)': 'poisson',
         }
         mode = mode_map[self.grid_mode_combo.currentText()]
         from voronoi_grid import VoronoiGrid
         try:
             if mode == 'import':
-                file_path, _ = QFileDialog.getOpenFileName(self, "Import Cell Coordinates", "", "Table Files (*.xlsx *.xls *.csv);;Text Files (*.txt);;All Files (*)")
+                file_path, _ = QFileDialog.getOpenFileName(self, "Import Cell Coordinates", "", "Table Files (*.xlsx *.xls *.csv *.parquet);;Binary Files (*.npz *.npy);;Text Files (*.txt);;All Files (*)")
                 if not file_path:
                     self.status_bar.showMessage("Import cancelled.")
                     return
-                grid = VoronoiGrid(grid_shape=grid_shape, cell_dist=cell_dist, pos_rand=pos_rand, mode=mode, import_path=file_path)
+                grid = VoronoiGrid(grid_shape=grid_shape, cell_dist=cell_dist, pos_rand=pos_rand, mode=mode, import_path=file_path, import_frame=self.get_import_frame())
             else:
                 grid = VoronoiGrid(grid_shape=grid_shape, cell_dist=cell_dist, pos_rand=pos_rand, mode=mode)
+            # 匯入檔若含濃度欄位，模擬時可由該幀狀態接續
+            self.import_Y = grid.import_Y
             cell_count = len(grid.cells)
             self.logger.info(f"Generated grid with mode={mode}, shape={grid_shape}, cell_count={cell_count}")
             self.plot_voronoi(grid)
@@ -320,14 +382,8 @@ class MainWindow(QMainWindow):
         self.save_config()
 
     def plot_voronoi(self, grid):
-        def plot_func(ax):
-            from scipy.spatial import voronoi_plot_2d
-            voronoi_plot_2d(grid.vor, ax=ax, show_vertices=False, line_colors='black')
-            ax.plot(grid.cells[:,0], grid.cells[:,1], 'o', color='red')
-            ax.set_aspect('equal')
-            ax.set_title('Voronoi Preview')
-        self.preview_canvas.set_cells(grid.cells)
-        self.preview_canvas.plot(plot_func)
+        # PreviewCanvas 保留同一組 artists，拖曳時只增量更新
+        self.preview_canvas.set_cells(grid.cells, title='Voronoi Preview')
 
     def on_apply_movement(self):
         # 取得目前細胞座標
@@ -361,9 +417,8 @@ class MainWindow(QMainWindow):
         from voronoi_animation import VoronoiAnimator
         import numpy as np
         import ast
-        # 每次 simulation 前，將 self.anim 設為 None
-        if hasattr(self, 'anim') and self.anim is not None:
-            self.anim = None
+        # 每次 simulation 前，停止上一個動畫的背景繪製
+        self.close_frame_cache()
         # 清除前一次的 figure，避免重疊
         if hasattr(self, 'anim_canvas') and hasattr(self.anim_canvas, 'figure'):
             self.anim_canvas.figure.clf()
@@ -374,127 +429,113 @@ class MainWindow(QMainWindow):
             if len(cells) < 3:
                 self.status_bar.showMessage("Cell number not enough, please generate cell first")
                 return
-        grid = VoronoiGrid(grid_shape=(len(cells), 1), mode='custom', custom_cells=cells)
+        from sim_config import CachedRun, parse_params, run_simulation
         try:
-            params_text = self.params_edit.toPlainText().strip()
-            if params_text.startswith('params ='):
-                params_text = params_text[len('params ='):].strip()
-            if params_text.startswith('dict'):
-                self.params = eval(params_text, {}, {})
-            else:
-                self.params = ast.literal_eval(params_text)
+            self.params = parse_params(self.params_edit.toPlainText())
         except Exception as e:
             self.status_bar.showMessage(f"Params error: {e}")
             print(f"Params error: {e}")
             return
-        
-        # 如果沒有定義sigma，init_Y等於全部放0
-        sigma = self.params.get('sigma', 0.0) or 0.0
-
-        # 自動偵測物質數 n_var, 建立 init_Y
-        n_var = None
-        init_Y = None
-        # 1. params['n_var']
-        if 'n_var' in self.params:
-            try:
-                n_var = int(self.params['n_var'])
-            except:
-                n_var = None
-        # 2. params['init_Y']
-        if n_var is None and 'init_Y' in self.params:
-            try:
-                init_Y = np.array(self.params['init_Y'])
-                if init_Y.ndim == 2:
-                    n_var = init_Y.shape[1]
-                elif init_Y.ndim == 1:
-                    n_var = 1
-            except:
-                n_var = None
-        # 3. ODE 預設值（略，需進階分析）
-        # 4. fallback 預設 4
-        if n_var is None:
-            n_var = 4
-        if init_Y is None:
-            init_Y = np.random.randn(len(grid.cells), n_var) * sigma
-
-        from gui.sim_utils import move_away_from_center, covergent_extension, repulsion_move_neighbors_no_outer
-        move_rules = []
-        if self.move_away.isChecked():
-            away_strength = float(self.move_away_strength.text())
-            move_rules.append(lambda cells: move_away_from_center(cells, away_strength))
-        if self.move_ce.isChecked():
-            ce_strength = float(self.move_ce_strength.text())
-            move_rules.append(lambda cells: covergent_extension(cells, ce_strength))
-        if self.move_repulsion.isChecked():
-            repulsion_strength = float(self.move_repulsion_strength.text())
-            move_rules.append(lambda cells: repulsion_move_neighbors_no_outer(cells, repulsion_strength))
-        def combined_move_rule(cells):
-            for rule in move_rules:
-                cells = rule(cells)
-            return cells
-        move_rule = combined_move_rule if move_rules else None
-        random_strength = 0.05 if self.move_random.isChecked() else 0.0
         try:
             T = float(self.T_edit.text())
         except:
             T = 30.0
             self.T_edit.setText('30.0')
-
-        division_n = int(self.move_division_n.text()) if self.move_division.isChecked() else 0
-        division_mode = self.move_division_method.currentText() if self.move_division.isChecked() else 'area'
-        apoptosis_n = int(self.move_apoptosis_n.text()) if self.move_apoptosis.isChecked() else 0
-        apoptosis_mode = self.move_apoptosis_method.currentText() if self.move_apoptosis.isChecked() else 'area'
+        seed = self.get_seed()
 
         self.progress_bar.setValue(0)
         self.status_bar.showMessage("Running simulation...")
-        model = BiophysicsModel(cell_count=len(grid.cells), params=self.params, ode_func=self.get_ode_func(), init_Y=init_Y, vor_grid=grid, move_rule=move_rule, random_strength=random_strength)
-        sim_history = []
-        cell_positions_history = []
-        
-        t_steps = int(T/self.params['dT']) if 'dT' in self.params and self.params['dT'] else 1
-        step_interval = int(1/self.params['dT']) if 'dT' in self.params and self.params['dT'] else 1
-        step_indices = list(range(0, t_steps, step_interval))
-        if division_n:
-            proliferation_steps = step_indices
+        QApplication.processEvents()
+        # 與 batch_runner 共用同一套 config -> 模擬流程 (sim_config.run_simulation)
+        # 有 seed 時相同輸入 (ODE、參數、細胞、移動設定、T) 直接讀取快取結果
+        profile = self.profile_check.isChecked()
+        cache = None
+        if self.cache_check.isChecked() and seed is not None:
+            from result_cache import ResultCache
+            cache = ResultCache()
+        start = time.perf_counter()
+        model, sim_history, cell_positions_history, grid = run_simulation(
+            self.get_config(), params=self.params, cells=cells, import_Y=self.import_Y, T=T, seed=seed,
+            profile=profile, ode_func=self.get_ode_func(), cache=cache)
+        cached = isinstance(model, CachedRun)
+        log_perf_summary('simulation', model.perf_summary if profile else None,
+                         seconds=time.perf_counter() - start, n_cells=len(cells), frames=len(sim_history),
+                         cached=cached)
+        if not cached:
+            sim_history = list(sim_history)
+            cell_positions_history = list(cell_positions_history)
+            if model.termination['reason'] != 'T':
+                self.logger.info(f"Stopped early at t={model.termination['t']:.4g} ({model.termination['reason']})")
         else:
-            proliferation_steps = []
-        if apoptosis_n:
-            apoptosis_steps = step_indices
-        else:
-            apoptosis_steps = []
-        for i, (Y, pos) in enumerate(zip(*model.simulate(T, proliferation_steps=proliferation_steps, apoptosis_steps=apoptosis_steps, proliferation_n=division_n, apoptosis_n=apoptosis_n, proliferation_mode=division_mode, apoptosis_mode=apoptosis_mode))):
-            sim_history.append(Y)
-            cell_positions_history.append(pos)
-            if i % max(1, t_steps//100) == 0:
-                self.progress_bar.setValue(int(i*100/t_steps))
-                QApplication.processEvents()
+            self.logger.info(f"Loaded {len(sim_history)} frames from the result cache")
+        self.log_pattern_metrics(sim_history, cell_positions_history, model.frame_times)
         self.progress_bar.setValue(100)
+        self.show_perf_summary(model.perf_summary if profile else None)
         self.sim_history = sim_history
         self.cell_positions_history = cell_positions_history
+        self.ids_history = model.ids_history
+        self.lineage = model.lineage
+        self.frame_times = model.frame_times
         self.grid = grid
-        self.status_bar.showMessage("Simulation finished. Previewing animation...")
+        self.status_bar.showMessage("Loaded cached results. Previewing animation..." if cached else "Simulation finished. Previewing animation...")
+        self.show_animation(sim_history, cell_positions_history, grid)
+        self.status_bar.showMessage("Animation previewed.")
+        self.save_config()
+
+    def log_pattern_metrics(self, sim_history, cell_positions_history, times=None):
+        # 最後一幀的側向抑制圖樣指標 (pattern_metrics)；times 為 None 時 lock-in 以 dT 換算幀 index
+        from pattern_metrics import final_metrics
+        try:
+            if times is None and self.params.get('dT'):
+                times = np.arange(len(sim_history)) * float(self.params['dT'])
+            m = final_metrics(sim_history, cell_positions_history, times=times)
+        except Exception as e:
+            self.logger.warning(f"Pattern metrics unavailable: {e}")
+            return
+        self.logger.info(f"Pattern: high cells {m['high_fraction']:.2f}, isolated high {m['isolated_high']:.2f}, "
+                         f"Moran's I {m['morans_i']:.3f}, salt-and-pepper {m['salt_and_pepper']:.2f}, lock-in t={m['lock_in']:.4g}")
+
+    def show_perf_summary(self, summary):
+        from sim_profiler import format_summary
+        self.perf_summary = summary
+        if not summary:
+            self.perf_box.setVisible(False)
+            return
+        text = format_summary(summary)
+        self.logger.info("Simulation profile:\n" + text)
+        self.perf_label.setText(text)
+        self.perf_box.setVisible(True)
+
+    def close_frame_cache(self):
+        if getattr(self, 'frame_cache', None) is not None:
+            cache = self.frame_cache
+            log_perf('frame_cache', hits=cache.hits, misses=cache.misses, render_s=cache.render_time, frames=cache.n_frames)
+            cache.close()
+            self.frame_cache = None
+
+    def canvas_size(self):
+        """動畫區的像素大小 (預先繪製的影像與畫面同解析度)"""
+        return self.anim_canvas.get_width_height(physical=True)
+
+    def show_animation(self, sim_history, cell_positions_history, grid):
+        """將 sim_history (list 或延遲讀取的 FrameSequence) 載入動畫區並重設播放控制"""
+        from voronoi_animation import VoronoiAnimator
+        from gui.frame_cache import FrameCache
+        self.close_frame_cache()
+        self.anim_timer.stop()
         animator = VoronoiAnimator(grid, sim_history, self.get_color_func(), cell_positions_history, show_ticks=False, dynamic_range=False)
         self.anim_canvas.figure.clf()
         self.anim_canvas.setVisible(True)
-        ax = self.figure.add_subplot(111)
-        ax.set_xticks([])
-        ax.set_yticks([])
-        self.anim_canvas.draw()
-        # 建立動畫
-        self.anim = animator.animateGUI(self.figure, interval=20, line_colors='black', line_width=1, line_alpha=0.5, point_size=15) #self.anim_canvas.figure
-        
-        # 初始化動畫狀態
+        # 畫面只顯示預先繪製好的影像：整個 figure 一個 image artist，換幀只更新資料
+        ax = self.figure.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        self.anim_image = None
+        self.anim_ax = ax
+        self.total_frames = len(sim_history)
+        self.frame_cache = FrameCache(animator, self.total_frames, self.canvas_size(), dpi=self.figure.dpi,
+                                      line_colors='black', line_width=1, line_alpha=0.5, point_size=15)
         self.current_frame = 0
-        self.anim._draw_frame(self.current_frame)
-        self.anim_canvas.draw()
-        self.anim.resume()
-
         self.is_anim_playing = False
-        
-        if hasattr(self.anim, 'frame_seq'):
-            self.total_frames = len(list(self.anim.frame_seq))
-        else:
-            self.total_frames = len(sim_history)
         self.frame_slider.setEnabled(True)
         self.frame_slider.setMinimum(0)
         self.frame_slider.setMaximum(self.total_frames-1)
@@ -503,15 +544,42 @@ class MainWindow(QMainWindow):
         self.save_frame_btn.setEnabled(True)
         self.play_btn.setText("Play")
         self.update_anim_frame(0)
-        self.status_bar.showMessage("Animation previewed.")
-        self.save_config()
+
+    def on_open_results(self):
+        from result_store import ResultSet
+        folder = QFileDialog.getExistingDirectory(self, "Open Result Set Folder")
+        if not folder:
+            self.status_bar.showMessage("Open cancelled.")
+            return
+        try:
+            results = ResultSet(folder)
+        except Exception as e:
+            self.logger.error(f"Open results failed: {e}")
+            self.status_bar.showMessage(f"Error: {e}")
+            return
+        if len(results) == 0 or results.cell_positions_history is None:
+            self.status_bar.showMessage("Result set has no frames or cell positions.")
+            return
+        # 不重新模擬，history 只在顯示到該幀時才從磁碟讀取
+        self.sim_history = results.history
+        self.cell_positions_history = results.cell_positions_history
+        self.ids_history = results.ids_history
+        self.lineage = results.lineage
+        self.frame_times = results.frame_times
+        self.params = dict(results.params)
+        self.grid = VoronoiGrid(grid_shape=(1, 1), mode='custom', custom_cells=results.cell_positions_history[0])
+        self.logger.info(f"Opened result set {folder}: {len(results)} frames")
+        self.show_animation(self.sim_history, self.cell_positions_history, self.grid)
+        self.status_bar.showMessage(f"Replaying {folder} ({len(results)} frames)")
 
     def on_download_results(self):
         import json
         import datetime
         import numpy as np
         import os
-        from openpyxl import Workbook
+        from cell_table import write_cell_table
+        from result_store import save_result_set
+        from voronoi_animation import VoronoiAnimator
         if self.sim_history is None or self.cell_positions_history is None or self.grid is None:
             self.status_bar.showMessage("Please run simulation first.")
             return
@@ -528,70 +596,70 @@ class MainWindow(QMainWindow):
         # 儲存參數（JSON格式，與config.json相同）
         param_path = os.path.join(folder, f"{dt_prefix}config.json")
         config = self.save_config(save_path=param_path)
+        if self.perf_summary:
+            with open(os.path.join(folder, f"{dt_prefix}perf.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.perf_summary, f, indent=2)
         self.progress_bar.setValue(5)
 
         # 儲存動畫
         video_path = os.path.join(folder, f"{dt_prefix}simulation.mp4")
         animator = VoronoiAnimator(self.grid, self.sim_history, self.get_color_func(), self.cell_positions_history, show_ticks=False, dynamic_range=False)
-        animator.animate(interval=5, save_path=video_path, line_colors='black', line_width=1, line_alpha=0.5, point_size=15)
+        with perf_timer('export', item='mp4'):
+            animator.animate(interval=5, save_path=video_path, line_colors='black', line_width=1, line_alpha=0.5, point_size=15)
         self.progress_bar.setValue(50)
 
         # 儲存濃度圖
         pdf_path = os.path.join(folder, f"{dt_prefix}concentration.pdf")
         labels = self.params.get('labels', [f'Y[{i}]' for i in range(self.sim_history[0].shape[1])])
-        VoronoiAnimator.plot_concentration_over_time(self.sim_history, save_path=pdf_path, labels=labels, cell_indices=[0])
+        with perf_timer('export', item='pdf'):
+            VoronoiAnimator.save_concentration_pdf(pdf_path, self.sim_history, labels, self.ids_history,
+                                                   self.cell_positions_history, self.lineage, self.frame_times)
+        # 有分裂或死亡時另存譜系表
+        if self.lineage is not None and ((self.lineage.parent >= 0).any() or not np.isnan(self.lineage.death).all()):
+            from lineage import write_lineage
+            write_lineage(os.path.join(folder, f"{dt_prefix}lineage.csv"), self.lineage)
         self.progress_bar.setValue(55)
 
-        # 儲存 cells.xlsx
+        # 儲存 cells.xlsx 與 cells.npz (二進位，匯入較快)
         xlsx_path = os.path.join(folder, f"{dt_prefix}cells.xlsx")
-        wb = Workbook()
-        ws = wb.active
-        # 標題列
-        nY = self.sim_history[0].shape[1] if len(self.sim_history) > 0 else 0
-        headers = ['T', 'step', 'x', 'y'] + [f'Y[{i}]' for i in range(nY)]
-        ws.append(headers)
-        # 取得 T, dT
+        npz_path = os.path.join(folder, f"{dt_prefix}cells.npz")
         try:
-            T = float(self.T_edit.text())
-        except:
-            self.status_bar.showMessage("Unable to save cell grid, T is not a number or not available.")
-            return
-        try:
-            dT_step = int(1/float(self.params.get('dT', None)))
+            dT_step = int(round(1/float(self.params.get('dT', None))))
         except:
             self.status_bar.showMessage("Unable to save cell grid, dT is not a number or not available.")
             return
-        
-        # 寫入每個時間點每個細胞
-        for t_idx, (Y, pos) in enumerate(zip(self.sim_history, self.cell_positions_history)):
-            T_write=t_idx//dT_step
-            dT_write=t_idx-(T_write*dT_step)
-            self.status_bar.showMessage(f"saving {t_idx},{T_write},{dT_write}")
-            for i in range(Y.shape[0]):
-                row = [T_write, dT_write, pos[i,0], pos[i,1]] + [Y[i,j] for j in range(Y.shape[1])]
-                ws.append(row)
-            self.progress_bar.setValue(55+int(35*(t_idx/(T*dT_step))))
-        wb.save(xlsx_path)
+        with perf_timer('export', item='npz'):
+            write_cell_table(npz_path, self.sim_history, self.cell_positions_history, dT_step, frame_times=self.frame_times)
+        # 可 mmap 的結果集，供 Open Results 直接重播
+        with perf_timer('export', item='results'):
+            save_result_set(os.path.join(folder, f"{dt_prefix}results"), self.sim_history, self.cell_positions_history, params=self.params, config=config,
+                            ids_history=self.ids_history, lineage=self.lineage, frame_times=self.frame_times)
+        def on_progress(fraction):
+            self.progress_bar.setValue(55+int(35*fraction))
+            QApplication.processEvents()
+        with perf_timer('export', item='xlsx'):
+            write_cell_table(xlsx_path, self.sim_history, self.cell_positions_history, dT_step, progress=on_progress, frame_times=self.frame_times)
         self.progress_bar.setValue(90)
         self.progress_bar.setValue(100)
         self.status_bar.showMessage(f"Results saved to {folder}")
 
-    def save_config(self, save_path=None):
+    def get_config(self, fill_defaults=True):
+        """目前 GUI 設定 (config.json 格式)；fill_defaults 時空白的 ODE/參數/顏色函數以預設值補上"""
         ode_text = self.ode_edit.toPlainText().strip()
         params_text = self.params_edit.toPlainText().strip()
         color_func_text = self.color_func_edit.toPlainText().strip()
-        #只有儲存預設config.json才會自動補上預設值
-        if not ode_text and save_path is None:
+        if not ode_text and fill_defaults:
             ode_text = self.get_default_ode()
-        if not params_text and save_path is None:
+        if not params_text and fill_defaults:
             params_text = self.get_default_params()
-        if not color_func_text and save_path is None:
+        if not color_func_text and fill_defaults:
             color_func_text = self.get_default_color_func()
         config = {
             'grid_shape_x': self.grid_shape_x.value(),
             'grid_shape_y': self.grid_shape_y.value(),
             'cell_dist': self.cell_dist_edit.text(),
             'pos_rand': self.pos_rand_edit.text(),
+            'import_frame': self.import_frame_edit.text(),
             'move_random': self.move_random.isChecked(),
             'move_random_strength': self.move_random_strength.text(),
             'move_away': self.move_away.isChecked(),
@@ -612,8 +680,18 @@ class MainWindow(QMainWindow):
             'T': self.T_edit.text(),
             'replicate': self.replicate_edit.text(),
             'repeats': self.repeats_edit.text(),
+            'seed': self.seed_edit.text().strip(),
+            'profile': self.profile_check.isChecked(),
+            'use_cache': self.cache_check.isChecked(),
+            'steady_state': self.steady_check.isChecked(),
+            'integrator': 'rk23' if self.adaptive_check.isChecked() else 'euler',
             'grid_mode': self.grid_mode_combo.currentIndex()
         }
+        return config
+
+    def save_config(self, save_path=None):
+        #只有儲存預設config.json才會自動補上預設值
+        config = self.get_config(fill_defaults=save_path is None)
         if save_path is None:
             save_path = CONFIG_PATH
         try:
@@ -643,6 +721,7 @@ class MainWindow(QMainWindow):
             self.grid_shape_y.setValue(config.get('grid_shape_y', 20))
             self.cell_dist_edit.setText(config.get('cell_dist', '1.0'))
             self.pos_rand_edit.setText(config.get('pos_rand', '0.25'))
+            self.import_frame_edit.setText(config.get('import_frame', '0, 0'))
             self.move_random.setChecked(config.get('move_random', False))
             self.move_random_strength.setText(config.get('move_random_strength', '0.05'))
             self.move_away.setChecked(config.get('move_away', False))
@@ -672,58 +751,43 @@ class MainWindow(QMainWindow):
             self.T_edit.setText(config.get('T', '30.0'))
             self.replicate_edit.setText(config.get('replicate', '5'))
             self.repeats_edit.setText(config.get('repeats', '5'))
+            self.seed_edit.setText(str(config.get('seed', '') or ''))
+            self.profile_check.setChecked(config.get('profile', False))
+            self.cache_check.setChecked(config.get('use_cache', True))
+            self.steady_check.setChecked(config.get('steady_state', False))
+            self.adaptive_check.setChecked(config.get('integrator', 'euler') == 'rk23')
             self.grid_mode_combo.setCurrentIndex(config.get('grid_mode', 0))
 
     def get_color_func(self):
-        import numpy as np
-        import matplotlib.pyplot as plt
-
+        from sim_config import compile_color_func
         code = self.color_func_edit.toPlainText().strip()
         if not code:
             code = self.get_default_color_func()
-        global_vars = {'np': np, 'plt': plt}
-        local_vars = {}
         try:
-            exec(code, global_vars, local_vars)
-            func = local_vars.get('color_func', None)
-            if func is None:
-                raise Exception('color_func 未定義')
-            return func
+            return compile_color_func(code)
         except Exception as e:
             self.status_bar.showMessage(f"color_func 錯誤: {e}")
-            exec(self.get_default_color_func(), global_vars, local_vars)
-            return local_vars['color_func']
+            return compile_color_func(self.get_default_color_func())
 
     def get_ode_func(self):
-        import numpy as np
-        import matplotlib.pyplot as plt
-        try:
-            from gui.sim_utils import get_voronoi_neighbors_wo_outer, diffusion_weighted_mean
-        except ImportError:
-            get_voronoi_neighbors_wo_outer = None
-
+        from sim_config import compile_ode
         code = self.ode_edit.toPlainText().strip()
         if not code:
             code = self.get_default_ode()
-        global_vars = {'np': np, 'plt': plt, 'get_voronoi_neighbors_wo_outer': get_voronoi_neighbors_wo_outer, 'diffusion_weighted_mean': diffusion_weighted_mean}
-        local_vars = {}
         try:
-            exec(code, global_vars, local_vars)
-            func = local_vars.get('ode', None)
-            if func is None:
-                raise Exception('ode not defined')
-            return func
+            # 可定義 ode 函數，或宣告式的 model = {...} (由 compile_network 編譯)
+            return compile_ode(code)
         except Exception as e:
             self.status_bar.showMessage(f"ODE error: {e}")
-            exec(self.get_default_ode(), global_vars, local_vars)
-            return local_vars['ode']
+            return compile_ode(self.get_default_ode())
 
     def closeEvent(self, event):
+        self.close_frame_cache()
         self.save_config()
         super().closeEvent(event)
 
     def on_play_pause(self):
-        if not hasattr(self, 'anim') or self.anim is None:
+        if getattr(self, 'frame_cache', None) is None:
             return
         if self.is_anim_playing:
             self.anim_timer.stop()
@@ -740,15 +804,16 @@ class MainWindow(QMainWindow):
 
     def _on_anim_timer_tick(self):
         if self.current_frame < self.total_frames - 1:
-            self.current_frame += 1
-            self.update_anim_frame(self.current_frame)
+            # 繪製跟不上播放速度時跳幀 (優先顯示已預先繪製好的幀)
+            step = self.frame_cache.playback_step(self.anim_timer.interval() / 1000, self.current_frame)
+            self.update_anim_frame(self.frame_cache.next_ready(self.current_frame, step), stride=step)
         else:
             self.anim_timer.stop()
             self.is_anim_playing = False
             self.play_btn.setText("Play")
 
     def on_frame_slider_changed(self, value):
-        if not hasattr(self, 'anim') or self.anim is None:
+        if getattr(self, 'frame_cache', None) is None:
             return
         self.current_frame = value
         self.update_anim_frame(value)
@@ -758,35 +823,71 @@ class MainWindow(QMainWindow):
             self.is_anim_playing = False
             self.play_btn.setText("Play")
 
-    def update_anim_frame(self, frame_idx):
-        if hasattr(self, 'anim') and hasattr(self.anim, '_draw_frame'):
-            self.anim._draw_frame(frame_idx)
-            self.anim_canvas.draw()
+    def update_anim_frame(self, frame_idx, stride=1):
+        cache = getattr(self, 'frame_cache', None)
+        if cache is not None:
+            cache.set_size(self.canvas_size())
+            image = cache.image(frame_idx)
+            cache.request(frame_idx, stride)
+            if self.anim_image is None:
+                self.anim_image = self.anim_ax.imshow(image, interpolation='nearest', aspect='auto')
+            else:
+                self.anim_image.set_data(image)
+            self.anim_canvas.draw_idle()
         self.frame_slider.blockSignals(True)
         self.frame_slider.setValue(frame_idx)
         self.frame_slider.blockSignals(False)
         self.current_frame = frame_idx
 
     def on_save_frame(self):
-        if not hasattr(self, 'anim_canvas'):
+        if getattr(self, 'frame_cache', None) is None:
             return
         from PyQt6.QtWidgets import QFileDialog
         file_path, _ = QFileDialog.getSaveFileName(self, "Save current image", "frame.png", "PNG Files (*.png);;All Files (*)")
         if file_path:
-            self.anim_canvas.figure.savefig(file_path)
+            # 重新繪製 (非螢幕上的點陣影像)，解析度較高
+            self.frame_cache.save(self.current_frame, file_path)
             self.status_bar.showMessage(f"Image saved: {file_path}")
 
 class GUIStatusHandler(logging.Handler):
-    def __init__(self, status_bar):
-        super().__init__()
+    """
+    log 顯示在 status bar (terminal 輸出由 setup_logger 的 console handler 負責)
+    min_interval 秒內的多筆 record 只顯示最後一筆 (由 QTimer 補上)，大量 log 不會拖慢主程式
+    不在 GUI thread 的 record 只寫入檔案/console
+    """
+    def __init__(self, status_bar, min_interval=0.1):
+        super().__init__(logging.INFO)
         self.status_bar = status_bar
+        self.min_interval = min_interval
+        self._thread = threading.get_ident()
+        self._last = 0.0
+        self._pending = None
+        self._timer = QTimer(status_bar)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._flush)
+
     def emit(self, record):
-        msg = self.format(record)
+        if threading.get_ident() != self._thread:
+            return
+        now = time.perf_counter()
+        if now - self._last >= self.min_interval and not self._timer.isActive():
+            self._show(self.format(record), now)
+        else:
+            self._pending = record
+            if not self._timer.isActive():
+                self._timer.start(max(int((self.min_interval - (now - self._last)) * 1000), 0))
+
+    def _flush(self):
+        if self._pending is not None:
+            record, self._pending = self._pending, None
+            self._show(self.format(record), time.perf_counter())
+
+    def _show(self, msg, now):
+        self._last = now
         self.status_bar.showMessage(msg)
-        print(msg)  # 顯示到 terminal
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec()) 
\ No newline at end of file
+    sys.exit(app.exec()) 
\ No newline at end of file
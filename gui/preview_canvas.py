@@ -2,12 +2,55 @@ from PyQt6.QtWidgets import QWidget, QVBoxLayout, QApplication
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import numpy as np
-from PyQt6.QtCore import pyqtSignal
+import time
+from PyQt6.QtCore import pyqtSignal, QTimer
+
+
+def voronoi_segments(vor):
+    """
+    回傳 (finite_segments, infinite_segments)，每個為 (k, 2, 2) 陣列
+    與 scipy.spatial.voronoi_plot_2d 的畫法相同，但以陣列運算一次算完
+    """
+    points = vor.points
+    ridge_vertices = np.asarray(vor.ridge_vertices)
+    ridge_points = np.asarray(vor.ridge_points)
+    finite = (ridge_vertices >= 0).all(axis=1)
+    finite_segments = vor.vertices[ridge_vertices[finite]]
+    inf_vertices = ridge_vertices[~finite].max(axis=1)  # 有限端點
+    inf_points = ridge_points[~finite]
+    if len(inf_points) == 0:
+        return finite_segments, np.zeros((0, 2, 2))
+    center = points.mean(axis=0)
+    ptp_bound = np.ptp(points, axis=0)
+    t = points[inf_points[:, 1]] - points[inf_points[:, 0]]
+    t /= np.linalg.norm(t, axis=1, keepdims=True)
+    n = np.column_stack([-t[:, 1], t[:, 0]])
+    midpoint = points[inf_points].mean(axis=1)
+    direction = np.sign(np.sum((midpoint - center) * n, axis=1))[:, None] * n
+    aspect_factor = abs(ptp_bound.max() / ptp_bound.min())
+    far_point = vor.vertices[inf_vertices] + direction * ptp_bound.max() * aspect_factor
+    infinite_segments = np.stack([vor.vertices[inf_vertices], far_point], axis=1)
+    return finite_segments, infinite_segments
+
+
+def _segments_to_polyline(segments):
+    # (k, 2, 2) -> 以 NaN 分隔的單一折線，一個 Line2D 即可畫完所有線段
+    if len(segments) == 0:
+        return np.zeros(0), np.zeros(0)
+    padded = np.full((len(segments), 3, 2), np.nan)
+    padded[:, :2] = segments
+    padded = padded.reshape(-1, 2)
+    return padded[:, 0], padded[:, 1]
+
 
 class PreviewCanvas(QWidget):
     cell_count_changed = pyqtSignal(int)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, redraw_interval=0.05, pick_radius=0.5):
+        """
+        redraw_interval: 拖曳時重算 Voronoi 的最短間隔 (秒)，放開滑鼠時一定重算
+        pick_radius: 點擊距離細胞中心小於此值時視為選取 (拖曳)
+        """
         super().__init__(parent)
         self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
@@ -17,35 +60,82 @@ class PreviewCanvas(QWidget):
         self.cells = np.array([])
         self.selected_idx = None
         self.dragging = False
+        self.redraw_interval = redraw_interval
+        self.pick_radius = pick_radius
+        self.title = None
+        # 持續存在的 artists，只更新資料不重建 figure
+        self.ax = None
+        self.finite_lines = None
+        self.infinite_lines = None
+        self.points_artist = None
+        self._background = None
+        self._tree = None
+        self._last_diagram_time = 0.0
+        self._diagram_timer = QTimer(self)
+        self._diagram_timer.setSingleShot(True)
+        self._diagram_timer.timeout.connect(self._on_diagram_timer)
 
     def plot(self, plot_func, *args, **kwargs):
         self.figure.clear()
+        self.ax = None  # 自訂繪圖後，持續 artists 需重建
         ax = self.figure.add_subplot(111)
         plot_func(ax, *args, **kwargs)
         self.canvas.draw()
 
-    def set_cells(self, cells):
-        self.cells = np.array(cells)
+    def set_cells(self, cells, title=None):
+        self.cells = np.array(cells, dtype=float).reshape(-1, 2) if len(cells) else np.zeros((0, 2))
         self.selected_idx = None
         self.dragging = False
+        if title is not None:
+            self.title = title
+        self._tree = None
         self.update_plot()
 
     def get_cells(self):
         return self.cells.copy()
 
+    def _ensure_artists(self):
+        if self.ax is not None and self.ax.figure is self.figure and self.ax in self.figure.axes:
+            return
+        self.figure.clear()
+        self.ax = self.figure.add_subplot(111)
+        self.finite_lines, = self.ax.plot([], [], '-', color='black', linewidth=1.0)
+        self.infinite_lines, = self.ax.plot([], [], '--', color='black', linewidth=1.0)
+        self.points_artist, = self.ax.plot([], [], 'o', color='red')
+        self.ax.set_aspect('equal')
+
+    def _update_diagram(self):
+        """重算 Voronoi 並更新線段資料 (不觸發重畫)"""
+        from scipy.spatial import Voronoi
+        finite, infinite = np.zeros((0, 2, 2)), np.zeros((0, 2, 2))
+        if len(self.cells) >= 3:
+            try:
+                finite, infinite = voronoi_segments(Voronoi(self.cells))
+            except Exception:
+                pass  # 共線等無法建立 Voronoi 的情況只畫點
+        self.finite_lines.set_data(*_segments_to_polyline(finite))
+        self.infinite_lines.set_data(*_segments_to_polyline(infinite))
+        self._last_diagram_time = time.perf_counter()
+
+    def _update_limits(self):
+        if len(self.cells) == 0:
+            return
+        # 與 voronoi_plot_2d 相同的邊界
+        margin = 0.1 * np.ptp(self.cells, axis=0)
+        lo = self.cells.min(axis=0) - margin
+        hi = self.cells.max(axis=0) + margin
+        if hi[0] > lo[0]:
+            self.ax.set_xlim(lo[0], hi[0])
+        if hi[1] > lo[1]:
+            self.ax.set_ylim(lo[1], hi[1])
+
     def update_plot(self):
-        def plot_func(ax):
-            from scipy.spatial import Voronoi, voronoi_plot_2d
-            if len(self.cells) < 3:
-                ax.clear()
-                ax.plot(self.cells[:,0], self.cells[:,1], 'o', color='red')
-                ax.set_aspect('equal')
-                return
-            vor = Voronoi(self.cells)
-            voronoi_plot_2d(vor, ax=ax, show_vertices=False, line_colors='black')
-            ax.plot(self.cells[:,0], self.cells[:,1], 'o', color='red')
-            ax.set_aspect('equal')
-        self.plot(plot_func)
+        self._ensure_artists()
+        self._update_diagram()
+        self.points_artist.set_data(self.cells[:, 0], self.cells[:, 1])
+        self._update_limits()
+        self.ax.set_title(self.title or '')
+        self.canvas.draw_idle()
 
     # 只用 mpl 事件
     def connect_events(self):
@@ -57,41 +147,84 @@ class PreviewCanvas(QWidget):
         if event.inaxes is None:
             return
         pos = np.array([event.xdata, event.ydata])
-        idx = self._find_nearest_cell(pos)
+        idx, dist = self._find_nearest_cell(pos, return_distance=True)
         if event.button == 1:
-            if idx is not None and np.linalg.norm(self.cells[idx] - pos) < 0.5:
+            if idx is not None and dist < self.pick_radius:
                 self.selected_idx = idx
                 self.dragging = True
+                self._start_blit()
             else:
                 self.cells = np.vstack([self.cells, pos])
+                self._tree = None
                 self.update_plot()
                 self.cell_count_changed.emit(len(self.cells))
         elif event.button == 3:
             if idx is not None and len(self.cells) > 3:
                 self.cells = np.delete(self.cells, idx, axis=0)
+                self._tree = None
                 self.update_plot()
                 self.cell_count_changed.emit(len(self.cells))
 
+    def _start_blit(self):
+        # 拖曳期間線段與點設為 animated，背景只含座標軸，之後每次移動只 blit
+        self._ensure_artists()
+        for artist in (self.finite_lines, self.infinite_lines, self.points_artist):
+            artist.set_animated(True)
+        self.canvas.draw()
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._blit()
+
+    def _blit(self):
+        if self._background is None:
+            return
+        self.canvas.restore_region(self._background)
+        for artist in (self.finite_lines, self.infinite_lines, self.points_artist):
+            self.ax.draw_artist(artist)
+        self.canvas.blit(self.ax.bbox)
+
     def on_mpl_motion(self, event):
         if self.dragging and self.selected_idx is not None and event.inaxes is not None:
-            pos = np.array([event.xdata, event.ydata])
-            self.cells[self.selected_idx] = pos
-            self.update_plot()
+            self.cells[self.selected_idx] = (event.xdata, event.ydata)
+            self._tree = None
+            self.points_artist.set_data(self.cells[:, 0], self.cells[:, 1])
+            # Voronoi 依 redraw_interval 節流重算，其餘移動只移動被拖曳的點
+            wait = self.redraw_interval - (time.perf_counter() - self._last_diagram_time)
+            if wait <= 0:
+                self._diagram_timer.stop()
+                self._update_diagram()
+            elif not self._diagram_timer.isActive():
+                self._diagram_timer.start(int(wait * 1000) + 1)
+            self._blit()
+
+    def _on_diagram_timer(self):
+        if self.dragging:
+            self._update_diagram()
+            self._blit()
 
     def on_mpl_release(self, event):
+        was_dragging = self.dragging
         self.dragging = False
         self.selected_idx = None
+        self._diagram_timer.stop()
+        if was_dragging:
+            for artist in (self.finite_lines, self.infinite_lines, self.points_artist):
+                artist.set_animated(False)
+            self._background = None
+            self.update_plot()
 
-    def _find_nearest_cell(self, pos):
+    def _find_nearest_cell(self, pos, return_distance=False):
         if len(self.cells) == 0:
-            return None
-        dists = np.linalg.norm(self.cells - pos, axis=1)
-        idx = np.argmin(dists)
-        return idx
+            return (None, np.inf) if return_distance else None
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.cells)
+        dist, idx = self._tree.query(pos)
+        idx = int(idx)
+        return (idx, dist) if return_distance else idx
 
     def canvas_mouseEventCoords(self, event):
         # 將 Qt event 轉換為資料座標
         x = event.position().x()
         y = event.position().y()
         inv = self.canvas.figure.axes[0].transData.inverted()
-        return np.array(inv.transform((x, y)))
\ No newline at end of file
+        return np.array(inv.transform((x, y)))
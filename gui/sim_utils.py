@@ -1,7 +1,6 @@
 import numpy as np
 from scipy.spatial import Voronoi
 from collections import defaultdict
-import matplotlib.pyplot as plt
 
 def get_voronoi_neighbors_wo_outer(cells):
     vor = Voronoi(cells)
@@ -21,20 +20,47 @@ def diffusion_weighted_mean(values, positions, i, sigma):
     weights = np.exp(-dists**2 / (2 * sigma**2))
     return np.sum(weights * values) / np.sum(weights)
 
-def sD_ode(Y, t, params, cell_positions):
+def gaussian_weights(positions, sigma, dense_limit=4_000_000):
+    """
+    diffusion_weighted_mean 所有細胞的權重 (cell, cell)，每一列與逐列計算的結果完全相同
+    np.sum(W * values, axis=1) / np.sum(W, axis=1) 即所有細胞的 diffusion_weighted_mean
+    細胞數的平方超過 dense_limit 時回傳 None (矩陣太大，改為逐列計算)
+    """
+    if len(positions)**2 > dense_limit:
+        return None
+    # 與 np.linalg.norm(..., axis=1) 相同的運算 (平方和再開根號)，不建立 (cell, cell, 2) 的暫存陣列
+    dx = positions[None, :, 0] - positions[:, None, 0]
+    dy = positions[None, :, 1] - positions[:, None, 1]
+    dists = np.sqrt(dx * dx + dy * dy)
+    return np.exp(-dists**2 / (2 * sigma**2))
+
+def sD_ode(Y, t, params, cell_positions, ctx=None):
+    # ctx (coupling.CouplingContext)：BiophysicsModel 傳入，幾何不變時鄰居與擴散權重只算一次
     p = params
     dY = np.zeros_like(Y)
     D, R, sD3, sD4 = Y[:,0], Y[:,1], Y[:,2], Y[:,3]
-    neighbors = get_voronoi_neighbors_wo_outer(cell_positions)
     sigma_diff_sD3 = p.get('sigma_diff_sD3', 2.0)
     sigma_diff_sD4 = p.get('sigma_diff_sD4', 2.0)
+    sD3_mean = sD4_mean = None
+    if ctx is not None:
+        neighbors = ctx.cached('voronoi_neighbors', get_voronoi_neighbors_wo_outer, cell_positions)
+        W3 = ctx.cached(('gaussian_weights', sigma_diff_sD3), gaussian_weights, cell_positions, sigma_diff_sD3)
+        W4 = ctx.cached(('gaussian_weights', sigma_diff_sD4), gaussian_weights, cell_positions, sigma_diff_sD4)
+        if W3 is not None and W4 is not None:
+            sD3_mean = np.sum(W3 * sD3, axis=1) / np.sum(W3, axis=1)
+            sD4_mean = np.sum(W4 * sD4, axis=1) / np.sum(W4, axis=1)
+    else:
+        neighbors = get_voronoi_neighbors_wo_outer(cell_positions)
     for i in range(Y.shape[0]):
         neibs = neighbors[i]
         if neibs:
             weights = np.array(list(neibs.values()))
             dvals = np.array([D[j] for j in neibs.keys()])
-            sD3_weighted = diffusion_weighted_mean(sD3, cell_positions, i, sigma_diff_sD3)
-            sD4_weighted = diffusion_weighted_mean(sD4, cell_positions, i, sigma_diff_sD4)
+            if sD3_mean is not None:
+                sD3_weighted, sD4_weighted = sD3_mean[i], sD4_mean[i]
+            else:
+                sD3_weighted = diffusion_weighted_mean(sD3, cell_positions, i, sigma_diff_sD3)
+                sD4_weighted = diffusion_weighted_mean(sD4, cell_positions, i, sigma_diff_sD4)
             avgD = (
                 np.sum(dvals * weights) / np.sum(weights)
                 - p['Ktv3_inhib'] * sD3_weighted
@@ -57,6 +83,7 @@ def sD_ode(Y, t, params, cell_positions):
     return dY
 
 def color_func(Y, mode='polygon'):
+    import matplotlib.pyplot as plt
     if mode == 'polygon':
         norm = (Y[:,0] - Y[:,0].min()) / (np.ptp(Y[:,0]) + 1e-8)
         return plt.cm.Reds(norm)
@@ -133,4 +160,4 @@ def repulsion_move_neighbors_no_outer(cells, strength=0.08, min_dist=1.5, max_fo
         if np.linalg.norm(force) > max_force:
             force = force / np.linalg.norm(force) * max_force
         new_cells[i] += force
-    return new_cells 
\ No newline at end of file
+    return new_cells 
\ No newline at end of file
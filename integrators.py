@@ -0,0 +1,90 @@
+import numpy as np
+
+# 自適應步長的顯式積分器 (BiophysicsModel.simulate(method='rk23') 使用)
+# Bogacki-Shampine RK2(3)：以 3 階解前進，2/3 階差作為誤差估計；FSAL，每步 3 次 RHS
+# 步長可跨越多個輸出幀，輸出幀以三次 Hermite 插值取得
+
+
+def hermite(t, t0, y0, f0, t1, y1, f1):
+    """[t0, t1] 間以兩端值與斜率的三次 Hermite 插值"""
+    h = t1 - t0
+    s = (t - t0) / h
+    s2, s3 = s * s, s * s * s
+    return ((2*s3 - 3*s2 + 1) * y0 + (s3 - 2*s2 + s) * h * f0
+            + (-2*s3 + 3*s2) * y1 + (s3 - s2) * h * f1)
+
+
+class RK23:
+    """
+    fun(t, Y) -> dY；Y 可為任意 shape 的 array
+    rtol, atol: 相對/絕對誤差容許 (RMS 範數)
+    h0: 初始步長；max_step / min_step: 步長範圍 (min_step 仍無法達到誤差要求時照樣接受，避免雜訊項讓步長無限縮小)
+    """
+    SAFETY = 0.9
+    MIN_FACTOR = 0.2
+    MAX_FACTOR = 5.0
+
+    def __init__(self, fun, t0, y0, rtol=1e-3, atol=1e-6, h0=None, max_step=np.inf, min_step=0.0):
+        self.fun = fun
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.min_step = min_step
+        self.nfev = 0
+        self.n_accepted = 0
+        self.n_rejected = 0
+        self.h = h0 if h0 else 1e-3
+        self.reset(t0, y0)
+
+    def _f(self, t, y):
+        self.nfev += 1
+        return self.fun(t, y)
+
+    def reset(self, t, y):
+        """狀態在 t 被外部改變 (分裂/死亡/移動) 時重新開始，之前的步不再用於插值"""
+        self.t0 = self.t1 = t
+        self.y0 = self.y1 = np.array(y, dtype=float)
+        self.f0 = self.f1 = self._f(t, self.y1)
+
+    def _step(self, limit):
+        t, y, k1 = self.t1, self.y1, self.f1
+        eps = 1e-12 * max(1.0, abs(t))
+        while True:
+            h = min(self.h, self.max_step)
+            clamped = t + h >= limit - eps
+            if clamped:
+                h = limit - t
+            k2 = self._f(t + 0.5*h, y + 0.5*h*k1)
+            k3 = self._f(t + 0.75*h, y + 0.75*h*k2)
+            y_new = y + h * (2/9*k1 + 1/3*k2 + 4/9*k3)
+            k4 = self._f(t + h, y_new)
+            err = h * (-5/72*k1 + 1/12*k2 + 1/9*k3 - 1/8*k4)
+            scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+            err_norm = np.sqrt(np.mean((err / scale)**2)) if err.size else 0.0
+            if err_norm == 0:
+                factor = self.MAX_FACTOR
+            else:
+                factor = min(self.MAX_FACTOR, max(self.MIN_FACTOR, self.SAFETY * err_norm**(-1/3)))
+            if err_norm <= 1 or h <= self.min_step:
+                break
+            self.n_rejected += 1
+            self.h = max(h * factor, self.min_step)
+        self.n_accepted += 1
+        # 因 limit 截短的步不代表誤差允許的步長，誤差要求縮小時才更新
+        if not (clamped and factor >= 1):
+            self.h = h * factor
+        self.t0, self.y0, self.f0 = t, y, k1
+        self.t1, self.y1, self.f1 = (limit if clamped else t + h), y_new, k4
+
+    def advance(self, t, limit=None):
+        """
+        回傳時間 t 的狀態
+        limit: 步的終點不可超過此時間 (之後有分裂/移動會改變狀態)；None 時以 t 為界
+        """
+        limit = t if limit is None else max(limit, t)
+        eps = 1e-12 * max(1.0, abs(t))
+        while self.t1 < t - eps:
+            self._step(limit)
+        if abs(self.t1 - t) <= eps or self.t1 == self.t0:
+            return self.y1.copy()
+        return hermite(t, self.t0, self.y0, self.f0, self.t1, self.y1, self.f1)
@@ -0,0 +1,121 @@
+import numpy as np
+
+# 細胞身分與譜系
+# 每個細胞有固定的整數 ID (VoronoiGrid.cell_ids，與 cells 逐列對應)，分裂與死亡不會改變其他細胞的 ID
+# 分裂：母細胞保留原本的 ID 與列，子細胞取得新的 ID (比所有既有 ID 大) 並接在陣列尾端
+# 死亡：移除該列，其餘列順序不變
+# 因此每一幀的 ID 都是遞增排序，可直接用 searchsorted 由 ID 查列 index
+
+
+class Lineage:
+    """
+    譜系表：ID 即 index，記錄母細胞 (起始細胞為 -1)、出生與死亡時間 (未死亡為 nan)
+    n_founders: 起始細胞數 (ID 0 .. n-1)；t0: 起始細胞的出生時間
+    """
+    def __init__(self, n_founders=0, t0=0.0):
+        self.parent = np.full(n_founders, -1, dtype=np.int64)
+        self.birth = np.full(n_founders, t0, dtype=float)
+        self.death = np.full(n_founders, np.nan)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self, parents, t=None):
+        """新增子細胞，回傳新 ID array；t 為 None 時出生時間記為 nan (不在模擬中)"""
+        parents = np.asarray(parents, dtype=np.int64)
+        start = len(self.parent)
+        self.parent = np.concatenate([self.parent, parents])
+        self.birth = np.concatenate([self.birth, np.full(len(parents), np.nan if t is None else t)])
+        self.death = np.concatenate([self.death, np.full(len(parents), np.nan)])
+        return np.arange(start, start + len(parents), dtype=np.int64)
+
+    def kill(self, ids, t=None):
+        """記錄死亡；t 為 None 時記為 -inf (已死亡、時間未知)"""
+        self.death[np.asarray(ids, dtype=np.int64)] = -np.inf if t is None else t
+
+    def table(self):
+        """{'id', 'parent', 'birth', 'death'} array (可直接寫成 CSV 或 DataFrame)"""
+        return {'id': np.arange(len(self.parent)), 'parent': self.parent.copy(),
+                'birth': self.birth.copy(), 'death': self.death.copy()}
+
+    def children(self, ids):
+        """ids 的直接子細胞 ID"""
+        return np.flatnonzero(np.isin(self.parent, np.atleast_1d(ids)))
+
+    def descendants(self, cell_id):
+        """cell_id 的所有後代 ID (逐代向量化查詢)"""
+        found = []
+        gen = np.atleast_1d(cell_id)
+        while len(gen):
+            gen = self.children(gen)
+            found.append(gen)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def ancestors(self, cell_id):
+        """由近到遠的祖先 ID list"""
+        chain = []
+        p = self.parent[cell_id]
+        while p >= 0:
+            chain.append(int(p))
+            p = self.parent[p]
+        return chain
+
+    def alive(self, t):
+        """時間 t 存活的 ID (出生時間未知的子細胞視為已出生)"""
+        born = ~(self.birth > t)
+        dead = self.death <= t
+        return np.flatnonzero(born & ~dead)
+
+
+class IdIndex:
+    """
+    ids_history (每幀的 cell_ids) 的 ID -> 列 index 查詢
+    所有幀以 key = frame * (max_id + 1) + id 合併成一個排序陣列，任意 ID 在所有幀的列一次 searchsorted 取得
+    """
+    def __init__(self, ids_history):
+        ids = [np.asarray(f, dtype=np.int64) for f in ids_history]
+        self.n_frames = len(ids)
+        lengths = np.array([len(f) for f in ids], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]) if len(ids) else np.zeros(0, dtype=np.int64)
+        self.stride = int(max((f.max() for f in ids if len(f)), default=-1)) + 1
+        keys = np.concatenate([f + i * self.stride for i, f in enumerate(ids)]) if ids else np.zeros(0, dtype=np.int64)
+        # 正常情況每幀 ID 遞增，keys 已排序；否則另存排序後的位置
+        self.order = None if np.all(keys[1:] > keys[:-1]) else np.argsort(keys, kind='stable')
+        self.keys = keys if self.order is None else keys[self.order]
+
+    def flat_rows(self, cell_ids):
+        """回傳 (frame, k) 在合併陣列中的位置，該幀沒有此 ID 時為 -1"""
+        cell_ids = np.atleast_1d(np.asarray(cell_ids, dtype=np.int64))
+        q = np.arange(self.n_frames, dtype=np.int64)[:, None] * self.stride + cell_ids[None, :]
+        pos = np.searchsorted(self.keys, q)
+        found = (pos < len(self.keys)) & (self.keys[np.minimum(pos, len(self.keys) - 1)] == q) \
+            & (cell_ids[None, :] >= 0) & (cell_ids[None, :] < self.stride)
+        if self.order is not None:
+            pos = self.order[np.minimum(pos, len(self.keys) - 1)]
+        return np.where(found, pos, -1)
+
+    def rows(self, cell_ids):
+        """(frame, k) 每幀的列 index，不存在時為 -1"""
+        flat = self.flat_rows(cell_ids)
+        return np.where(flat >= 0, flat - self.offsets[:, None], -1)
+
+    def trace(self, history, cell_ids):
+        """
+        history: simulate 的濃度歷史 (與 ids_history 同幀)
+        回傳 (frame, k, n_var) 濃度，細胞不存在的幀為 nan
+        """
+        flat = self.flat_rows(cell_ids)
+        values = np.concatenate([np.asarray(f, dtype=float).reshape(len(f), -1) for f in history])
+        out = values[np.maximum(flat, 0)]
+        out[flat < 0] = np.nan
+        return out
+
+
+def write_lineage(path, lineage):
+    """譜系表寫成 CSV (id, parent, birth, death)；起始細胞 parent = -1，存活到最後的 death 為空白"""
+    table = lineage.table()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('id,parent,birth,death\n')
+        for i, p, b, d in zip(table['id'], table['parent'], table['birth'], table['death']):
+            f.write(f"{i},{p},{'' if np.isnan(b) else f'{b:.10g}'},{'' if np.isnan(d) else f'{d:.10g}'}\n")
+    return path
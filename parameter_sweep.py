@@ -0,0 +1,446 @@
+"""
+多維參數掃描
+用法:
+    python -m parameter_sweep config.json --space betaR=10:60 --space h=1:4 --strategy lhs -n 64
+                              [--rounds 2] [--workers 4] [--T 20] [--seed 0] [--out sweep.jsonl]
+每個點完成後立即寫入 JSONL，重新執行同一個指令時會略過已完成的點
+結束碼: 0 成功 / 1 有點失敗 / 2 參數或設定錯誤
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import numpy as np
+
+STRATEGIES = ['grid', 'lhs', 'sobol', 'adaptive']
+SOLVERS = ['simulate', 'steady']
+
+logger = logging.getLogger('VoronoiSweep')
+
+
+class Dimension:
+    """
+    一個掃描維度
+    spec: (lo, hi)、(lo, hi, 'log') 或明確的值 list (只適用 grid)
+    """
+    def __init__(self, name, spec):
+        self.name = name
+        self.values = None
+        self.log = False
+        if isinstance(spec, dict):
+            spec = (spec['lo'], spec['hi'], 'log' if spec.get('log') else 'linear')
+        if isinstance(spec, (list, tuple)) and len(spec) in (2, 3) and all(isinstance(v, (int, float)) for v in spec[:2]) \
+                and (len(spec) == 2 or isinstance(spec[2], str)):
+            self.lo, self.hi = float(spec[0]), float(spec[1])
+            self.log = len(spec) == 3 and spec[2] == 'log'
+            if self.log and (self.lo <= 0 or self.hi <= 0):
+                raise ValueError(f'{name}: log range must be positive')
+        else:
+            self.values = [float(v) for v in spec]
+            self.lo, self.hi = min(self.values), max(self.values)
+
+    def scale(self, u):
+        """[0, 1] -> 參數值"""
+        u = np.asarray(u, dtype=float)
+        if self.log:
+            return np.exp(np.log(self.lo) + u * (np.log(self.hi) - np.log(self.lo)))
+        return self.lo + u * (self.hi - self.lo)
+
+    def unit(self, x):
+        """參數值 -> [0, 1] (adaptive 以此計算距離)"""
+        x = np.asarray(x, dtype=float)
+        if self.hi == self.lo:
+            return np.zeros_like(x)
+        if self.log:
+            return (np.log(x) - np.log(self.lo)) / (np.log(self.hi) - np.log(self.lo))
+        return (x - self.lo) / (self.hi - self.lo)
+
+    def grid(self, levels):
+        if self.values is not None:
+            return np.array(self.values)
+        return self.scale(np.linspace(0, 1, levels))
+
+
+def parse_space(space):
+    """{name: spec} -> [Dimension]"""
+    if not space:
+        raise ValueError('parameter space is empty')
+    return [Dimension(name, spec) for name, spec in space.items()]
+
+
+def sample_space(dims, strategy, n=32, levels=5, seed=None):
+    """
+    產生掃描點 (list of dict)
+    grid: 每維 levels 個等分點 (或明確的值) 的完整網格
+    lhs / sobol: n 個 Latin hypercube / Sobol (scrambled) 點
+    adaptive: 初始取 n 個 LHS 點，之後由 refine_points 加點
+    """
+    if strategy == 'grid':
+        axes = [d.grid(levels) for d in dims]
+        mesh = np.meshgrid(*axes, indexing='ij')
+        values = np.stack([m.ravel() for m in mesh], axis=1)
+    else:
+        from scipy.stats import qmc
+        if strategy in ('lhs', 'adaptive'):
+            u = qmc.LatinHypercube(d=len(dims), seed=seed).random(n)
+        elif strategy == 'sobol':
+            sampler = qmc.Sobol(d=len(dims), scramble=True, seed=seed)
+            m = int(np.log2(n))
+            u = sampler.random_base2(m) if 2**m == n else sampler.random(n)
+        else:
+            raise ValueError(f'unknown strategy {strategy!r}; choose from {STRATEGIES}')
+        values = np.column_stack([d.scale(u[:, k]) for k, d in enumerate(dims)])
+    return [{d.name: float(v) for d, v in zip(dims, row)} for row in values]
+
+
+def refine_points(dims, records, metric, n_new, threshold=None, k=None):
+    """
+    在 metric 變化劇烈 (圖樣轉變邊界) 的相鄰點之間加點
+    records: 已完成的紀錄；相鄰定義為單位超立方體中的 k 近鄰
+    threshold: |Δmetric| 超過此值才視為邊界，預設為 metric 全距的 25%
+    回傳最多 n_new 個新點 (依 |Δmetric| 由大到小)，與既有點太近的中點會略過
+    """
+    from scipy.spatial import cKDTree
+    ok = [r for r in records if r.get('status') == 'ok' and r['metrics'].get(metric) is not None
+          and np.isfinite(r['metrics'][metric])]
+    if len(ok) < 2 or n_new <= 0:
+        return []
+    X = np.column_stack([dims[j].unit([r['point'][d.name] for r in ok]) for j, d in enumerate(dims)])
+    m = np.array([r['metrics'][metric] for r in ok], dtype=float)
+    if threshold is None:
+        threshold = 0.25 * (m.max() - m.min())
+    if threshold <= 0:
+        return []
+    k = min(len(ok), k or 2 * len(dims) + 1)
+    tree = cKDTree(X)
+    _, nbrs = tree.query(X, k=k)
+    pairs = {}
+    for i in range(len(ok)):
+        for j in np.atleast_1d(nbrs[i])[1:]:
+            diff = abs(m[i] - m[j])
+            if diff > threshold:
+                pairs[(min(i, j), max(i, j))] = diff
+    # 中點間至少相隔目前最近鄰距離的一半，避免同一處重複加點
+    min_sep = 0.5 * np.median(tree.query(X, k=2)[0][:, 1]) if len(ok) > 1 else 0.0
+    chosen = []
+    for (i, j), _ in sorted(pairs.items(), key=lambda kv: -kv[1]):
+        mid = 0.5 * (X[i] + X[j])
+        if tree.query(mid)[0] < min_sep or any(np.linalg.norm(mid - c) < min_sep for c in chosen):
+            continue
+        chosen.append(mid)
+        if len(chosen) >= n_new:
+            break
+    return [{d.name: float(d.scale(u[k_])) for k_, d in enumerate(dims)} for u in chosen]
+
+
+# 建立起始網格的 config 欄位 (result_cache 以起始座標本身入鍵，掃描點在模擬前只能以設定判斷)
+GRID_CONFIG_KEYS = ['grid_mode', 'grid_shape_x', 'grid_shape_y', 'cell_dist', 'pos_rand', 'import_path', 'import_frame']
+
+
+def inputs_digest(config, params):
+    """
+    掃描共用輸入的雜湊：基礎參數、影響結果的 config 欄位、ODE 程式碼與模擬程式版本
+    任一項改變時先前寫入 JSONL 的點不再視為已完成
+    """
+    import sim_config
+    from result_cache import RESULT_CONFIG_KEYS, library_digest
+    from result_store import _json_safe
+    payload = {
+        'library': library_digest(),
+        'ode': (config.get('ode') or '').strip() or sim_config.default_texts()[0],
+        'params': _json_safe(params),
+        'config': {k: config.get(k) for k in RESULT_CONFIG_KEYS + GRID_CONFIG_KEYS},
+    }
+    text = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def point_key(point, seed, T, solver='simulate', inputs=None):
+    """
+    掃描點的識別碼 (參數值、seed、T、求解方式的雜湊)，用於續跑時略過已完成的點
+    inputs: inputs_digest(config, params)，基礎參數或設定改變時鍵隨之改變
+    """
+    payload = {'point': {k: round(v, 12) for k, v in sorted(point.items())}, 'seed': seed, 'T': T}
+    if solver != 'simulate':
+        payload['solver'] = solver
+    if inputs is not None:
+        payload['inputs'] = inputs
+    payload = json.dumps(payload, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def summarize(sim_history, labels=None, positions=None, times=None):
+    """
+    一次模擬的摘要指標
+    final_mean_<label> / final_std_<label>: 最後一幀各變數的平均與標準差
+    cv0: 最後一幀第 0 個變數的變異係數 (側向抑制圖樣出現時明顯變大)，adaptive 預設以此判斷邊界
+    positions: 各幀細胞座標，提供時加入最後一幀的圖樣指標 (pattern_metrics：high_fraction、isolated_high、
+               morans_i、salt_and_pepper)，多於一幀時另加 lock_in；times: 各幀時間 (預設幀 index * dT 由呼叫端提供)
+    """
+    last = np.asarray(sim_history[-1], dtype=float)
+    n_var = last.shape[1] if last.ndim == 2 else 1
+    labels = labels or [f'Y{i}' for i in range(n_var)]
+    metrics = {'n_cells': int(len(last)), 'n_frames': int(len(sim_history))}
+    for i in range(n_var):
+        metrics[f'final_mean_{labels[i]}'] = float(last[:, i].mean())
+        metrics[f'final_std_{labels[i]}'] = float(last[:, i].std())
+    mean0 = last[:, 0].mean()
+    metrics['cv0'] = float(last[:, 0].std() / mean0) if mean0 > 0 else 0.0
+    if positions is not None and len(positions):
+        from pattern_metrics import final_metrics
+        pattern = final_metrics(sim_history, positions, times=times)
+        if len(sim_history) < 2:
+            pattern.pop('lock_in')
+        metrics.update(pattern)
+    return metrics
+
+
+# worker 行程內快取編譯後的 ODE (函數無法 pickle，各 worker 由 config 文字重建)
+_ODE_CACHE = {}
+
+
+def run_point(job):
+    """
+    在 worker 中執行一個掃描點
+    job: dict(config, params, point, T, seed, key, round, cache, solver, inputs)；回傳要寫入 JSONL 的紀錄
+    job['cache'] 為 (目錄, 位元組上限) 時，與先前相同輸入的點直接讀取快取結果
+    job['solver'] == 'steady' 時直接求穩態 (不積分到 T，不使用快取)
+    """
+    import sim_config
+    t0 = time.perf_counter()
+    record = {'key': job['key'], 'point': job['point'], 'seed': job['seed'], 'T': job['T'], 'round': job['round'],
+              'inputs': job.get('inputs')}
+    try:
+        code = (job['config'].get('ode') or '').strip() or sim_config.default_texts()[0]
+        if code not in _ODE_CACHE:
+            _ODE_CACHE[code] = sim_config.compile_ode(code)
+        params = dict(job['params'])
+        params.update(job['point'])
+        if job.get('solver') == 'steady':
+            model, results, _ = sim_config.solve_steady(job['config'], params=params, seed=job['seed'],
+                                                        ode_func=_ODE_CACHE[code])
+            result = results[0]
+            record['metrics'] = summarize([result['Y']], params.get('labels'), [model.vor_grid.cells])
+            record['metrics'].update({'t_end': result['t_warmup'], 'residual': result['residual'],
+                                      'steady': result['converged'] and result['stable']})
+            record['status'] = 'ok'
+            record['seconds'] = time.perf_counter() - t0
+            return record
+        cache = None
+        if job.get('cache'):
+            from result_cache import ResultCache
+            cache = ResultCache(*job['cache'])
+        model, sim_history, positions, _ = sim_config.run_simulation(
+            job['config'], params=params, T=job['T'], seed=job['seed'], ode_func=_ODE_CACHE[code],
+            profile=False, progress=False, cache=cache)
+        record['cached'] = isinstance(model, sim_config.CachedRun)
+        times = model.frame_times if model.frame_times is not None else np.arange(len(sim_history)) * params['dT']
+        record['metrics'] = summarize(sim_history, params.get('labels'), positions, times)
+        # 收斂提早結束時 t_end < T；快取命中時結束原因未知，t_end 取最後一幀的時間
+        record['metrics']['t_end'] = model.termination['t'] if model.termination is not None else float(times[-1])
+        record['termination'] = model.termination['reason'] if model.termination is not None else None
+        record['status'] = 'ok'
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['seconds'] = time.perf_counter() - t0
+    return record
+
+
+def load_records(path):
+    """讀取已寫入的 JSONL 紀錄；最後一行寫到一半 (中斷) 時略過"""
+    records = []
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+class ParameterSweep:
+    """
+    多維參數掃描
+    config: config.json 內容 (dict)，所有點共用其網格、移動與分裂設定
+    space: {參數名: (lo, hi) | (lo, hi, 'log') | [值...]}
+    strategy: 'grid' | 'lhs' | 'sobol' | 'adaptive'
+    n: lhs/sobol 的點數，adaptive 的初始點數；levels: grid 每維的點數
+    rounds, per_round: adaptive 的加點回合數與每回合點數 (預設 n//2)
+    metric, threshold: adaptive 判斷邊界的指標 (summarize 的鍵) 與門檻
+    seed: 取樣與模擬共用的種子 (每個點使用同一組亂數，方便比較)
+    out: JSONL 路徑，每完成一點即寫入；已完成的點在重新執行時略過
+    workers: 行程數，1 時在目前行程執行
+    cache: 結果快取目錄 (None 不使用)；cache_bytes: 快取大小上限
+    solver: 'simulate' 積分到 T；'steady' 以 BiophysicsModel.solve_steady_state 直接求穩態 (僅靜態組織)
+    """
+    def __init__(self, config, space, strategy='lhs', n=32, levels=5, rounds=0, per_round=None,
+                 metric='cv0', threshold=None, T=None, seed=None, out=None, workers=None, params=None,
+                 cache=None, cache_bytes=None, solver='simulate'):
+        import sim_config
+        if strategy not in STRATEGIES:
+            raise ValueError(f'unknown strategy {strategy!r}; choose from {STRATEGIES}')
+        if solver not in SOLVERS:
+            raise ValueError(f'unknown solver {solver!r}; choose from {SOLVERS}')
+        self.config = config
+        self.dims = parse_space(space)
+        self.strategy = strategy
+        self.n = n
+        self.levels = levels
+        self.rounds = rounds if strategy == 'adaptive' else 0
+        self.per_round = per_round or max(1, n // 2)
+        self.metric = metric
+        self.solver = solver
+        self.threshold = threshold
+        self.T = sim_config.get_T(config) if T is None else float(T)
+        self.seed = seed
+        self.out = out
+        self.workers = workers or os.cpu_count() or 1
+        if cache:
+            from result_cache import DEFAULT_MAX_BYTES
+            cache = (cache, cache_bytes or DEFAULT_MAX_BYTES)
+        self.cache = cache
+        if params is None:
+            params = sim_config.parse_params(config.get('params') or sim_config.default_texts()[1])
+        unknown = [d.name for d in self.dims if d.name not in params]
+        if unknown:
+            logger.warning(f'parameters not in params, added by the sweep: {unknown}')
+        self.params = params
+        self.inputs = inputs_digest(config, params)
+        # 只沿用相同輸入的紀錄 (改了基礎參數、設定或 ODE 的舊紀錄也不參與 adaptive 加點)
+        self.records = {r['key']: r for r in load_records(out) if r.get('status') == 'ok' and r.get('inputs') == self.inputs}
+
+    def _job(self, point, round_=0):
+        return {'config': self.config, 'params': self.params, 'point': point, 'T': self.T, 'seed': self.seed,
+                'key': point_key(point, self.seed, self.T, self.solver, self.inputs), 'round': round_, 'cache': self.cache,
+                'solver': self.solver, 'inputs': self.inputs}
+
+    def run_points(self, points, log=None, round_=0):
+        """執行尚未完成的點，完成一點就寫入 JSONL 並 yield 該紀錄"""
+        jobs = [self._job(p, round_) for p in points]
+        todo = [j for j in jobs if j['key'] not in self.records]
+        skipped = len(jobs) - len(todo)
+        if skipped and log:
+            log(f'skipping {skipped} finished point(s)')
+        f = open(self.out, 'a', encoding='utf-8') if self.out else None
+        try:
+            for done, record in enumerate(self._execute(todo), 1):
+                if f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    f.flush()
+                if record['status'] == 'ok':
+                    self.records[record['key']] = record
+                if log:
+                    log(f"[{done}/{len(todo)}] {record['point']} -> {record['status']}"
+                        + (f" {self.metric}={record['metrics'].get(self.metric):.4g}" if record['status'] == 'ok' else f" {record.get('error')}"))
+                yield record
+        finally:
+            if f:
+                f.close()
+
+    def _execute(self, jobs):
+        if not jobs:
+            return
+        if self.workers <= 1 or len(jobs) == 1:
+            for job in jobs:
+                yield run_point(job)
+            return
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+            futures = [pool.submit(run_point, job) for job in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run(self, log=None):
+        """執行整個掃描 (含 adaptive 加點)，回傳所有紀錄 (含失敗的點)"""
+        points = sample_space(self.dims, self.strategy, self.n, self.levels, self.seed)
+        results = list(self.run_points(points, log))
+        for r in range(self.rounds):
+            # 只用前幾回合的紀錄決定加點，續跑時同一回合會得到相同的點
+            previous = [rec for rec in self.records.values() if rec.get('round', 0) <= r]
+            new_points = refine_points(self.dims, previous, self.metric, self.per_round, self.threshold)
+            if log:
+                log(f'refinement round {r+1}: {len(new_points)} new point(s)')
+            if not new_points:
+                break
+            results += list(self.run_points(new_points, log, round_=r + 1))
+        return results
+
+
+def _parse_range(text):
+    # 'lo:hi'、'lo:hi:log' 或 'v1,v2,v3'
+    if ':' in text:
+        parts = text.split(':')
+        if len(parts) == 3 and parts[2] == 'log':
+            return (float(parts[0]), float(parts[1]), 'log')
+        if len(parts) == 2:
+            return (float(parts[0]), float(parts[1]))
+        raise ValueError(f'bad range {text!r}')
+    return [float(v) for v in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m parameter_sweep', description='Sweep model parameters of a saved config.json.')
+    parser.add_argument('config', help='config.json saved by the GUI')
+    parser.add_argument('--space', action='append', default=[], metavar='NAME=LO:HI[:log]|V1,V2,...',
+                        help='parameter range (repeatable)')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='lhs')
+    parser.add_argument('-n', type=int, default=32, help='points for lhs/sobol, initial points for adaptive')
+    parser.add_argument('--levels', type=int, default=5, help='points per dimension for grid')
+    parser.add_argument('--rounds', type=int, default=2, help='adaptive refinement rounds')
+    parser.add_argument('--per-round', type=int, default=None, help='points added per refinement round (default n/2)')
+    parser.add_argument('--metric', default='cv0',
+                        help='metric used to find pattern transitions, e.g. cv0, salt_and_pepper, morans_i')
+    parser.add_argument('--threshold', type=float, default=None, help='metric jump that marks a transition (default 25%% of its range)')
+    parser.add_argument('--T', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='sweep.jsonl', help='JSON-lines results; rerunning resumes from it')
+    parser.add_argument('--cache', default=None, metavar='DIR', help='result cache folder shared with batch_runner and the GUI')
+    parser.add_argument('--cache-size', type=float, default=2048, metavar='MB', help='cache size limit (default: %(default)s MB)')
+    parser.add_argument('--solver', choices=SOLVERS, default='simulate',
+                        help='simulate to T, or solve for the steady state directly (static tissues only)')
+    parser.add_argument('--steady-state', action='store_true', help='stop each run early once it has converged')
+    parser.add_argument('--integrator', choices=['euler', 'rk23'], default=None,
+                        help='time stepping (default: config integrator, else euler); rk23 adapts the step')
+    parser.add_argument('--steady-tol', type=float, default=None, help='relative dY threshold for --steady-state (default 1e-4)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    import matplotlib
+    matplotlib.use('Agg')
+    from batch_runner import load_config, ConfigError
+    try:
+        config = load_config(args.config)
+        if args.steady_state:
+            config['steady_state'] = True
+        if args.integrator:
+            config['integrator'] = args.integrator
+        if args.steady_tol is not None:
+            config['steady_tol'] = args.steady_tol
+        space = {}
+        for item in args.space:
+            name, _, rng = item.partition('=')
+            space[name.strip()] = _parse_range(rng.strip())
+        sweep = ParameterSweep(config, space, strategy=args.strategy, n=args.n, levels=args.levels, rounds=args.rounds,
+                               per_round=args.per_round, metric=args.metric, threshold=args.threshold, T=args.T,
+                               seed=args.seed, out=args.out, workers=args.workers,
+                               cache=args.cache, cache_bytes=int(args.cache_size * 1024**2), solver=args.solver)
+    except (ConfigError, ValueError, SyntaxError) as e:
+        logger.error(str(e))
+        return 2
+    records = sweep.run(log=logger.info)
+    failed = [r for r in records if r['status'] != 'ok']
+    logger.info(f'{len(records) - len(failed)} new point(s) ok, {len(failed)} failed, {len(sweep.records)} finished in total; results in {args.out}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import numpy as np
+
+# 側向抑制圖樣品質指標，以鄰居圖 (Voronoi 鄰接) 的稀疏矩陣一次計算多個幀
+# 幾何相同的連續幀 (靜態組織) 共用一個鄰接矩陣，(cell, frame) 矩陣一次相乘
+# high: 以 (min + max) / 2 二值化的高細胞 (與 convergence.binary_pattern 相同，尚未形成圖樣的幀全為低)
+# isolated_high: 高細胞中沒有高鄰居的比例
+# morans_i: Moran's I 空間自相關 (鄰居權重為 1)；棋盤狀的側向抑制圖樣為負值，成片聚集為正值
+# salt_and_pepper: 符合側向抑制規則的細胞比例 (高細胞沒有高鄰居、低細胞至少有一個高鄰居)，完美圖樣為 1
+# lock_in: 高/低分群不再改變的時間 (最後一次改變之後的幀)
+METRICS = ['high_fraction', 'isolated_high', 'morans_i', 'salt_and_pepper']
+
+
+def adjacency(cells, vor=None):
+    """細胞鄰接矩陣 (CSR，權重 1)，鄰居規則與 coupling.CouplingContext 相同"""
+    from coupling import neighbor_matrix
+    A = neighbor_matrix(np.asarray(cells, dtype=float), vor)
+    A.data[:] = 1.0
+    return A
+
+
+def high_cells(X, threshold=None, contrast=0.5):
+    """
+    X: (frame, cell) 某一變數；回傳 bool (frame, cell)
+    threshold: 固定門檻；None 時每幀以 (min + max) / 2，高低差不到 contrast * max|X| 的幀視為尚未形成圖樣 (全為 False)
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    if threshold is not None:
+        return X > threshold
+    if X.shape[1] == 0:
+        return np.zeros(X.shape, dtype=bool)
+    lo, hi = X.min(axis=1, keepdims=True), X.max(axis=1, keepdims=True)
+    formed = (hi - lo) > contrast * np.maximum(np.maximum(np.abs(lo), np.abs(hi)), 1e-12)
+    return (X > 0.5 * (lo + hi)) & formed
+
+
+def frame_metrics(X, A, threshold=None, contrast=0.5, mask=None):
+    """
+    同一幾何下多個幀的指標
+    X: (frame, cell)；A: adjacency() 的鄰接矩陣
+    mask: 只計算這些細胞 (例如 VoronoiGrid.inner_mask()，排除鄰居不完整的邊界)；鄰居仍包含所有細胞
+    回傳 {指標: (frame,) array}，無法定義的值 (沒有高細胞、變異數為 0) 為 nan
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    high = high_cells(X, threshold, contrast)
+    H = high.T.astype(float)                       # (cell, frame)
+    high_neighbors = np.asarray(A @ H)             # 每個細胞的高鄰居數
+    keep = np.ones(X.shape[1], dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    n = max(int(keep.sum()), 1)
+    h = high.T[keep]
+    hn = high_neighbors[keep]
+    n_high = h.sum(axis=0)
+    isolated = (h & (hn == 0)).sum(axis=0)
+    rule = np.where(h, hn == 0, hn > 0).sum(axis=0)
+
+    # Moran's I：只用 mask 內細胞之間的邊
+    sub = A if mask is None else A[keep][:, keep]
+    Z = X.T[keep]
+    Z = Z - Z.mean(axis=0)
+    num = (Z * np.asarray(sub @ Z)).sum(axis=0)
+    den = (Z * Z).sum(axis=0)
+    W = sub.sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        morans = np.where((den > 0) & (W > 0), n / max(W, 1e-12) * num / np.where(den > 0, den, 1.0), np.nan)
+        isolated_high = np.where(n_high > 0, isolated / np.maximum(n_high, 1), np.nan)
+    return {'high_fraction': n_high / n, 'isolated_high': isolated_high, 'morans_i': morans,
+            'salt_and_pepper': np.where(n_high > 0, rule / n, np.nan)}
+
+
+def lock_in_time(high, times):
+    """
+    high: (frame, cell) bool；times: 各幀時間
+    回傳最後一幀的高/低分群開始固定的時間；最後一幀尚未形成圖樣時為 nan
+    """
+    high = np.asarray(high, dtype=bool)
+    times = np.asarray(times, dtype=float)
+    if len(high) == 0 or not high[-1].any():
+        return np.nan
+    changed = (high != high[-1]).any(axis=1)
+    last = np.flatnonzero(changed)
+    return float(times[last[-1] + 1]) if len(last) else float(times[0])
+
+
+def _geometry_groups(positions, n_frames):
+    # 連續且座標相同的幀分成一組 (靜態組織只有一組)
+    if positions is None or len(positions) == 0:
+        return [(0, n_frames, None)]
+    groups = []
+    start = 0
+    for f in range(1, n_frames + 1):
+        if f == n_frames or np.shape(positions[f]) != np.shape(positions[start]) \
+                or not np.array_equal(positions[f], positions[start]):
+            groups.append((start, f, positions[start]))
+            start = f
+    return groups
+
+
+def history_metrics(history, positions, var=0, times=None, threshold=None, contrast=0.5, inner_only=True):
+    """
+    整個模擬歷史的逐幀指標
+    history / positions: simulate 的回傳值 (可為 object array，細胞數可變)
+    times: 各幀時間 (例如 model.frame_times)，預設 0, 1, 2, ... (幀 index)
+    inner_only: 只計算內圈細胞 (VoronoiGrid.inner_mask，排除外圈與其相鄰的細胞)
+    回傳 {METRICS: (frame,) array, 'lock_in': 時間 (細胞數改變時只比較最後一段細胞數相同的幀)}
+    """
+    n_frames = len(history)
+    out = {k: np.full(n_frames, np.nan) for k in METRICS}
+    times = np.arange(n_frames, dtype=float) if times is None else np.asarray(times, dtype=float)
+    high_tail = []
+    for start, stop, cells in _geometry_groups(positions, n_frames):
+        if cells is None:
+            raise ValueError('positions are needed to build the neighbor graph')
+        if len(cells) < 4:
+            high_tail = []
+            continue
+        X = np.stack([np.asarray(history[f], dtype=float)[:, var] for f in range(start, stop)])
+        for key, values in _grid_metrics(X, cells, threshold, contrast, inner_only).items():
+            out[key][start:stop] = values
+        high = high_cells(X, threshold, contrast)
+        if high_tail and high_tail[-1][1].shape[1] != high.shape[1]:
+            high_tail = []
+        high_tail.append((start, high))
+    if high_tail and high_tail[-1][0] + len(high_tail[-1][1]) == n_frames:
+        first = high_tail[0][0]
+        out['lock_in'] = lock_in_time(np.concatenate([h for _, h in high_tail]), times[first:])
+    else:
+        out['lock_in'] = np.nan
+    return out
+
+
+def _grid_metrics(X, cells, threshold, contrast, inner_only):
+    from voronoi_grid import VoronoiGrid
+    grid = VoronoiGrid(grid_shape=(len(cells), 1), mode='custom', custom_cells=np.asarray(cells, dtype=float))
+    A = adjacency(grid.cells, grid.vor)
+    return frame_metrics(X, A, threshold, contrast, grid.inner_mask() if inner_only else None)
+
+
+def final_metrics(history, positions, var=0, times=None, threshold=None, contrast=0.5, inner_only=True):
+    """
+    最後一幀的指標與 lock_in (掃描摘要使用)，回傳 {名稱: float}
+    只為最後一幀建立鄰居圖；lock_in 只需各幀的高/低分群 (細胞數與最後一幀相同的連續幀)
+    """
+    out = {k: np.nan for k in METRICS}
+    out['lock_in'] = np.nan
+    n_frames = len(history)
+    if n_frames == 0:
+        return out
+    last = np.asarray(history[-1], dtype=float)
+    cells = positions[-1] if positions is not None and len(positions) else None
+    if cells is None:
+        raise ValueError('positions are needed to build the neighbor graph')
+    if len(cells) >= 4:
+        out.update({k: float(v[0]) for k, v in _grid_metrics(last[None, :, var], cells, threshold, contrast, inner_only).items()})
+    first = n_frames - 1
+    while first > 0 and len(history[first - 1]) == len(last):
+        first -= 1
+    X = np.stack([np.asarray(history[f], dtype=float)[:, var] for f in range(first, n_frames)])
+    times = np.arange(n_frames, dtype=float) if times is None else np.asarray(times, dtype=float)
+    out['lock_in'] = lock_in_time(high_cells(X, threshold, contrast), times[first:])
+    return out
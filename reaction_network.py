@@ -0,0 +1,205 @@
+import numpy as np
+from coupling import CouplingContext
+
+# 內建 Notch/sD 側向抑制模型 (與 gui.sim_utils.sD_ode 相同的方程式)
+# 每個物種: d[X]/dt = production - decay * X
+SD_MODEL = {
+    'name': 'Notch sD lateral inhibition',
+    'species': ['D', 'R', 'sD3', 'sD4'],
+    'parameters': {
+        'nu': 1.0, 'betaD': 50.0, 'betaR': 50.0, 'h': 3, 'm': 3,
+        'sDtv3_ratio': 0.0, 'sDtv4_ratio': 0.0,
+        'Ktv3_Dgr': 0.4, 'Ktv4_Dgr': 0.5,
+        'Ktv3_inhib': 0.15, 'Ktv4_inhib': 0.3,
+        'sigma_diff_sD3': 2.0, 'sigma_diff_sD4': 2.0,
+        'Dgr_Noise': 0.01,
+    },
+    'inputs': {
+        'prod': 'nu * betaD * hill_rep(R, 1, h)',
+        'avgD': 'neighbor_mean(D) - Ktv3_inhib * diffuse(sD3, sigma_diff_sD3) - Ktv4_inhib * diffuse(sD4, sigma_diff_sD4)',
+    },
+    'reactions': {
+        'D': {'production': '(1 - sDtv3_ratio - sDtv4_ratio) * prod', 'decay': '1 + Dgr_Noise * (noise - 0.5)'},
+        'R': {'production': 'betaR * hill(avgD, 1, m)', 'decay': '1'},
+        'sD3': {'production': 'sDtv3_ratio * prod', 'decay': 'Ktv3_Dgr'},
+        'sD4': {'production': 'sDtv4_ratio * prod', 'decay': 'Ktv4_Dgr'},
+    },
+    'isolated': 'freeze',  # 沒有鄰居的細胞 dY = 0
+    'nonnegative': True,   # 與 sD_ode 相同：以 dT 前進後截斷於 0
+}
+
+
+def hill(x, K, n):
+    """活化型 Hill 函數 x^n / (K^n + x^n)"""
+    xn = np.power(x, n)
+    return xn / (np.power(K, n) + xn)
+
+
+def hill_rep(x, K, n):
+    """抑制型 Hill 函數 K^n / (K^n + x^n)"""
+    Kn = np.power(K, n)
+    return Kn / (Kn + np.power(x, n))
+
+
+# 運算式可用的函數；neighbor_mean / diffuse / noise 依幾何在每次呼叫時綁定
+_FUNCTIONS = {
+    'hill': hill, 'hill_rep': hill_rep,
+    'exp': np.exp, 'log': np.log, 'sqrt': np.sqrt, 'abs': np.abs,
+    'minimum': np.minimum, 'maximum': np.maximum, 'where': np.where, 'clip': np.clip,
+}
+_RUNTIME = ('neighbor_mean', 'diffuse', 'noise', 't', 'N')
+
+
+class ReactionNetwork:
+    """
+    將宣告式模型 (dict) 編譯成向量化 RHS
+    spec 欄位:
+      species: 物種名稱 list，順序即 Y 的欄位
+      parameters: 預設參數 dict，執行時 params 中同名鍵會覆蓋
+      inputs: {名稱: 運算式}，依序計算的中間量 (可用 neighbor_mean(X)、diffuse(X, sigma))
+      reactions: {物種: {'production': 運算式, 'decay': 運算式}}，dX = production - decay*X
+      isolated: 'freeze' 時沒有鄰居的細胞 dY = 0
+      nonnegative: True 時以 dT 前進後截斷於 0 (與 sD_ode 相同)
+      substeps: {物種: k}，慢物種每 k 個 Euler 步才更新一次 (步長 k*dT)，其餘步 dY = 0
+    運算式只在建構時 compile 一次，未知名稱會直接報錯
+    diffuse(X, sigma) 的結果會保留到 X 改變為止 (慢物種或常數物種不必每步重算高斯核)
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec.get('name', 'reaction network')
+        self.species = list(spec['species'])
+        if len(set(self.species)) != len(self.species):
+            raise ValueError('species names must be unique')
+        self.defaults = dict(spec.get('parameters', {}))
+        inputs = spec.get('inputs', {})
+        if isinstance(inputs, dict):
+            inputs = list(inputs.items())
+        reactions = spec.get('reactions', {})
+        unknown = set(reactions) - set(self.species)
+        if unknown:
+            raise ValueError(f'reactions for unknown species: {sorted(unknown)}')
+        self.isolated = spec.get('isolated')
+        self.nonnegative = bool(spec.get('nonnegative', False))
+        substeps = spec.get('substeps', {}) or {}
+        unknown = set(substeps) - set(self.species)
+        if unknown:
+            raise ValueError(f'substeps for unknown species: {sorted(unknown)}')
+        self.substeps = np.ones(len(self.species), dtype=int)
+        for sp, k in substeps.items():
+            if int(k) != k or k < 1:
+                raise ValueError(f'substeps.{sp} must be a positive integer')
+            self.substeps[self.species.index(sp)] = int(k)
+
+        known = set(_FUNCTIONS) | set(_RUNTIME) | set(self.species) | set(self.defaults)
+        self.inputs = []
+        for name, expr in inputs:
+            code = self._compile(expr, known, f'inputs.{name}')
+            self.inputs.append((name, code))
+            known.add(name)
+        self.reactions = []
+        for idx, sp in enumerate(self.species):
+            rx = reactions.get(sp, {})
+            prod = self._compile(str(rx.get('production', '0')), known, f'{sp}.production')
+            decay = self._compile(str(rx.get('decay', '0')), known, f'{sp}.decay')
+            self.reactions.append((idx, prod, decay))
+        self.uses_noise = any('noise' in code.co_names for _, code in self.inputs) or \
+            any('noise' in c.co_names for _, p, d in self.reactions for c in (p, d))
+        self._ctx = None
+        self._diffuse_ctx = None
+        self._diffuse_cache = {}
+
+    @staticmethod
+    def _compile(expr, known, where):
+        code = compile(str(expr), f'<{where}>', 'eval')
+        missing = [name for name in code.co_names if name not in known]
+        if missing:
+            raise ValueError(f'{where}: unknown name(s) {missing}')
+        return code
+
+    def context_for(self, cell_positions, ctx=None):
+        """回傳 cell_positions 的 CouplingContext；幾何不變時沿用上一次的算子"""
+        if ctx is not None:
+            return ctx
+        if self._ctx is None or self._ctx.cells.shape != np.shape(cell_positions) or not np.array_equal(self._ctx.cells, cell_positions):
+            self._ctx = CouplingContext(np.array(cell_positions, dtype=float))
+        return self._ctx
+
+    def _diffuse_for(self, ctx):
+        # 依呼叫順序保留每個 diffuse 的輸入與結果，輸入內容相同時直接回傳
+        if ctx is not self._diffuse_ctx:
+            self._diffuse_ctx = ctx
+            self._diffuse_cache = {}
+        cache = self._diffuse_cache
+        calls = [0]
+
+        def diffuse(values, sigma):
+            key = (calls[0], float(sigma))
+            calls[0] += 1
+            hit = cache.get(key)
+            if hit is not None and hit[0].shape == np.shape(values) and np.array_equal(hit[0], values):
+                return hit[1]
+            result = ctx.diffuse(values, sigma)
+            cache[key] = (np.array(values, copy=True), result)
+            return result
+        return diffuse
+
+    def _active_species(self, t, params, multirate):
+        # 多速率：固定步長 (t 在 dT 格點上) 時，慢物種只在第 k 步更新，回傳 (是否更新, 倍率)
+        if not multirate or self.substeps.max() == 1 or 'dT' not in params:
+            return None
+        s = t / params['dT']
+        i = int(round(s))
+        if abs(s - i) > 1e-6:
+            return None
+        return (i % self.substeps) == 0
+
+    def rhs(self, Y, t, params, cell_positions, ctx=None, multirate=True):
+        ctx = self.context_for(cell_positions, ctx)
+        active = self._active_species(t, params, multirate)
+        n = Y.shape[0]
+        ns = dict(_FUNCTIONS)
+        ns.update(self.defaults)
+        ns.update({k: v for k, v in params.items() if k in self.defaults})
+        ns['t'] = t
+        ns['N'] = n
+        ns['neighbor_mean'] = ctx.neighbor_mean
+        ns['diffuse'] = self._diffuse_for(ctx)
+        if self.uses_noise:
+            ns['noise'] = np.random.randn(n)
+        for i, sp in enumerate(self.species):
+            ns[sp] = Y[:, i]
+        for name, code in self.inputs:
+            ns[name] = eval(code, {'__builtins__': {}}, ns)
+        dY = np.zeros_like(Y, dtype=float)
+        for idx, prod, decay in self.reactions:
+            if active is not None and not active[idx]:
+                continue
+            dY[:, idx] = eval(prod, {'__builtins__': {}}, ns) - eval(decay, {'__builtins__': {}}, ns) * Y[:, idx]
+            if active is not None:
+                dY[:, idx] *= self.substeps[idx]
+        if self.isolated == 'freeze':
+            dY[~ctx.has_neighbors] = 0
+        if self.nonnegative:
+            dT = params.get('dT', 1)
+            Y_new = np.clip(Y + dY * dT, 0, None)
+            dY = (Y_new - Y) / dT
+        return dY
+
+    def as_ode(self):
+        """
+        回傳 ode(Y, t, params, cell_positions, ctx=None)，可直接交給 BiophysicsModel (會傳入模型的 CouplingContext)
+        ode.single_rate 忽略 substeps (自適應步長的中間階段使用)
+        """
+        def ode(Y, t, params, cell_positions, ctx=None):
+            return self.rhs(Y, t, params, cell_positions, ctx)
+
+        def single_rate(Y, t, params, cell_positions, ctx=None):
+            return self.rhs(Y, t, params, cell_positions, ctx, multirate=False)
+        ode.network = self
+        ode.single_rate = single_rate
+        return ode
+
+
+def compile_network(spec):
+    """spec (dict) -> ode 函數 (附 .network 屬性)"""
+    return ReactionNetwork(spec).as_ode()
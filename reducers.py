@@ -0,0 +1,201 @@
+import numpy as np
+
+# 串流摘要 (reducer)：simulate 每一步以 update(t, Y, grid) 計算當下的摘要並只保留摘要，
+# 長時間模擬可搭配 save_stride 只存少數完整幀，記憶體為 O(步數) 的小 array 而非 O(步數 x 細胞數 x 變數數)
+
+
+class Reducer:
+    """
+    reducer 基底類別
+    name: 結果的鍵；func(t, Y, grid) -> 純量或 array (每步 shape 固定)
+    子類別覆寫 reduce()，需要多個結果時覆寫 result()
+    """
+    def __init__(self, name, func=None):
+        self.name = name
+        self.func = func
+        self.values = []
+
+    def start(self, n_var):
+        """模擬開始時呼叫，清除上一次的結果"""
+        self.n_var = n_var
+        self.values = []
+
+    def reduce(self, t, Y, grid):
+        return self.func(t, Y, grid)
+
+    def update(self, t, Y, grid):
+        self.values.append(np.asarray(self.reduce(t, Y, grid), dtype=float))
+
+    def result(self):
+        """{鍵: (步數, ...) array}"""
+        return {self.name: np.array(self.values, dtype=float)}
+
+    def frame_bytes(self, n_cells, n_var):
+        """每步的結果大小 (estimate_memory 使用)；未知時以一個 float 估計"""
+        return 8
+
+
+class SpeciesStats(Reducer):
+    """各變數的平均、變異數、最小、最大值 -> <name>_mean / _var / _min / _max，shape (步數, n_var)"""
+    STATS = ('mean', 'var', 'min', 'max')
+
+    def __init__(self, name='stats'):
+        super().__init__(name)
+
+    def reduce(self, t, Y, grid):
+        if len(Y) == 0:
+            return np.full((len(self.STATS), self.n_var), np.nan)
+        return np.stack([Y.mean(axis=0), Y.var(axis=0), Y.min(axis=0), Y.max(axis=0)])
+
+    def result(self):
+        values = np.array(self.values, dtype=float).reshape(-1, len(self.STATS), self.n_var)
+        return {f'{self.name}_{stat}': values[:, i] for i, stat in enumerate(self.STATS)}
+
+    def frame_bytes(self, n_cells, n_var):
+        return 8 * len(self.STATS) * n_var
+
+
+class Histogram(Reducer):
+    """
+    Y[:, var] 的直方圖 -> <name> (步數, bins) 計數
+    range: 固定的 (lo, hi)，各步可直接比較；None 時每步以當下的 min/max 分箱，另存 <name>_edges (步數, bins+1)
+    """
+    def __init__(self, var=0, bins=20, range=None, name=None):
+        super().__init__(name or f'hist{var}')
+        self.var = var
+        self.bins = bins
+        self.range = range
+        self.edges = []
+
+    def start(self, n_var):
+        super().start(n_var)
+        self.edges = []
+
+    def update(self, t, Y, grid):
+        counts, edges = np.histogram(Y[:, self.var], bins=self.bins, range=self.range)
+        self.values.append(counts)
+        if self.range is None:
+            self.edges.append(edges)
+
+    def result(self):
+        out = {self.name: np.array(self.values, dtype=np.int64).reshape(-1, self.bins)}
+        if self.range is None:
+            out[f'{self.name}_edges'] = np.array(self.edges, dtype=float).reshape(-1, self.bins + 1)
+        else:
+            out[f'{self.name}_edges'] = np.linspace(self.range[0], self.range[1], self.bins + 1)
+        return out
+
+    def frame_bytes(self, n_cells, n_var):
+        return 8 * self.bins + (8 * (self.bins + 1) if self.range is None else 0)
+
+
+class HighFraction(Reducer):
+    """
+    Y[:, var] 高於門檻的細胞比例 (例如高 Delta 細胞) -> <name> (步數,)
+    threshold: None 時以 convergence.binary_pattern 的 (min + max) / 2 二值化，尚未形成圖樣時為 0
+    """
+    def __init__(self, var=0, threshold=None, contrast=0.5, name='high_fraction'):
+        super().__init__(name)
+        self.var = var
+        self.threshold = threshold
+        self.contrast = contrast
+
+    def reduce(self, t, Y, grid):
+        if len(Y) == 0:
+            return np.nan
+        if self.threshold is not None:
+            return np.count_nonzero(Y[:, self.var] > self.threshold) / len(Y)
+        from convergence import binary_pattern
+        pattern = binary_pattern(Y, self.var, self.contrast)
+        return 0.0 if pattern is None else np.count_nonzero(pattern) / len(Y)
+
+
+class PatternReducer(Reducer):
+    """
+    側向抑制圖樣指標 (pattern_metrics.METRICS) -> <name>_high_fraction / _isolated_high / _morans_i / _salt_and_pepper
+    鄰居圖只在細胞座標改變時重建 (靜態組織整個模擬只建一次)
+    """
+    def __init__(self, var=0, threshold=None, contrast=0.5, inner_only=True, name='pattern'):
+        super().__init__(name)
+        self.var = var
+        self.threshold = threshold
+        self.contrast = contrast
+        self.inner_only = inner_only
+
+    def start(self, n_var):
+        super().start(n_var)
+        self._cells = None
+        self._graph = None
+
+    def reduce(self, t, Y, grid):
+        from pattern_metrics import METRICS, adjacency, frame_metrics
+        if grid is None or len(grid.cells) < 4:
+            return np.full(len(METRICS), np.nan)
+        if self._cells is None or self._cells.shape != grid.cells.shape or not np.array_equal(self._cells, grid.cells):
+            self._cells = grid.cells.copy()
+            self._graph = (adjacency(grid.cells, grid.vor), grid.inner_mask() if self.inner_only else None)
+        A, mask = self._graph
+        metrics = frame_metrics(Y[None, :, self.var], A, self.threshold, self.contrast, mask)
+        return np.array([metrics[k][0] for k in METRICS])
+
+    def result(self):
+        from pattern_metrics import METRICS
+        values = np.array(self.values, dtype=float).reshape(-1, len(METRICS))
+        return {f'{self.name}_{k}': values[:, i] for i, k in enumerate(METRICS)}
+
+    def frame_bytes(self, n_cells, n_var):
+        return 8 * 4
+
+
+# config['reducers'] 可用的名稱
+REDUCERS = {'stats': SpeciesStats, 'histogram': Histogram, 'high_fraction': HighFraction, 'pattern': PatternReducer}
+
+
+def build_reducers(names):
+    """名稱 list (REDUCERS 的鍵) -> 預設設定的 reducer list"""
+    unknown = [n for n in names if n not in REDUCERS]
+    if unknown:
+        raise ValueError(f'unknown reducer(s) {unknown}; choose from {sorted(REDUCERS)}')
+    return [REDUCERS[n]() for n in names]
+
+
+def collect(reducers, times):
+    """合併所有 reducer 的結果，加上每步的時間 't'"""
+    out = {'t': np.asarray(times, dtype=float)}
+    for r in reducers:
+        for key, value in r.result().items():
+            if key in out:
+                raise ValueError(f'duplicate reducer result {key!r}')
+            out[key] = value
+    return out
+
+
+def frame_count(T, dT, save_stride=1):
+    """simulate 儲存的幀數：第 0 步、每 save_stride 步一幀，最後一步一定保留"""
+    steps = len(np.arange(0, T, dT))
+    if steps == 0:
+        return 0
+    saved = (steps - 1) // save_stride + 1
+    return saved + (1 if (steps - 1) % save_stride else 0)
+
+
+def estimate_memory(n_cells, n_var, T, dT, save_stride=1, reducers=None, positions=True):
+    """
+    模擬前估計結果所需的記憶體 (bytes)，以固定細胞數計算 (分裂/死亡會使實際值不同)
+    回傳 {'frames', 'history', 'positions', 'reducers', 'total'}；positions 含每幀的細胞 ID
+    positions: 'shared' 時為靜態組織 (各幀共用同一份座標)，只計一幀
+    """
+    steps = len(np.arange(0, T, dT))
+    frames = frame_count(T, dT, save_stride)
+    history = frames * n_cells * n_var * 8
+    pos = (1 if positions == 'shared' else frames) * n_cells * (2 * 8 + 8) if positions else 0
+    reduced = steps * (8 + sum(r.frame_bytes(n_cells, n_var) for r in reducers or [])) if reducers else 0
+    return {'frames': frames, 'history': history, 'positions': pos, 'reducers': reduced,
+            'total': history + pos + reduced}
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
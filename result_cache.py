@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import functools
+import numpy as np
+from result_store import save_result_set, ResultSet, _json_safe
+
+# 以輸入內容雜湊為鍵的模擬結果快取
+# 每個項目是 result_store 格式的目錄 (<root>/<key>/)，可直接以 ResultSet 延遲讀取
+# meta.json 的修改時間即「最後使用時間」，總大小超過上限時從最久未用的項目刪起
+CACHE_VERSION = 4
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(ROOT, '.sim_cache')
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# 影響模擬結果的 config 欄位 (動畫、顏色函數等不影響結果的設定不列入；提早結束的設定會改變幀數)
+RESULT_CONFIG_KEYS = [
+    'move_random', 'move_random_strength', 'move_away', 'move_away_strength', 'move_ce', 'move_ce_strength',
+    'move_repulsion', 'move_repulsion_strength', 'move_division', 'move_division_n', 'move_division_method',
+    'move_apoptosis', 'move_apoptosis_n', 'move_apoptosis_method', 'steady_state', 'steady_tol', 'steady_pattern',
+    'integrator', 'rtol', 'atol', 'max_step', 'save_stride', 'reducers',
+]
+
+# 模擬程式本身的原始碼也列入鍵：修改這些模組 (例如 sD_ode、積分器) 後舊的結果不會被沿用
+LIBRARY_SOURCES = [
+    'biophysics_model.py', 'coupling.py', 'convergence.py', 'event_scheduler.py', 'integrators.py',
+    'reaction_network.py', 'sim_config.py', 'voronoi_grid.py', 'gui/sim_utils.py',
+]
+
+
+@functools.lru_cache(maxsize=None)
+def library_digest():
+    """LIBRARY_SOURCES 內容的雜湊 (每個行程只讀一次)"""
+    h = hashlib.sha256()
+    for name in LIBRARY_SOURCES:
+        h.update(name.encode('utf-8'))
+        try:
+            with open(os.path.join(ROOT, *name.split('/')), 'rb') as f:
+                h.update(f.read())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+
+def _array_digest(arr):
+    if arr is None:
+        return None
+    arr = np.ascontiguousarray(arr, dtype=np.float64)
+    return hashlib.sha256(arr.tobytes() + str(arr.shape).encode()).hexdigest()
+
+
+def simulation_key(ode_source, params, cells, config, T, seed, import_Y=None):
+    """
+    模擬輸入的內容雜湊
+    ode_source: ODE (或 model) 程式碼文字；params: 參數 dict；cells: 起始座標
+    config: 只取 RESULT_CONFIG_KEYS (移動、分裂、死亡設定)；import_Y: 匯入的起始濃度
+    """
+    payload = {
+        'version': CACHE_VERSION,
+        'library': library_digest(),
+        'ode': ode_source.strip(),
+        'params': _json_safe(params),
+        'cells': _array_digest(cells),
+        'import_Y': _array_digest(import_Y),
+        'config': {k: config.get(k) for k in RESULT_CONFIG_KEYS},
+        'T': float(T),
+        'seed': seed,
+    }
+    text = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+class ResultCache:
+    """
+    模擬結果的磁碟快取，大小上限以 LRU 淘汰
+    root: 快取目錄；max_bytes: 總大小上限
+    多個行程可共用同一目錄：寫入先存到暫存目錄再改名，淘汰時容忍項目已被刪除
+    """
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._path(key), 'meta.json'))
+
+    def get(self, key):
+        """命中時回傳 ResultSet 並更新最後使用時間，否則回傳 None"""
+        path = self._path(key)
+        meta = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta):
+            return None
+        try:
+            results = ResultSet(path)
+            os.utime(meta)
+        except (OSError, ValueError):
+            return None
+        return results
+
+    def put(self, key, sim_history, cell_positions_history, params=None, config=None, **extras):
+        """
+        寫入一筆結果 (已存在則略過) 並視需要淘汰舊項目，回傳項目目錄
+        extras: ids_history / lineage / frame_times / reductions，命中時由 ResultSet 還原
+        """
+        path = self._path(key)
+        if key in self:
+            return path
+        tmp = os.path.join(self.root, f'.tmp_{key}_{os.getpid()}_{time.monotonic_ns()}')
+        try:
+            save_result_set(tmp, sim_history, cell_positions_history, params=params, config=config, **extras)
+            os.replace(tmp, path)
+        except OSError:
+            # 其他行程已寫入同一個鍵
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+        return path
+
+    def entries(self):
+        """回傳 [(key, 最後使用時間, 位元組數)]"""
+        result = []
+        for name in os.listdir(self.root):
+            path = self._path(name)
+            meta = os.path.join(path, 'meta.json')
+            if name.startswith('.') or not os.path.exists(meta):
+                continue
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                result.append((name, os.path.getmtime(meta), size))
+            except OSError:
+                continue
+        return result
+
+    def size(self):
+        return sum(size for _, _, size in self.entries())
+
+    def evict(self, max_bytes=None):
+        """刪除最久未使用的項目直到總大小不超過 max_bytes，回傳刪除的鍵"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for key, _, size in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            total -= size
+            removed.append(key)
+        return removed
+
+    def clear(self):
+        return self.evict(0)
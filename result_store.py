@@ -0,0 +1,159 @@
+import os
+import json
+import numpy as np
+
+# 結果集目錄格式:
+#   Y.npy         (總列數, n_var)   所有幀的濃度依序串接
+#   positions.npy (總列數, 2)       所有幀的細胞座標
+#   offsets.npy   (n_frames+1,)     第 f 幀位於 [offsets[f], offsets[f+1])
+#   ids.npy       (總列數,)         各幀的細胞 ID (可選，見 lineage.py)
+#   times.npy     (n_frames,)       各幀時間 (可選)
+#   lineage.npz   parent/birth/death 譜系表 (可選)
+#   meta.json     幀數、變數數、dT、labels 等
+# 每個 .npy 都可用 mmap 開啟，只有被讀取的幀會載入記憶體
+FORMAT_VERSION = 1
+
+
+def _json_safe(obj):
+    try:
+        json.dumps(obj)
+        return obj
+    except TypeError:
+        if isinstance(obj, dict):
+            return {str(k): _json_safe(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [_json_safe(v) for v in obj]
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return repr(obj)
+
+
+def save_result_set(folder, sim_history, cell_positions_history, params=None, config=None,
+                    ids_history=None, lineage=None, frame_times=None, reductions=None):
+    """
+    以可 mmap 的格式寫出模擬結果
+    folder: 輸出目錄 (不存在則建立)
+    sim_history: (time, cell, var) 或 object array (細胞數可變)
+    cell_positions_history: (time, cell, 2) 或 object array
+    params, config: 一併存入 meta.json，方便重播時還原 labels/dT
+    ids_history, lineage, frame_times: model.ids_history / model.lineage / model.frame_times (可選)
+    reductions: model.reductions (可選)，存成 reductions.npz
+    """
+    os.makedirs(folder, exist_ok=True)
+    counts = np.array([len(Y) for Y in sim_history], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    n_var = np.asarray(sim_history[0]).shape[1] if len(sim_history) else 0
+    total = int(offsets[-1])
+    # 逐幀寫入 memmap，避免一次串接整個 history
+    Y_mm = np.lib.format.open_memmap(os.path.join(folder, 'Y.npy'), mode='w+', dtype=np.float64, shape=(total, n_var))
+    pos_mm = np.lib.format.open_memmap(os.path.join(folder, 'positions.npy'), mode='w+', dtype=np.float64, shape=(total, 2))
+    for f in range(len(sim_history)):
+        Y_mm[offsets[f]:offsets[f+1]] = sim_history[f]
+        if f < len(cell_positions_history):
+            pos_mm[offsets[f]:offsets[f+1]] = cell_positions_history[f]
+    Y_mm.flush()
+    pos_mm.flush()
+    del Y_mm, pos_mm
+    np.save(os.path.join(folder, 'offsets.npy'), offsets)
+    has_ids = ids_history is not None and len(ids_history) == len(sim_history)
+    if has_ids:
+        ids_mm = np.lib.format.open_memmap(os.path.join(folder, 'ids.npy'), mode='w+', dtype=np.int64, shape=(total,))
+        for f in range(len(sim_history)):
+            ids_mm[offsets[f]:offsets[f+1]] = ids_history[f]
+        ids_mm.flush()
+        del ids_mm
+    has_times = frame_times is not None and len(frame_times) == len(sim_history)
+    if has_times:
+        np.save(os.path.join(folder, 'times.npy'), np.asarray(frame_times, dtype=np.float64))
+    if lineage is not None:
+        np.savez(os.path.join(folder, 'lineage.npz'), **{k: v for k, v in lineage.table().items() if k != 'id'})
+    if reductions:
+        np.savez(os.path.join(folder, 'reductions.npz'), **reductions)
+    params = params or {}
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'n_frames': int(len(sim_history)),
+        'n_var': int(n_var),
+        'has_positions': bool(len(cell_positions_history)),
+        'has_ids': has_ids,
+        'has_times': has_times,
+        'has_lineage': lineage is not None,
+        'has_reductions': bool(reductions),
+        'dT': params.get('dT'),
+        'labels': params.get('labels'),
+        'params': _json_safe(params),
+        'config': _json_safe(config) if config is not None else None,
+    }
+    with open(os.path.join(folder, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return folder
+
+
+class FrameSequence:
+    """
+    類似 list 的唯讀幀序列，frames[i] 才從 mmap 讀取第 i 幀
+    可直接當作 VoronoiAnimator 的 sim_history / cell_positions_history
+    """
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, frame):
+        if isinstance(frame, slice):
+            return [self[i] for i in range(*frame.indices(len(self)))]
+        n = len(self)
+        if frame < 0:
+            frame += n
+        if not 0 <= frame < n:
+            raise IndexError(f'frame {frame} out of range ({n} frames)')
+        return np.array(self.data[self.offsets[frame]:self.offsets[frame+1]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ResultSet:
+    """
+    開啟 save_result_set 寫出的結果集 (目錄或其中的 meta.json)，不需重新模擬
+    history / cell_positions_history (與 ids_history) 為 FrameSequence，逐幀延遲讀取
+    ids_history / lineage / frame_times / reductions: 寫入時沒有提供則為 None
+    """
+    def __init__(self, path):
+        if os.path.isfile(path):
+            path = os.path.dirname(path)
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            raise ValueError(f'Not a result set folder (meta.json missing): {path}')
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.path = path
+        offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.history = FrameSequence(np.load(os.path.join(path, 'Y.npy'), mmap_mode='r'), offsets)
+        self.cell_positions_history = FrameSequence(np.load(os.path.join(path, 'positions.npy'), mmap_mode='r'), offsets) if self.meta.get('has_positions', True) else None
+        self.ids_history = FrameSequence(np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'), offsets) if self.meta.get('has_ids') else None
+        self.frame_times = np.load(os.path.join(path, 'times.npy')) if self.meta.get('has_times') else None
+        self.reductions = None
+        if self.meta.get('has_reductions'):
+            with np.load(os.path.join(path, 'reductions.npz')) as table:
+                self.reductions = {k: table[k] for k in table.files}
+        self.lineage = None
+        if self.meta.get('has_lineage'):
+            from lineage import Lineage
+            with np.load(os.path.join(path, 'lineage.npz')) as table:
+                self.lineage = Lineage()
+                self.lineage.parent, self.lineage.birth, self.lineage.death = table['parent'], table['birth'], table['death']
+
+    @property
+    def params(self):
+        return self.meta.get('params') or {}
+
+    @property
+    def config(self):
+        return self.meta.get('config')
+
+    def __len__(self):
+        return len(self.history)
@@ -0,0 +1,347 @@
+import ast
+import numpy as np
+
+# config.json (MainWindow.save_config 的格式) 轉成模擬所需物件的共用函數
+# 不依賴 Qt，GUI 與 batch_runner 共用，確保兩者的模擬設定完全一致
+
+# 與 GUI grid_mode_combo / move_*_method 下拉選單順序相同
+GRID_MODES = ['honeycomb', 'random', 'regular', 'import', 'poisson']
+EVENT_METHODS = ['area', 'random']
+INTEGRATORS = ['euler', 'rk23']
+
+
+def _float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def default_texts():
+    """回傳 (ode, params, color_func) 的預設程式碼文字"""
+    from gui.default_ode import get_default_ode
+    from gui.default_params import get_default_params
+    from gui.default_color_func import get_default_color_func
+    return get_default_ode(), get_default_params(), get_default_color_func()
+
+
+def parse_params(text):
+    """
+    解析參數文字 'params = dict(...)' 或 '{...}'，回傳 dict
+    格式錯誤時丟出例外 (由呼叫端決定如何顯示)
+    """
+    text = (text or '').strip()
+    if text.startswith('params ='):
+        text = text[len('params ='):].strip()
+    if text.startswith('dict'):
+        return eval(text, {}, {})
+    return ast.literal_eval(text)
+
+
+class _LazyPyplot:
+    # ODE 程式碼很少用到 plt，第一次存取屬性時才載入 matplotlib.pyplot
+    def __getattr__(self, name):
+        import matplotlib.pyplot as plt
+        return getattr(plt, name)
+
+
+def _exec_namespace():
+    from gui.sim_utils import get_voronoi_neighbors_wo_outer, diffusion_weighted_mean
+    from reaction_network import SD_MODEL, compile_network
+    from coupling import CouplingContext
+    return {'np': np, 'plt': _LazyPyplot(),
+            'get_voronoi_neighbors_wo_outer': get_voronoi_neighbors_wo_outer, 'diffusion_weighted_mean': diffusion_weighted_mean,
+            'SD_MODEL': SD_MODEL, 'compile_network': compile_network, 'CouplingContext': CouplingContext}
+
+
+def compile_ode(code):
+    """
+    執行 ODE 文字並回傳 ode 函數
+    文字可定義 ode(Y, t, params, cell_positions)，或宣告式的 model = {...} (以 compile_network 編譯)
+    """
+    from reaction_network import compile_network
+    local_vars = {}
+    exec(code, _exec_namespace(), local_vars)
+    func = local_vars.get('ode', None)
+    # 也可只定義 model = {...} (宣告式反應網路)，由 compile_network 編譯成 ode
+    if func is None and 'model' in local_vars:
+        func = compile_network(local_vars['model'])
+    if func is None:
+        raise ValueError('ode or model not defined')
+    return func
+
+
+def compile_color_func(code):
+    import matplotlib.pyplot as plt
+    local_vars = {}
+    exec(code, {'np': np, 'plt': plt}, local_vars)
+    func = local_vars.get('color_func', None)
+    if func is None:
+        raise ValueError('color_func not defined')
+    return func
+
+
+def build_init_Y(params, n_cells, import_Y=None):
+    """
+    依 params 建立初始濃度 (n_cells, n_var)
+    n_var 取自 params['n_var'] 或 params['init_Y']；匯入檔含濃度且細胞數一致時由該狀態接續；否則預設 4
+    未定義 sigma 時 init_Y 全為 0
+    """
+    sigma = params.get('sigma', 0.0) or 0.0
+    n_var = None
+    init_Y = None
+    # 1. params['n_var']
+    if 'n_var' in params:
+        try:
+            n_var = int(params['n_var'])
+        except (TypeError, ValueError):
+            n_var = None
+    # 2. params['init_Y']
+    if n_var is None and 'init_Y' in params:
+        try:
+            init_Y = np.array(params['init_Y'])
+            if init_Y.ndim == 2:
+                n_var = init_Y.shape[1]
+            elif init_Y.ndim == 1:
+                n_var = 1
+        except Exception:
+            n_var = None
+    # 3. 匯入的幀含濃度 (Y[i] 欄位) 且細胞數一致，從該狀態接續模擬
+    if init_Y is None and import_Y is not None and len(import_Y) == n_cells:
+        init_Y = np.array(import_Y)
+        n_var = init_Y.shape[1]
+    # 4. fallback 預設 4
+    if n_var is None:
+        n_var = 4
+    if init_Y is None:
+        init_Y = np.random.randn(n_cells, n_var) * sigma
+    return init_Y
+
+
+def build_move_rule(config):
+    """回傳 (move_rule, random_strength)，move_rule 依序套用勾選的移動規則，未勾選時為 None"""
+    from gui.sim_utils import move_away_from_center, covergent_extension, repulsion_move_neighbors_no_outer
+    move_rules = []
+    if config.get('move_away'):
+        away_strength = _float(config.get('move_away_strength'), 0.1)
+        move_rules.append(lambda cells: move_away_from_center(cells, away_strength))
+    if config.get('move_ce'):
+        ce_strength = _float(config.get('move_ce_strength'), 0.02)
+        move_rules.append(lambda cells: covergent_extension(cells, ce_strength))
+    if config.get('move_repulsion'):
+        repulsion_strength = _float(config.get('move_repulsion_strength'), 0.08)
+        move_rules.append(lambda cells: repulsion_move_neighbors_no_outer(cells, repulsion_strength))
+
+    def combined_move_rule(cells):
+        for rule in move_rules:
+            cells = rule(cells)
+        return cells
+    move_rule = combined_move_rule if move_rules else None
+    random_strength = 0.05 if config.get('move_random') else 0.0
+    return move_rule, random_strength
+
+
+def event_kwargs(config, params, T):
+    """
+    細胞分裂/死亡設定 -> BiophysicsModel.simulate 的關鍵字參數
+    勾選時每單位時間 (int(1/dT) 步) 觸發一次 FixedEvent，直到 T；分裂與原本的 GUI 相同，每分裂一個就重新選擇
+    """
+    from event_scheduler import FixedEvent
+    division_n = int(config.get('move_division_n', 1)) if config.get('move_division') else 0
+    apoptosis_n = int(config.get('move_apoptosis_n', 1)) if config.get('move_apoptosis') else 0
+    dT = params.get('dT')
+    every = max(int(1/dT), 1) * dT if dT else 1.0
+    events = []
+    if division_n:
+        events.append(FixedEvent('divide', every=every, n=division_n, until=T, sequential=True,
+                                 mode=EVENT_METHODS[int(config.get('move_division_method', 0))]))
+    if apoptosis_n:
+        events.append(FixedEvent('remove', every=every, n=apoptosis_n, until=T,
+                                 mode=EVENT_METHODS[int(config.get('move_apoptosis_method', 0))]))
+    return dict(events=events)
+
+
+def build_convergence(config):
+    """
+    config['steady_state'] 勾選時回傳 ConvergenceMonitor (收斂即提早結束)，否則 None
+    細胞移動時 simulate 不使用 (幾何持續改變)
+    steady_tol: dY 相對變化率門檻 (預設 1e-4)；steady_pattern: 是否也以圖樣穩定判斷 (預設是)
+    """
+    if not config.get('steady_state'):
+        return None
+    from convergence import ConvergenceMonitor
+    pattern = config.get('steady_pattern', True)
+    return ConvergenceMonitor(tol=_float(config.get('steady_tol'), 1e-4), pattern_var=0 if pattern else None)
+
+
+def integrator_kwargs(config):
+    """
+    config['integrator'] ('euler' 或 'rk23') 與 rk23 的 rtol、atol、max_step -> BiophysicsModel.simulate 的關鍵字參數
+    max_step 空白時不限步長
+    """
+    method = config.get('integrator') or 'euler'
+    if method not in INTEGRATORS:
+        raise ValueError(f'unknown integrator {method!r}; choose from {INTEGRATORS}')
+    return dict(method=method, rtol=_float(config.get('rtol'), 1e-3), atol=_float(config.get('atol'), 1e-6),
+                max_step=_float(config.get('max_step'), None))
+
+
+def output_kwargs(config):
+    """
+    結果輸出設定 -> BiophysicsModel.simulate 的關鍵字參數
+    save_stride: 每幾步存一幀完整 history (預設 1)；reducers: reducers.REDUCERS 名稱 list 或以逗號分隔的文字
+    """
+    from reducers import build_reducers
+    names = config.get('reducers') or []
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(',') if n.strip()]
+    stride = int(_float(config.get('save_stride'), 1) or 1)
+    if stride < 1:
+        raise ValueError('save_stride must be >= 1')
+    return dict(save_stride=stride, reducers=build_reducers(names))
+
+
+def estimate_memory(config, params, T=None):
+    """
+    模擬前估計結果的記憶體 (reducers.estimate_memory)
+    細胞數以 grid_shape_x * grid_shape_y 估計 (import 模式回傳 None)，變數數取 params['n_var'] (預設 4)
+    沒有細胞移動也沒有分裂/死亡時，各幀共用同一份位置，只計一幀
+    """
+    from reducers import estimate_memory as estimate
+    if GRID_MODES[int(config.get('grid_mode', 0))] == 'import' or not params.get('dT'):
+        return None
+    n_cells = int(config.get('grid_shape_x', 20)) * int(config.get('grid_shape_y', 20))
+    T = get_T(config) if T is None else T
+    kwargs = output_kwargs(config)
+    static = build_move_rule(config)[0] is None and not event_kwargs(config, params, T)['events']
+    return estimate(n_cells, int(params.get('n_var', 4)), T, float(params['dT']), kwargs['save_stride'], kwargs['reducers'],
+                    positions='shared' if static else True)
+
+
+def get_T(config, default=30.0):
+    return _float(config.get('T'), default)
+
+
+def make_grid(config, import_path=None, rng=None):
+    """依 config 的網格設定建立 VoronoiGrid；import 模式需提供 import_path"""
+    from voronoi_grid import VoronoiGrid
+    mode = GRID_MODES[int(config.get('grid_mode', 0))]
+    grid_shape = (int(config.get('grid_shape_x', 20)), int(config.get('grid_shape_y', 20)))
+    cell_dist = _float(config.get('cell_dist'), 1.0)
+    pos_rand = _float(config.get('pos_rand'), 0.25)
+    if mode == 'import':
+        import_path = import_path or config.get('import_path')
+        if not import_path:
+            raise ValueError('grid_mode is import but no import file was given')
+        return VoronoiGrid(grid_shape=grid_shape, cell_dist=cell_dist, pos_rand=pos_rand, mode=mode,
+                           import_path=import_path, import_frame=parse_import_frame(config.get('import_frame')), rng=rng)
+    return VoronoiGrid(grid_shape=grid_shape, cell_dist=cell_dist, pos_rand=pos_rand, mode=mode, rng=rng)
+
+
+def parse_import_frame(text):
+    """'T, step' 文字 -> (T, step)，格式錯誤時回傳 (0, 0)"""
+    try:
+        T_val, step_val = [float(v) for v in str(text).replace('(', '').replace(')', '').split(',')]
+        return (T_val, step_val)
+    except ValueError:
+        return (0, 0)
+
+
+def _prepare(config, params=None, cells=None, import_Y=None, seed=None, import_path=None):
+    # 共用前置：設定 seed、解析參數與 ODE 文字、建立起始細胞
+    if seed is not None:
+        np.random.seed(seed)
+    default_ode, default_params, _ = default_texts()
+    if params is None:
+        params = parse_params(config.get('params') or default_params)
+    ode_source = (config.get('ode') or '').strip() or default_ode
+    if cells is None:
+        grid = make_grid(config, import_path=import_path, rng=seed)
+        if import_Y is None:
+            import_Y = grid.import_Y
+        cells = grid.cells
+    return params, ode_source, cells, import_Y
+
+
+def _build_model(config, params, cells, import_Y, ode_source, ode_func=None):
+    from voronoi_grid import VoronoiGrid
+    from biophysics_model import BiophysicsModel
+    if ode_func is None:
+        ode_func = compile_ode(ode_source)
+    grid = VoronoiGrid(grid_shape=(len(cells), 1), mode='custom', custom_cells=cells)
+    init_Y = build_init_Y(params, len(grid.cells), import_Y)
+    move_rule, random_strength = build_move_rule(config)
+    model = BiophysicsModel(cell_count=len(grid.cells), params=params, ode_func=ode_func, init_Y=init_Y,
+                            vor_grid=grid, move_rule=move_rule, random_strength=random_strength)
+    return model, grid
+
+
+class CachedRun:
+    """
+    快取命中時代替 BiophysicsModel 回傳：只有模擬的輸出 (各幀細胞 ID、譜系、幀時間、reducers 摘要)
+    沒有執行紀錄 (termination、perf_summary 為 None)
+    """
+    termination = None
+    perf_summary = None
+
+    def __init__(self, results):
+        self.ids_history = results.ids_history
+        self.lineage = results.lineage
+        self.frame_times = results.frame_times
+        self.reductions = results.reductions
+
+
+def run_simulation(config, params=None, cells=None, import_Y=None, T=None, seed=None, profile=None,
+                   ode_func=None, import_path=None, progress=True, cache=None):
+    """
+    依 config 執行一次完整模擬 (不需 Qt)
+    params: 已解析的參數 dict；None 時解析 config['params'] (空白則用預設)
+    cells: 指定起始細胞座標 (GUI 預覽編輯後的座標)；None 時依 config 產生網格
+    import_Y: 匯入檔的起始濃度
+    T: 模擬時間，None 時取 config['T']
+    seed: 設定後網格、初始值、移動與 ODE 雜訊皆可重現
+    profile: None 時取 config['profile']
+    progress: 是否顯示 tqdm 進度條
+    cache: ResultCache；有 seed 且未 profile 時，輸入相同就直接回傳快取結果 (model 為 CachedRun)
+    回傳 (model, sim_history, cell_positions_history, grid)
+    """
+    from voronoi_grid import VoronoiGrid
+    params, ode_source, cells, import_Y = _prepare(config, params, cells, import_Y, seed, import_path)
+    T = get_T(config) if T is None else T
+    profile = bool(config.get('profile', False)) if profile is None else profile
+    # 沒有 seed 的結果不可重現，profile 需要實際計時，這兩種情況不使用快取
+    key = None
+    if cache is not None and seed is not None and not profile:
+        from result_cache import simulation_key
+        key = simulation_key(ode_source, params, cells, config, T, seed, import_Y)
+        hit = cache.get(key)
+        if hit is not None:
+            grid = VoronoiGrid(grid_shape=(1, 1), mode='custom', custom_cells=hit.cell_positions_history[-1])
+            return CachedRun(hit), hit.history, hit.cell_positions_history, grid
+    model, grid = _build_model(config, params, cells, import_Y, ode_source, ode_func)
+    sim_history, cell_positions_history = model.simulate(T, profile=profile, progress=progress, convergence=build_convergence(config),
+                                                         **integrator_kwargs(config), **event_kwargs(config, params, T),
+                                                         **output_kwargs(config))
+    if key is not None:
+        cache.put(key, sim_history, cell_positions_history, params=params, config=config,
+                  ids_history=model.ids_history, lineage=model.lineage, frame_times=model.frame_times,
+                  reductions=model.reductions)
+    return model, sim_history, cell_positions_history, grid
+
+
+def build_model(config, params=None, cells=None, import_Y=None, seed=None, ode_func=None, import_path=None):
+    """依 config 建立 BiophysicsModel (參數意義同 run_simulation)，回傳 (model, grid)"""
+    params, ode_source, cells, import_Y = _prepare(config, params, cells, import_Y, seed, import_path)
+    return _build_model(config, params, cells, import_Y, ode_source, ode_func)
+
+
+def solve_steady(config, params=None, cells=None, import_Y=None, seed=None, ode_func=None, import_path=None,
+                 seeds=None, **kwargs):
+    """
+    依 config 建立模型並直接求穩態 (BiophysicsModel.solve_steady_state)，只適用於沒有細胞移動的設定
+    seeds: 不同起始雜訊的 seed list (取得不同圖樣)；kwargs 傳給 solve_steady_state
+    回傳 (model, results, grid)
+    """
+    model, grid = build_model(config, params, cells, import_Y, seed, ode_func, import_path)
+    results = model.solve_steady_state(seeds=seeds, **kwargs)
+    return model, results, grid
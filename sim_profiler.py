@@ -0,0 +1,107 @@
+import time
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('timer', 'name')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer._push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.timer._pop()
+        return False
+
+
+class PhaseTimer:
+    """
+    模擬各階段計時與計數器
+    enabled=False 時 phase() 回傳共用的空 context，count() 直接返回，幾乎沒有額外成本
+    巢狀 phase 採「獨佔時間」：進入子階段時暫停父階段，各階段時間加總等於總時間
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+        self._stack = []
+        self._mark = None
+        self._start = time.perf_counter()
+        self._end = None
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _push(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.seconds[parent] = self.seconds.get(parent, 0.0) + now - self._mark
+        self._stack.append(name)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self._mark = now
+
+    def _pop(self):
+        now = time.perf_counter()
+        name = self._stack.pop()
+        self.seconds[name] = self.seconds.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def stop(self):
+        self._end = time.perf_counter()
+
+    def summary(self):
+        """回傳 dict: total_s, phases {name: {seconds, calls, fraction}}, counters, other_s (未計時部分)"""
+        total = (self._end or time.perf_counter()) - self._start
+        timed = sum(self.seconds.values())
+        phases = {}
+        for name, sec in sorted(self.seconds.items(), key=lambda kv: -kv[1]):
+            phases[name] = {
+                'seconds': sec,
+                'calls': self.calls.get(name, 0),
+                'fraction': sec / total if total > 0 else 0.0,
+            }
+        return {
+            'total_s': total,
+            'other_s': max(0.0, total - timed),
+            'phases': phases,
+            'counters': dict(self.counters),
+        }
+
+
+def format_summary(summary):
+    """將 summary() 轉成對齊的多行文字 (log / GUI 面板用)"""
+    if not summary:
+        return ''
+    lines = [f"Total {summary['total_s']:.3f} s"]
+    for name, ph in summary['phases'].items():
+        lines.append(f"  {name:<14s}{ph['seconds']:9.3f} s {ph['fraction']*100:6.1f}%  x{ph['calls']}")
+    if summary['total_s'] > 0:
+        lines.append(f"  {'(other)':<14s}{summary['other_s']:9.3f} s {summary['other_s']/summary['total_s']*100:6.1f}%")
+    for name, value in summary['counters'].items():
+        lines.append(f"  {name}: {value}")
+    return '\n'.join(lines)
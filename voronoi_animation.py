@@ -1,12 +1,15 @@
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import matplotlib.colors as mcolors
-from matplotlib.patches import Polygon
-import seaborn as sns
-import pandas as pd
 from scipy.spatial import voronoi_plot_2d, Voronoi
 import numpy as np
 import os
+# matplotlib / seaborn / pandas 在第一次繪圖時才載入，只用模擬的程式不需負擔其匯入時間
+
+
+def _savefig(fig, save_path):
+    # save_path 可為檔名或 PdfPages (多頁 PDF，例如 concentration.pdf 加上 kymograph)
+    if hasattr(save_path, 'savefig'):
+        save_path.savefig(fig)
+    else:
+        fig.savefig(save_path)
 
 class VoronoiAnimator:
     def __init__(self, vor_grid, sim_history, color_func=None, cell_positions_history=None, show_ticks=False, dynamic_range=True):
@@ -28,6 +31,8 @@ class VoronoiAnimator:
         self.ylim = None
 
     def _draw_frame(self, ax, frame, save_path=None, line_colors='black', line_width=2, line_alpha=0.7, point_size=10):
+        import matplotlib.colors as mcolors
+        from matplotlib.patches import Polygon
         sim_history = self.sim_history
         color_func = self.color_func
         cell_positions_history = self.cell_positions_history
@@ -143,9 +148,11 @@ class VoronoiAnimator:
         if save_path and frame % 50 == 0:
             base, ext = os.path.splitext(save_path)
             png_path = f"{base}_frame{frame}.png"
+            import matplotlib.pyplot as plt
             plt.savefig(png_path, dpi=480)
 
     def animate(self, save_path=None, interval=200, line_colors='black', line_width=2, line_alpha=0.7, point_size=10):
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
         def animate_func(frame):
             ax.clear()
@@ -168,6 +175,9 @@ class VoronoiAnimator:
 
     @staticmethod
     def plot_heatmap(results, title, save_path=None):
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        import pandas as pd
         fig = plt.figure(figsize=(10, 10))
         ax1 = fig.add_subplot(111)
         df1 = pd.DataFrame(results)
@@ -180,22 +190,30 @@ class VoronoiAnimator:
         plt.show()
 
     @staticmethod
-    def plot_concentration_over_time(history, labels=None, save_path=None, cell_indices=None):
+    def plot_concentration_over_time(history, labels=None, save_path=None, cell_indices=None, ids_history=None):
         """
         支援 history 為 object array（細胞數可變），可指定要畫哪些 cell index，
         若未指定則自動選存活最久的細胞（出現在所有幀的 index=0）。
         history: (time, cell, var) 或 object array
         cell_indices: list[int]，要畫的細胞索引（以每幀的陣列 index 為準）
+        ids_history: 每幀的細胞 ID (BiophysicsModel.ids_history)；提供時 cell_indices 為細胞 ID，
+                     分裂/死亡後仍追蹤同一個細胞，不存在的幀留白
         """
+        import matplotlib.pyplot as plt
         arr = history
         # 預設只畫每一幀的第0個細胞（存活最久）
         if cell_indices is None:
-            cell_indices = [0]
+            cell_indices = [int(ids_history[0][0])] if ids_history is not None and len(ids_history[0]) else [0]
         # 準備每個 cell 的濃度歷程
-        cell_traces = []
-        for idx in cell_indices:
-            trace = [frame[idx] for frame in arr if len(frame) > idx]
-            cell_traces.append(np.array(trace))
+        if ids_history is not None:
+            from lineage import IdIndex
+            traces = IdIndex(ids_history).trace(arr, cell_indices)
+            cell_traces = [traces[:, c] for c in range(len(cell_indices))]
+        else:
+            cell_traces = []
+            for idx in cell_indices:
+                trace = [frame[idx] for frame in arr if len(frame) > idx]
+                cell_traces.append(np.array(trace))
         # 決定變數數量
         n_var = cell_traces[0].shape[1] if len(cell_traces[0].shape) > 1 else 1
         if labels is None:
@@ -209,9 +227,9 @@ class VoronoiAnimator:
             plt.xlabel("Time step")
             plt.ylabel("Concentration")
             plt.legend()
-            plt.title(f"Concentration over time (Cell {cell_indices[0]})")
+            plt.title(f"Concentration over time ({'Cell ID' if ids_history is not None else 'Cell'} {cell_indices[0]})")
             if save_path:
-                plt.savefig(save_path)
+                _savefig(plt.gcf(), save_path)
             plt.show()
         else:
             fig, axes = plt.subplots(n_cells, 1, figsize=(12, 4*n_cells), sharex=True)
@@ -222,12 +240,127 @@ class VoronoiAnimator:
                 for i in range(n_var):
                     ax.plot(trace[:,i], label=labels[i])
                 ax.set_ylabel("Concentration")
-                ax.set_title(f"Cell {cell_indices[c]}")
+                ax.set_title(f"{'Cell ID' if ids_history is not None else 'Cell'} {cell_indices[c]}")
                 ax.legend()
             axes[-1].set_xlabel("Time step")
             fig.suptitle("Concentration over time (selected cells)")
             fig.tight_layout(rect=[0, 0.03, 1, 0.95])
             if save_path:
-                plt.savefig(save_path)
-            plt.show() 
+                _savefig(plt.gcf(), save_path)
+            plt.show()
+
+    @staticmethod
+    def save_concentration_pdf(path, history, labels=None, ids_history=None, positions=None, lineage=None, times=None):
+        """
+        Download Results / batch_runner 的 concentration.pdf：第 1 頁為起始細胞的濃度折線，第 2 頁為所有細胞的 kymograph
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_pdf import PdfPages
+        with PdfPages(path) as pdf:
+            VoronoiAnimator.plot_concentration_over_time(history, save_path=pdf, labels=labels, cell_indices=None,
+                                                         ids_history=ids_history)
+            plt.close(plt.gcf())
+            VoronoiAnimator.plot_kymograph(history, labels=labels, save_path=pdf, ids_history=ids_history,
+                                           positions=positions, lineage=lineage, times=times)
+        return path
+
+    @staticmethod
+    def kymograph_data(history, ids_history=None, positions=None, lineage=None, sort='position',
+                       max_frames=600, max_cells=600):
+        """
+        所有細胞的濃度排成 (cell, frame, var) 影像資料，一次向量化取出
+        ids_history: 每幀細胞 ID；提供時每列是一個細胞 ID (分裂/死亡不錯位，不存在的幀為 nan)，否則以列 index 對齊
+        sort: 'position' 依細胞第一次出現時的座標 (x, 再 y) 排序，需 positions；
+              'lineage' 依起始祖先 (同一 clone 相鄰) 再依出生順序，需 lineage；None 依 ID / index
+        max_frames / max_cells: 超過時以等間隔取幀、相鄰細胞平均成 max_cells 列，影像大小與細胞數無關
+        回傳 (data, frames, row_label)；frames 為取用的幀 index
+        """
+        n_frames = len(history)
+        step = max(1, int(np.ceil(n_frames / max_frames)))
+        frames = np.arange(0, n_frames, step)
+        sub = [history[f] for f in frames]
+        n_var = np.asarray(sub[0]).reshape(len(sub[0]), -1).shape[1] if len(sub) else 0
+        order_pos = None
+        if ids_history is not None:
+            from lineage import IdIndex
+            index = IdIndex([ids_history[f] for f in frames])
+            ids = np.unique(np.concatenate([np.asarray(ids_history[f]) for f in frames]))
+            flat = index.flat_rows(ids)
+            data = index.trace(sub, ids).transpose(1, 0, 2)
+            if positions is not None:
+                pos = np.concatenate([np.asarray(positions[f], dtype=float) for f in frames])
+                first = flat[np.argmax(flat >= 0, axis=0), np.arange(len(ids))]
+                order_pos = pos[first]
+        else:
+            ids = None
+            n_cells = max(len(f) for f in sub) if sub else 0
+            data = np.full((n_cells, len(frames), n_var), np.nan)
+            for k, f in enumerate(sub):
+                data[:len(f), k] = np.asarray(f, dtype=float).reshape(len(f), -1)
+            if positions is not None:
+                order_pos = np.full((n_cells, 2), np.nan)
+                for f in frames[::-1]:
+                    p = np.asarray(positions[f], dtype=float)
+                    order_pos[:len(p)] = p
+        label = 'cell ID' if ids is not None else 'cell index'
+        if sort == 'position' and order_pos is not None:
+            data = data[np.lexsort((order_pos[:, 1], order_pos[:, 0]))]
+            label = 'cells sorted by x position'
+        elif sort == 'lineage' and lineage is not None and ids is not None:
+            root = ids.copy()
+            while True:
+                parent = lineage.parent[root]
+                if not (parent >= 0).any():
+                    break
+                root = np.where(parent >= 0, parent, root)
+            birth = np.nan_to_num(lineage.birth[ids], nan=np.inf)
+            data = data[np.lexsort((ids, birth, root))]
+            label = 'cells grouped by lineage'
+        if len(data) > max_cells:
+            group = int(np.ceil(len(data) / max_cells))
+            pad = (-len(data)) % group
+            data = np.concatenate([data, np.full((pad,) + data.shape[1:], np.nan)])
+            import warnings
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # 全為 nan 的區塊
+                data = np.nanmean(data.reshape(-1, group, *data.shape[1:]), axis=1)
+            label += f' (mean of {group})'
+        return data, frames, label
 
+    @staticmethod
+    def plot_kymograph(history, labels=None, save_path=None, ids_history=None, positions=None, lineage=None,
+                       sort='position', times=None, max_frames=600, max_cells=600, cmap='viridis'):
+        """
+        所有細胞的 kymograph：每個變數一張 cell x time 影像 (取代逐細胞的折線子圖)
+        參數同 kymograph_data；times: 各幀時間 (例如 model.frame_times)，None 時以幀 index 為橫軸
+        save_path: 檔名或 PdfPages；有 save_path 時存檔後關閉 figure，否則 plt.show()
+        """
+        import matplotlib.pyplot as plt
+        data, frames, row_label = VoronoiAnimator.kymograph_data(history, ids_history, positions, lineage, sort,
+                                                                 max_frames, max_cells)
+        n_var = data.shape[2]
+        if labels is None:
+            labels = [f"Var{i+1}" for i in range(n_var)]
+        if times is not None and len(frames):
+            t = np.asarray(times, dtype=float)[frames]
+            extent = [t[0], t[-1] if len(t) > 1 else t[0] + 1, len(data), 0]
+            xlabel = 'Time'
+        else:
+            extent = [frames[0] if len(frames) else 0, frames[-1] if len(frames) > 1 else 1, len(data), 0]
+            xlabel = 'Frame'
+        fig, axes = plt.subplots(n_var, 1, figsize=(12, 2.5 * n_var + 1), sharex=True, squeeze=False)
+        for i in range(n_var):
+            ax = axes[i, 0]
+            im = ax.imshow(data[:, :, i], aspect='auto', interpolation='nearest', cmap=cmap, extent=extent)
+            ax.set_title(labels[i] if i < len(labels) else f"Var{i+1}")
+            ax.set_ylabel(row_label)
+            fig.colorbar(im, ax=ax)
+        axes[-1, 0].set_xlabel(xlabel)
+        fig.suptitle("Kymograph (all cells)")
+        fig.tight_layout(rect=[0, 0.03, 1, 0.95])
+        if save_path:
+            _savefig(fig, save_path)
+            plt.close(fig)
+        else:
+            plt.show()
+        return fig
@@ -1,15 +1,102 @@
 import numpy as np
 from scipy.spatial import Voronoi
 
+def poisson_disk_sample(width, height, r, rng, rounds=6):
+    """
+    藍噪音 (Poisson-disk) 取樣：任兩點距離 >= r
+    以邊長 r 的 spatial hash 網格 (每格最多一點) 分 2x2 相位平行投點，
+    同相位的格子相距 >= r 不會互相衝突，只需檢查已填入的 8 個鄰格
+    rounds: 投點輪數，越多越接近飽和 (約 0.57/r^2 點每單位面積)
+    """
+    nx, ny = int(np.ceil(width / r)), int(np.ceil(height / r))
+    W = ny + 2  # 外圍補一圈空格，鄰格索引不需判斷邊界
+    grid = np.full((nx + 2) * W, complex(np.nan, np.nan), dtype=np.complex64)  # x + iy，一次 gather 兩個座標
+    offsets = [(dx, dy, dx * W + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+    r2 = np.float32(r * r)
+    phases = []
+    for px in range(2):
+        for py in range(2):
+            ix, iy = np.meshgrid(np.arange(px, nx), np.arange(py, ny), indexing='ij')
+            ix, iy = ix[::2, ::2].ravel(), iy[::2, ::2].ravel()
+            phases.append(((px, py), (ix + 1) * W + iy + 1, ix.astype(np.float32), iy.astype(np.float32)))
+    filled = set()
+    for _ in range(rounds):
+        for phase, flat, ix, iy in phases:
+            empty = np.isnan(grid.real.take(flat))
+            flat = flat[empty]
+            n = len(flat)
+            cand = ((ix[empty] + rng.random(n, dtype=np.float32)) * np.float32(r)
+                    + 1j * (iy[empty] + rng.random(n, dtype=np.float32)) * np.float32(r)).astype(np.complex64)
+            ok = (cand.real < width) & (cand.imag < height)
+            for dx, dy, off in offsets:
+                if ((phase[0] + dx) % 2, (phase[1] + dy) % 2) not in filled:
+                    continue  # 第一輪尚未處理的相位一定是空格
+                d = grid.take(flat + off) - cand
+                ok &= ~(d.real * d.real + d.imag * d.imag < r2)
+            filled.add(phase)
+            grid[flat[ok]] = cand[ok]
+    keep = ~np.isnan(grid.real)
+    return np.column_stack([grid.real[keep], grid.imag[keep]]).astype(float)
+
+
+def voronoi_region_arrays(vor):
+    """每個細胞 region 的頂點數與串接後的頂點 index"""
+    regions = [vor.regions[r] for r in vor.point_region]
+    lengths = np.fromiter((len(r) for r in regions), dtype=np.int64, count=len(regions))
+    flat = np.fromiter((v for r in regions for v in r), dtype=np.int64, count=int(lengths.sum()))
+    return lengths, flat
+
+
+def voronoi_inner_mask(vor):
+    """內圈細胞的布林遮罩 (見 VoronoiGrid.inner_mask)，可用於任何 scipy Voronoi"""
+    n = len(vor.points)
+    lengths, flat = voronoi_region_arrays(vor)
+    outer = lengths == 0
+    if len(flat):
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        has_neg = np.add.reduceat((flat < 0).astype(np.int64), np.minimum(starts, len(flat) - 1)) > 0
+        outer |= has_neg & (lengths > 0)
+    rp = np.asarray(vor.ridge_points)
+    touches = np.zeros(n, dtype=bool)
+    touches[rp[outer[rp[:, 0]], 1]] = True
+    touches[rp[outer[rp[:, 1]], 0]] = True
+    return ~(outer | touches)
+
+
+def voronoi_areas(vor):
+    """每個細胞的 Voronoi 多邊形面積 (見 VoronoiGrid.cell_areas)，開放或空的 region 為 inf"""
+    lengths, flat = voronoi_region_arrays(vor)
+    areas = np.full(len(lengths), np.inf)
+    closed = lengths > 0
+    if len(flat):
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        pos = np.arange(len(flat))
+        nxt = pos + 1
+        ends = starts + lengths - 1
+        nxt[ends[closed]] = starts[closed]  # 每個多邊形最後一點接回第一點
+        v = vor.vertices[flat]
+        w = vor.vertices[flat[nxt]]
+        cross = v[:, 0] * w[:, 1] - w[:, 0] * v[:, 1]
+        sums = np.add.reduceat(cross, starts[closed])
+        neg = np.add.reduceat((flat < 0).astype(np.int64), starts[closed]) > 0
+        region_areas = 0.5 * np.abs(sums)
+        region_areas[neg] = np.inf
+        areas[closed] = region_areas
+    return areas
+
+
 class VoronoiGrid:
-    def __init__(self, grid_shape=(2,1), cell_dist=1.0, pos_rand=0.0, mode='honeycomb', custom_cells=None, import_path=None):
+    def __init__(self, grid_shape=(2,1), cell_dist=1.0, pos_rand=0.0, mode='honeycomb', custom_cells=None, import_path=None, import_frame=(0, 0), rng=None, min_dist=None):
         """
         grid_shape: (x, y) 格狀排列
         cell_dist: 細胞間距
         pos_rand: 位置隨機擾動幅度
-        mode: 'honeycomb', 'random', 'regular', 'custom', 'import'
+        mode: 'honeycomb', 'random', 'regular', 'poisson', 'custom', 'import'
         custom_cells: np.ndarray, 若 mode='custom' 則用此
-        import_path: str, 若 mode='import' 則從檔案讀取
+        import_path: str, 若 mode='import' 則從檔案讀取 (.xlsx/.csv/.txt/.parquet/.npz/.npy)
+        import_frame: (T, step)，匯入檔含 T/step 欄位時要讀取的幀，None 為全部列
+        rng: np.random.Generator 或 seed，產生網格用的亂數來源
+        min_dist: mode='poisson' 時細胞最小距離，預設 0.75*cell_dist (細胞數約為 x*y)
         """
         self.grid_shape = grid_shape
         self.cell_dist = cell_dist
@@ -17,33 +104,66 @@ class VoronoiGrid:
         self.mode = mode
         self.custom_cells = custom_cells
         self.import_path = import_path
+        self.import_frame = import_frame
+        self.import_Y = None  # 匯入檔若含 Y[i] 欄位，保存該幀的濃度
+        self.rng = np.random.default_rng(rng)
+        self.min_dist = min_dist
+        self.voronoi_builds = 0  # Voronoi 重建次數 (效能統計用)
+        self.timer = None  # sim_profiler.PhaseTimer，由 BiophysicsModel 設定
         self.cells = self._init_cells()
-        self.vor = Voronoi(self.cells)
+        self._rebuild_vor()
+        self.reset_ids()
+
+    def reset_ids(self, t0=0.0):
+        """目前的細胞重新編號為起始細胞 (ID 0 .. n-1)，譜系表重新開始"""
+        from lineage import Lineage
+        self._cell_ids = np.arange(len(self.cells), dtype=np.int64)
+        self.lineage = Lineage(len(self.cells), t0)
+
+    @property
+    def cell_ids(self):
+        """
+        與 cells 逐列對應的固定細胞 ID (見 lineage.py)
+        cells 被外部直接換成不同細胞數的陣列時 (例如編輯後的座標)，視為新的組織重新編號
+        """
+        if len(self._cell_ids) != len(self.cells):
+            self.reset_ids()
+        return self._cell_ids
+
+    def _rebuild_vor(self):
+        if self.timer is not None:
+            with self.timer.phase('voronoi'):
+                self.vor = Voronoi(self.cells)
+        else:
+            self.vor = Voronoi(self.cells)
+        self.voronoi_builds += 1
 
     def _init_cells(self):
         import os
         import numpy as np
         if self.mode == 'honeycomb':
-            cells = []
-            for x in range(self.grid_shape[0]):
-                for y in range(self.grid_shape[1]):
-                    if y % 2 == 0:
-                        px = x + (1 + (np.random.random_sample() - 0.5) * self.pos_rand) * self.cell_dist
-                        py = y + (1 + (np.random.random_sample() - 0.5) * self.pos_rand) * self.cell_dist
-                    else:
-                        px = x + (1 + (np.random.random_sample() - 0.5) * self.pos_rand) * self.cell_dist + 0.5 * self.cell_dist
-                        py = y + (1 + (np.random.random_sample() - 0.5) * self.pos_rand) * self.cell_dist
-                    cells.append([px, py])
-            return np.array(cells)
+            # 與逐格迴圈相同的公式，一次以陣列產生 (x 外層、y 內層的順序)
+            xs, ys = np.meshgrid(np.arange(self.grid_shape[0]), np.arange(self.grid_shape[1]), indexing='ij')
+            xs = xs.ravel()
+            ys = ys.ravel()
+            jitter = (1 + (self.rng.random((len(xs), 2)) - 0.5) * self.pos_rand) * self.cell_dist
+            px = xs + jitter[:, 0] + (ys % 2) * 0.5 * self.cell_dist
+            py = ys + jitter[:, 1]
+            return np.column_stack([px, py])
         elif self.mode == 'random':
             n = self.grid_shape[0] * self.grid_shape[1]
-            cells = np.random.rand(n, 2) * np.array([self.grid_shape[0], self.grid_shape[1]]) * self.cell_dist
+            cells = self.rng.random((n, 2)) * np.array([self.grid_shape[0], self.grid_shape[1]]) * self.cell_dist
             return cells
         elif self.mode == 'regular':
             xs = np.arange(self.grid_shape[0]) * self.cell_dist
             ys = np.arange(self.grid_shape[1]) * self.cell_dist
             grid = np.array(np.meshgrid(xs, ys)).T.reshape(-1, 2)
             return grid
+        elif self.mode == 'poisson':
+            r = self.min_dist if self.min_dist else 0.75 * self.cell_dist
+            width = self.grid_shape[0] * self.cell_dist
+            height = self.grid_shape[1] * self.cell_dist
+            return poisson_disk_sample(width, height, r, self.rng)
         elif self.mode == 'custom':
             if self.custom_cells is not None:
                 return np.array(self.custom_cells)
@@ -51,51 +171,11 @@ class VoronoiGrid:
                 raise ValueError('custom_cells must be provided for custom mode')
         elif self.mode == 'import':
             if self.import_path is not None:
-                ext = os.path.splitext(self.import_path)[-1].lower()
-                if ext == '.xlsx':
-                    try:
-                        from openpyxl import load_workbook
-                    except ImportError:
-                        raise ImportError('openpyxl is required to import xlsx files')
-                    wb = load_workbook(self.import_path, read_only=True, data_only=True)
-                    ws = wb.active
-                    headers = [str(cell.value).strip().lower() if cell.value is not None else '' for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-                    # 優先找 T, dT, x, y
-                    x_idx = None
-                    y_idx = None
-                    t_idx = None
-                    step_idx = None
-                    for idx, h in enumerate(headers):
-                        if h == 'x':
-                            x_idx = idx
-                        elif h == 'y':
-                            y_idx = idx
-                        elif h == 't':
-                            t_idx = idx
-                        elif h == 'step':
-                            step_idx = idx
-                    if x_idx is not None and y_idx is not None:
-                        # 若有 T/dT 欄，僅取 T=0/dT=0 的資料
-                        rows = list(ws.iter_rows(min_row=2, values_only=True))
-                        filtered = []
-                        if t_idx is not None and step_idx is not None:
-                            for row in rows:
-                                if row[t_idx] == 0 and row[step_idx] == 0:      #the t=0 cell grid
-                                    filtered.append([row[x_idx], row[y_idx]])
-                        else:
-                            # 沒有 T/dT 欄，全部取 x, y
-                            filtered = [[row[x_idx], row[y_idx]] for row in rows if row[x_idx] is not None and row[y_idx] is not None]
-                        if not filtered:
-                            raise ValueError('No valid cell positions found in xlsx (T=0/step=0 or all x/y)')
-                        return np.array(filtered)
-                    else:
-                        raise ValueError('xlsx 檔案需包含 x, y 欄位 (不分大小寫)')
-                else:
-                    # 預設 csv/txt
-                    try:
-                        return np.loadtxt(self.import_path, delimiter=',')
-                    except Exception as e:
-                        raise ValueError(f'Failed to load import file: {e}')
+                from cell_table import read_cell_table
+                # 欄位式讀取 (pandas/pyarrow/npz)，只取 import_frame 指定的 (T, step) 幀
+                cells, Y = read_cell_table(self.import_path, frame=self.import_frame)
+                self.import_Y = Y
+                return cells
             else:
                 raise ValueError('import_path must be provided for import mode')
         else:
@@ -112,7 +192,14 @@ class VoronoiGrid:
         if random_strength > 0:
             new_cells += (np.random.rand(*new_cells.shape)-0.5)*2*self.cell_dist*random_strength
         self.cells = new_cells
-        self.vor = Voronoi(self.cells) 
+        self._rebuild_vor()
+
+    def inner_mask(self):
+        """
+        內圈細胞的布林遮罩 (cell,)
+        外圈 = region 為空或含 -1；內圈 = 排除外圈與其相鄰的細胞
+        """
+        return voronoi_inner_mask(self.vor)
 
     def get_inner_cell_indices(self):
         """
@@ -120,67 +207,138 @@ class VoronoiGrid:
         1. 先排除 region 中帶有 -1 的細胞（外圈）
         2. 再排除與外圈細胞相鄰的細胞（利用 ridge_points）
         """
+        return np.flatnonzero(self.inner_mask()).tolist()
+
+    def _region_arrays(self):
+        return voronoi_region_arrays(self.vor)
+
+    def cell_areas(self):
+        """
+        每個細胞 Voronoi 多邊形面積 (cell,)，以 shoelace 公式一次算完
+        開放 (含無限遠頂點) 或空的 region 面積為 inf
+        """
+        return voronoi_areas(self.vor)
+
+    def divide_cells(self, indices, concentrations=None, rebuild=True, t=None):
+        """
+        同時分裂多個細胞，最後只重建一次 Voronoi
+        每個細胞沿其多邊形的長軸分成兩個 (母細胞移開，新細胞留在原位置)，新細胞接在陣列尾端並複製母細胞濃度
+        母細胞保留原 ID，新細胞取得新 ID 並以 t 為出生時間記入 lineage
+        rebuild=False 時不重建 (由 apply_events 合併後一次重建)
+        回傳新細胞的 index list；有 concentrations 時回傳 (list, 新濃度陣列)
+        """
         vor = self.vor
-        # 1. 找出所有外圈細胞（region 含 -1）
-        outer_set = set()
-        for i, region_index in enumerate(vor.point_region):
-            region = vor.regions[region_index]
-            if not region or any(v < 0 for v in region):
-                outer_set.add(i)
-        # 2. 找出所有與外圈細胞相鄰的細胞
-        neighbor_set = set()
-        for p1, p2 in vor.ridge_points:
-            if p1 in outer_set:
-                neighbor_set.add(p2)
-            if p2 in outer_set:
-                neighbor_set.add(p1)
-        # 3. 內圈細胞 = 全部細胞 - 外圈 - 鄰居
-        all_indices = set(range(len(vor.points)))
-        inner_indices = list(all_indices - outer_set - neighbor_set)
-        return inner_indices
-
-    def cell_proliferation(self, n=1, mode='area', concentrations=None):
-        from scipy.spatial import ConvexHull
+        indices = [int(i) for i in dict.fromkeys(indices)]
         new_cells = []
-        new_conc = []
-        for _ in range(n):
-            vor = self.vor  # 每次都用最新的
-            inner_indices = self.get_inner_cell_indices()
-            # 計算面積
-            areas = []
-            for i in inner_indices:
-                region = vor.regions[vor.point_region[i]]
-                polygon = [vor.vertices[v] for v in region]
-                try:
-                    hull = ConvexHull(polygon)
-                    areas.append(hull.volume)
-                except:
-                    areas.append(0)
-            if not areas:
-                break
-            # 選最大面積
-            if mode == 'area':
-                idx = inner_indices[np.argmax(areas)]
-            elif mode == 'random':
-                idx = np.random.choice(inner_indices)
-            else:
-                raise ValueError('mode 必須為 area 或 random')
-            # 分裂
+        new_points = []
+        for idx in indices:
             region = vor.regions[vor.point_region[idx]]
-            polygon = np.array([vor.vertices[v] for v in region])
-            center = self.cells[idx]
+            if not region or -1 in region:
+                continue
+            polygon = vor.vertices[region]
+            center = self.cells[idx].copy()
             cov = np.cov(polygon - center, rowvar=False)
             eigvals, eigvecs = np.linalg.eigh(cov)
             axis = eigvecs[:, np.argmax(eigvals)]
             offset = axis * self.cell_dist * 0.75    # 0.75 is a magic number
-            self.cells[idx] = self.cells[idx] - offset
-            new_cell = center + offset
-            self.cells = np.vstack([self.cells, new_cell])
+            # 與原本的分裂相同：母細胞沿長軸移開 offset，新細胞留在原位置
+            self.cells[idx] = center - offset
+            new_points.append(center)
+            new_cells.append(idx)
+        if new_points:
+            n_before = len(self.cells)
+            ids = self.cell_ids
+            self._cell_ids = np.concatenate([ids, self.lineage.add(ids[new_cells], t)])
+            self.cells = np.vstack([self.cells, np.array(new_points)])
+            if rebuild:
+                self._rebuild_vor()
             if concentrations is not None:
-                new_conc.append(concentrations[idx])
-                concentrations = np.vstack([concentrations, concentrations[idx]])
-            self.vor = Voronoi(self.cells)
-            new_cells.append(len(self.cells)-1)
+                concentrations = np.vstack([concentrations, concentrations[new_cells]])
+            new_cells = list(range(n_before, len(self.cells)))
+        if concentrations is not None:
+            return new_cells, concentrations
+        return new_cells
+
+    def remove_cells(self, indices, concentrations=None, rebuild=True, t=None):
+        """
+        同時移除多個細胞，最後只重建一次 Voronoi；被移除細胞的死亡時間 t 記入 lineage
+        回傳被移除的 index list；有 concentrations 時回傳 (list, 新濃度陣列)
+        """
+        removed = sorted({int(i) for i in indices})
+        keep_mask = np.ones(len(self.cells), dtype=bool)
+        keep_mask[removed] = False
+        if removed:
+            ids = self.cell_ids
+            self.lineage.kill(ids[removed], t)
+            self._cell_ids = ids[keep_mask]
+            self.cells = self.cells[keep_mask]
+            if rebuild:
+                self._rebuild_vor()
+        if concentrations is not None:
+            return removed, concentrations[keep_mask]
+        return removed
+
+    def apply_events(self, divide=(), remove=(), concentrations=None, t=None):
+        """
+        同一步的分裂與死亡一起套用，只重建一次 Voronoi
+        divide/remove 是套用前的 index；先分裂 (新細胞接在尾端，不影響原 index) 再移除
+        t: 事件時間 (lineage 的出生/死亡時間)
+        回傳 (新細胞數, 移除細胞數, 新濃度陣列)
+        """
+        born = self.divide_cells(divide, concentrations, rebuild=False, t=t) if len(divide) else []
+        if concentrations is not None and len(divide):
+            born, concentrations = born
+        died = self.remove_cells(remove, concentrations, rebuild=False, t=t) if len(remove) else []
+        if concentrations is not None and len(remove):
+            died, concentrations = died
+        if born or died:
+            self._rebuild_vor()
+        return len(born), len(died), concentrations
+
+    def select_cells(self, n, mode='area', largest=True, exclude=None):
+        """
+        從內圈細胞選 n 個 (分裂/死亡用)
+        mode='area': 面積最大 (largest=True) 或最小的 n 個；mode='random': 隨機不重複
+        exclude: 不可選的 index
+        """
+        pool = np.flatnonzero(self.inner_mask())
+        if exclude is not None and len(exclude):
+            pool = np.setdiff1d(pool, np.asarray(list(exclude), dtype=np.int64))
+        n = min(int(n), len(pool))
+        if n <= 0:
+            return []
+        if mode == 'area':
+            areas = self.cell_areas()[pool]
+            order = np.argsort(-areas if largest else areas, kind='stable')
+            return pool[order[:n]].tolist()
+        elif mode == 'random':
+            return np.random.choice(pool, n, replace=False).tolist()
+        raise ValueError('mode 必須為 area 或 random')
+
+    def cell_proliferation(self, n=1, mode='area', concentrations=None, exclude=None, t=None):
+        """
+        細胞分裂：一次分裂一個內圈細胞 (面積最大或隨機)，每次分裂後重建 Voronoi 再重新選擇，共 n 次
+        要同時分裂多個細胞 (只重建一次) 請用 select_cells + divide_cells
+        exclude: 不可選的 index；t: 出生時間 (lineage)
+        回傳新細胞 index list，有 concentrations 時回傳 (list, 新濃度陣列)
+        """
+        if mode not in ('area', 'random'):
+            raise ValueError('mode 必須為 area 或 random')
+        new_cells = []
+        for _ in range(n):
+            pool = np.flatnonzero(self.inner_mask())
+            if exclude is not None and len(exclude):
+                pool = np.setdiff1d(pool, np.asarray(list(exclude), dtype=np.int64))
+            if len(pool) == 0:
+                break
+            if mode == 'area':
+                idx = pool[np.argmax(self.cell_areas()[pool])]
+            else:
+                idx = np.random.choice(pool)
+            born = self.divide_cells([idx], concentrations, t=t)
+            if concentrations is not None:
+                born, concentrations = born
+            new_cells.extend(born)
         if concentrations is not None:
             return new_cells, concentrations
         return new_cells
@@ -192,34 +350,5 @@ class VoronoiGrid:
         concentrations: (cell, var) array，若有提供則同步移除濃度
         回傳：被移除的細胞索引list與新濃度陣列（若有）
         """
-        from scipy.spatial import ConvexHull
-        cells = self.cells
-        vor = self.vor
-        # 過濾外圈細胞
-        inner_indices = self.get_inner_cell_indices()
-        # 計算面積
-        areas = []
-        for i in inner_indices:
-            region = vor.regions[vor.point_region[i]]
-            polygon = [vor.vertices[v] for v in region]
-            try:
-                hull = ConvexHull(polygon)
-                areas.append(hull.volume)
-            except:
-                areas.append(1e9)
-        # 選擇要移除的細胞
-        if mode == 'area':
-            chosen = np.argsort(areas)[:n]
-            chosen_indices = [inner_indices[i] for i in chosen]
-        elif mode == 'random':
-            chosen_indices = list(np.random.choice(inner_indices, n, replace=False))
-        else:
-            raise ValueError('mode 必須為 area 或 random')
-        keep_mask = np.ones(len(cells), dtype=bool)
-        keep_mask[chosen_indices] = False
-        self.cells = self.cells[keep_mask]
-        self.vor = Voronoi(self.cells)
-        if concentrations is not None:
-            new_conc_arr = concentrations[keep_mask]
-            return chosen_indices, new_conc_arr
-        return chosen_indices
+        chosen = self.select_cells(n, mode, largest=False)
+        return self.remove_cells(chosen, concentrations)